@@ -0,0 +1,143 @@
+""" Parsing and serving of HTTP Range requests (RFC 7233), used when
+    streaming module content. Supports single, open-ended (``500-``),
+    suffix (``-500``) and multiple ranges. """
+import uuid
+
+import settings
+
+
+class RangeNotSatisfiable(Exception):
+    """ None of the requested ranges overlap the file """
+    pass
+
+
+def parse_range_header(header, size):
+    """ Parse a ``Range`` header for a file of ``size`` bytes into a
+        list of ``(start, end)`` tuples, with inclusive ends, clipped to
+        the file. Overlapping or adjacent ranges are merged.
+
+        Returns ``None`` when the whole file should be sent, i.e. the
+        header is missing, is not a ``bytes`` range, or is malformed --
+        per the RFC, an invalid Range header is ignored.
+
+        Raises ``RangeNotSatisfiable`` if no range overlaps the file. """
+    if not header or '=' not in header:
+        return None
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+
+    ranges = []
+    for spec in specs.split(','):
+        if not spec.strip():
+            continue
+        try:
+            byte_range = _parse_spec(spec.strip(), size)
+        except ValueError:
+            return None
+        if byte_range is not None:
+            ranges.append(byte_range)
+
+    if len(ranges) > settings.MAX_BYTE_RANGES:
+        # Too many ranges to be a genuine request; send the whole file
+        return None
+    if not ranges:
+        raise RangeNotSatisfiable()
+    return merge_ranges(ranges)
+
+
+def _parse_spec(spec, size):
+    """ Parse one ``first-last`` spec. Returns ``None`` if it does not
+        overlap the file, and raises ``ValueError`` if it is malformed """
+    first, dash, last = spec.partition('-')
+    if not dash:
+        raise ValueError(spec)
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if start < 0 or (last and end < start):
+            raise ValueError(spec)
+    else:
+        suffix_length = int(last)
+        if suffix_length < 0:
+            raise ValueError(spec)
+        if suffix_length == 0:
+            return None
+        start = max(size - suffix_length, 0)
+        end = size - 1
+    if start >= size:
+        return None
+    return (start, min(end, size - 1))
+
+
+def merge_ranges(ranges):
+    """ Sort ``ranges`` and merge any that overlap or touch """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def content_range(start, end, size):
+    """ Value of the Content-Range header for one range """
+    return 'bytes {0}-{1}/{2}'.format(start, end, size)
+
+
+class MultipartByteranges:
+    """ A ``multipart/byteranges`` response body for several ranges of
+        one open file. Each range is reached with ``seek``, so nothing
+        before it is read. """
+    # pylint: disable=too-many-arguments
+    def __init__(self, file_handle, ranges, size, content_type,
+                 block_size=None):
+        self.file_handle = file_handle
+        self.ranges = ranges
+        self.boundary = uuid.uuid4().hex
+        if block_size is None:
+            block_size = settings.CONTENT_BLOCK_SIZE
+        self.block_size = block_size
+        self.part_headers = [
+            ('--{0}\r\n'
+             'Content-Type: {1}\r\n'
+             'Content-Range: {2}\r\n'
+             '\r\n').format(self.boundary,
+                            content_type,
+                            content_range(start, end, size)).encode('utf-8')
+            for start, end in ranges]
+        self.closing = '\r\n--{0}--\r\n'.format(self.boundary).encode('utf-8')
+
+    @property
+    def content_type(self):
+        return 'multipart/byteranges; boundary={0}'.format(self.boundary)
+
+    @property
+    def content_length(self):
+        """ Exact length of the body, known before streaming starts """
+        length = len(self.closing)
+        for index, (start, end) in enumerate(self.ranges):
+            if index > 0:
+                length += 2  # CRLF ending the previous part
+            length += len(self.part_headers[index]) + end - start + 1
+        return length
+
+    def __iter__(self):
+        try:
+            for index, (start, end) in enumerate(self.ranges):
+                if index > 0:
+                    yield b'\r\n'
+                yield self.part_headers[index]
+                self.file_handle.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = self.file_handle.read(
+                        min(self.block_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+            yield self.closing
+        finally:
+            self.file_handle.close()
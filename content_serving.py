@@ -0,0 +1,429 @@
+""" Helpers for streaming module content (ePubs, videos, tool assets)
+    out of the ``modules/`` directory. """
+import hashlib
+import mimetypes
+import os
+import string
+import threading
+import urllib
+import zlib
+
+from collections import OrderedDict
+from email.utils import formatdate, mktime_tz, parsedate_tz
+
+import web
+
+import settings
+
+# Key used to pass a FileWrapper response from a handler to the
+#   ``sendfile_middleware``, via the WSGI environ
+FILE_RESPONSE_KEY = 'unplatform.file_response'
+
+# Non-``text/*`` mimetypes that are still served as UTF-8 text
+TEXT_MIMETYPES = (
+    'application/javascript',
+    'application/json',
+    'application/xhtml+xml',
+    'application/xml',
+    'image/svg+xml',
+)
+# Extensions the platform ``mimetypes`` tables get wrong (or miss)
+MIMETYPE_OVERRIDES = {
+    '.css': 'text/css',
+}
+DEFAULT_MIMETYPE = 'application/octet-stream'
+
+
+class ContentTypes:
+    """ Classifies files as text or binary from their mimetype, and
+        caches the resulting Content-Type header per path. An entry is
+        only reused while the file's mtime is unchanged. """
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = settings.CONTENT_TYPE_CACHE_SIZE
+        self.max_entries = max_entries
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def guess(path):
+        """ Return the Content-Type header for ``path``. Text types
+            get a UTF-8 charset. """
+        extension = os.path.splitext(path)[1].lower()
+        mimetype = MIMETYPE_OVERRIDES.get(extension)
+        if mimetype is None:
+            mimetype = mimetypes.guess_type(urllib.pathname2url(path))[0]
+        if mimetype is None:
+            return DEFAULT_MIMETYPE
+        if mimetype.startswith('text/') or mimetype in TEXT_MIMETYPES:
+            return '{0}; charset=utf-8'.format(mimetype)
+        return mimetype
+
+    def get(self, path, mtime):
+        """ Return the (cached) Content-Type header for ``path`` """
+        with self.lock:
+            cached = self.cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        content_type = self.guess(path)
+        with self.lock:
+            if len(self.cache) >= self.max_entries:
+                self.cache.clear()
+            self.cache[path] = (mtime, content_type)
+        return content_type
+
+
+content_types = ContentTypes()
+
+
+class Validators:
+    """ Caches the ``ETag`` and ``Last-Modified`` values per path. The
+        strong ETag is derived from the inode, size and mtime, so an
+        entry is only reused while all three are unchanged. """
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = settings.CONTENT_TYPE_CACHE_SIZE
+        self.max_entries = max_entries
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make(file_stat):
+        """ Return ``(etag, last_modified)`` for a stat result """
+        etag = '"{0:x}-{1:x}-{2:x}"'.format(file_stat.st_ino,
+                                            file_stat.st_size,
+                                            int(file_stat.st_mtime * 1000000))
+        last_modified = formatdate(file_stat.st_mtime, usegmt=True)
+        return etag, last_modified
+
+    def get(self, path, file_stat):
+        """ Return the (cached) ``(etag, last_modified)`` for ``path`` """
+        key = (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime)
+        with self.lock:
+            cached = self.cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        values = self.make(file_stat)
+        with self.lock:
+            if len(self.cache) >= self.max_entries:
+                self.cache.clear()
+            self.cache[path] = (key, values)
+        return values
+
+
+validators = Validators()
+
+
+class CachedFile:
+    """ One file held by ``StaticFileCache``, with its ETag and gzip
+        variant computed once, when it is loaded """
+    def __init__(self, data, key):
+        self.data = data
+        self.key = key
+        self.etag = '"{0}"'.format(hashlib.md5(data).hexdigest())
+        self.last_modified = formatdate(key[0], usegmt=True)
+        # wbits of 16 + MAX_WBITS writes a gzip header and trailer
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        gzipped = compressor.compress(data) + compressor.flush()
+        self.gzipped = gzipped if len(gzipped) < len(data) else None
+
+    @property
+    def size(self):
+        return len(self.data) + len(self.gzipped or b'')
+
+
+class StaticFileCache:
+    """ Keeps small, frequently served files (the HTML shells of the
+        front-end, OEA and StarLogoNova) in memory. Every ``get``
+        revalidates against the file's mtime, size and inode; the least
+        recently used files are dropped to stay within ``max_bytes``. """
+    def __init__(self, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = settings.STATIC_CACHE_MAX_BYTES
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """ Return the ``CachedFile`` for ``path``. Raises ``OSError`` /
+            ``IOError`` if it cannot be read, as ``open`` would. """
+        file_stat = os.stat(path)
+        key = (file_stat.st_mtime, file_stat.st_size, file_stat.st_ino)
+        with self.lock:
+            cached = self.files.pop(path, None)
+            if cached is not None:
+                if cached.key == key:
+                    self.files[path] = cached
+                    return cached
+                self.total_bytes -= cached.size
+        with open(path, 'rb') as file_handle:
+            cached = CachedFile(file_handle.read(), key)
+        if cached.size > self.max_bytes:
+            return cached
+        with self.lock:
+            previous = self.files.pop(path, None)
+            if previous is not None:
+                self.total_bytes -= previous.size
+            self.files[path] = cached
+            self.total_bytes += cached.size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.files.popitem(last=False)
+                self.total_bytes -= evicted.size
+        return cached
+
+
+static_files = StaticFileCache()
+
+
+class ToolPages:
+    """ The ``modules/Tools/<tool>/index.html`` iframe pages, rendered
+        per ``?lang=``. Each tool's template is compiled once per version
+        of its file, and the rendered pages are kept in a least recently
+        used map keyed by ``(path, lang)``, so switching a whole lab to
+        another language does not touch the disk. """
+    def __init__(self, max_entries=None, files=None):
+        if max_entries is None:
+            max_entries = settings.TOOL_PAGE_CACHE_SIZE
+        if files is None:
+            files = static_files
+        self.max_entries = max_entries
+        self.files = files
+        # path -> (file key, string.Template)
+        self.templates = {}
+        # (path, lang) -> CachedFile, most recently used last
+        self.rendered = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _template(self, path, source):
+        with self.lock:
+            compiled = self.templates.get(path)
+        if compiled is not None and compiled[0] == source.key:
+            return compiled[1]
+        template = string.Template(source.data)
+        with self.lock:
+            self.templates[path] = (source.key, template)
+        return template
+
+    def get(self, path, lang=None):
+        """ Return the ``CachedFile`` for the tool page at ``path``,
+            rendered for ``lang`` if one is given """
+        source = self.files.get(path)
+        if lang is None:
+            return source
+        cache_key = (path, lang)
+        with self.lock:
+            page = self.rendered.pop(cache_key, None)
+            if page is not None and page.key == source.key:
+                self.rendered[cache_key] = page
+                return page
+        page = CachedFile(
+            web.safestr(self._template(path, source).substitute({
+                'lang': lang
+            })),
+            source.key)
+        with self.lock:
+            self.rendered[cache_key] = page
+            while len(self.rendered) > self.max_entries:
+                self.rendered.popitem(last=False)
+        return page
+
+
+tool_pages = ToolPages()
+
+
+def serve_cached(cached, cache_control='no-cache'):
+    """ Send a ``CachedFile``: 304 if the client's copy is current,
+        otherwise the gzip variant when the client accepts it """
+    web.header('ETag', cached.etag)
+    web.header('Last-Modified', cached.last_modified)
+    web.header('Cache-Control', cache_control)
+    web.header('Vary', 'Accept-Encoding')
+    if is_not_modified(web.ctx.env, cached.etag, cached.key[0]):
+        web.ctx.status = str('304 Not Modified')
+        return ''
+    if (cached.gzipped is not None and
+            accepts_encoding(web.ctx.env.get('HTTP_ACCEPT_ENCODING'), 'gzip')):
+        web.header('Content-Encoding', 'gzip')
+        return cached.gzipped
+    return cached.data
+
+
+def cache_control_for(relative_path):
+    """ The Cache-Control policy for a path under ``modules/``: the
+        longest matching prefix in ``CACHE_CONTROL_POLICIES``, or
+        ``DEFAULT_CACHE_CONTROL`` """
+    policy = settings.DEFAULT_CACHE_CONTROL
+    longest_prefix = -1
+    for prefix, value in settings.CACHE_CONTROL_POLICIES:
+        if relative_path.startswith(prefix) and len(prefix) > longest_prefix:
+            policy = value
+            longest_prefix = len(prefix)
+    return policy
+
+
+def etag_matches(header, etag):
+    """ Weak comparison of ``etag`` against an ``If-None-Match`` or
+        ``If-Range`` style list of entity tags """
+    if header.strip() == '*':
+        return True
+    bare_etag = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == bare_etag:
+            return True
+    return False
+
+
+def accepts_encoding(header, coding):
+    """ Whether an ``Accept-Encoding`` header allows ``coding``: listed,
+        or covered by ``*``, with a q-value above 0 """
+    if not header:
+        return False
+    qvalues = {}
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        qvalue = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[name] = qvalue
+    if coding in qvalues:
+        return qvalues[coding] > 0
+    return qvalues.get('*', 0) > 0
+
+
+def parse_http_date(value):
+    """ Seconds since the epoch for an HTTP date, or None """
+    parsed = parsedate_tz(value) if value else None
+    if parsed is None:
+        return None
+    return mktime_tz(parsed)
+
+
+def is_not_modified(environ, etag, mtime):
+    """ Evaluate ``If-None-Match`` / ``If-Modified-Since``. As in
+        RFC 7232, ``If-None-Match`` wins when both are sent. """
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    since = parse_http_date(environ.get('HTTP_IF_MODIFIED_SINCE'))
+    return since is not None and int(mtime) <= since
+
+
+def is_current_range(environ, etag, mtime):
+    """ False if an ``If-Range`` header shows that the client's
+        partial copy is stale, and the whole file should be sent """
+    if_range = environ.get('HTTP_IF_RANGE', '').strip()
+    if not if_range:
+        return True
+    if if_range.startswith('W/'):
+        # weak tags never match for If-Range
+        return False
+    if if_range.startswith('"'):
+        return if_range == etag
+    since = parse_http_date(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def set_validators(etag, last_modified, mtime, cache_control):
+    """ Send the validator headers. Returns True, with the status set
+        to 304, when the client's cached copy is still current. """
+    web.header('ETag', etag)
+    web.header('Last-Modified', last_modified)
+    web.header('Cache-Control', cache_control)
+    if is_not_modified(web.ctx.env, etag, mtime):
+        web.ctx.status = str('304 Not Modified')
+        return True
+    return False
+
+
+class FileWrapper:
+    """ Iterates over ``length`` bytes of an open file, starting at
+        ``offset``. Follows the PEP 333 ``wsgi.file_wrapper`` interface
+        (``close()`` and ``fileno()``), so the descriptor can be handed
+        to the server when it knows how to send it without going
+        through Python. """
+    def __init__(self, file_handle, offset=0, length=None, block_size=None):
+        self.file_handle = file_handle
+        self.offset = offset
+        size = os.fstat(file_handle.fileno()).st_size
+        if length is None:
+            length = size - offset
+        # A server-side ``wsgi.file_wrapper`` can only send to the
+        #   end of the file
+        self.reaches_eof = offset + length == size
+        self.remaining = length
+        if block_size is None:
+            block_size = settings.CONTENT_BLOCK_SIZE
+        self.block_size = block_size
+        self.started = False
+        self.handed_off = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if not self.started:
+            # web.py peeks at the first chunk before sending headers.
+            #   Give it an empty one, so that no data is read
+            #   before ``sendfile_middleware`` gets a chance to
+            #   hand the descriptor off.
+            self.started = True
+            self.file_handle.seek(self.offset)
+            return b''
+        if self.handed_off or self.remaining <= 0:
+            self.close()
+            raise StopIteration
+        chunk = self.file_handle.read(min(self.block_size, self.remaining))
+        if not chunk:
+            self.close()
+            raise StopIteration
+        self.remaining -= len(chunk)
+        return chunk
+
+    def fileno(self):
+        return self.file_handle.fileno()
+
+    def close(self):
+        self.file_handle.close()
+
+    def hand_off(self, server_file_wrapper):
+        """ Give the open file to the server's ``wsgi.file_wrapper``,
+            and stop iterating in Python """
+        self.handed_off = True
+        self.file_handle.seek(self.offset)
+        return server_file_wrapper(self.file_handle, self.block_size)
+
+
+def send_file(environ, file_handle, offset=0, length=None):
+    """ Build the response body for ``length`` bytes of ``file_handle``
+        and register it in ``environ`` for ``sendfile_middleware`` """
+    response = FileWrapper(file_handle, offset, length)
+    environ[FILE_RESPONSE_KEY] = response
+    return response
+
+
+def sendfile_middleware(app):
+    """ WSGI middleware. When the server provides ``wsgi.file_wrapper``
+        (which can use sendfile(2)), a FileWrapper response that runs to
+        the end of its file is handed to it, instead of being copied
+        through Python in ``CONTENT_BLOCK_SIZE`` chunks. """
+    def wrapper(environ, start_response):
+        result = app(environ, start_response)
+        response = environ.pop(FILE_RESPONSE_KEY, None)
+        server_file_wrapper = environ.get('wsgi.file_wrapper')
+        if (response is None or server_file_wrapper is None or
+                not response.reaches_eof):
+            return result
+        return response.hand_off(server_file_wrapper)
+    return wrapper
@@ -0,0 +1,149 @@
+""" Local index of the ``/api/appdata`` entries this server has posted
+    to QBank, by session ID and timestamp, so that filtered and paged
+    GETs never need the whole ``logentries`` list from QBank. Entries
+    older than ``settings.LOG_INDEX_MAX_AGE`` are deleted. """
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from contextlib import closing
+
+import settings
+import utilities
+
+from main_utilities import LOG_INDEX_DB
+
+SCHEMA = (
+    """create table if not exists log_entries (
+        id integer primary key,
+        entry_id text unique,
+        session_id text not null,
+        timestamp integer not null,
+        entry text not null
+    )""",
+    """create index if not exists log_entries_session
+        on log_entries (session_id, timestamp, id)""",
+    """create index if not exists log_entries_timestamp
+        on log_entries (timestamp, id)""",
+)
+
+
+class LogIndex:
+    """ SQLite copy of posted LogEntries. ``add()`` only buffers an
+        entry; ``commit()`` writes the buffer in one transaction, so the
+        sender pays for one commit per batch. Entries are ordered by
+        their QBank timestamp (``utilities.qbank_time()``), then by
+        when they were indexed. """
+    def __init__(self, path=LOG_INDEX_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.pruned_at = 0
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        connection = sqlite3.connect(self.path, timeout=10)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    def add(self, session_id, entry):
+        """ Remember a LogEntry that QBank created for ``session_id`` """
+        if not isinstance(entry, dict):
+            return
+        try:
+            timestamp = utilities.qbank_time(entry['timestamp'])
+        except (KeyError, TypeError):
+            timestamp = int(time.time() * 1000000)
+        with self.lock:
+            self.buffer.append((entry.get('id'), session_id, timestamp,
+                                json.dumps(entry)))
+
+    def commit(self):
+        """ Write the buffered entries, and every
+            ``settings.LOG_INDEX_PRUNE_SECONDS`` delete those older than
+            ``settings.LOG_INDEX_MAX_AGE`` """
+        now = time.time()
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+            prune = now - self.pruned_at >= settings.LOG_INDEX_PRUNE_SECONDS
+            if prune:
+                self.pruned_at = now
+        if not rows and not prune:
+            return
+        with closing(self.connect()) as connection:
+            with connection:
+                connection.executemany(
+                    'insert or ignore into log_entries '
+                    '(entry_id, session_id, timestamp, entry) '
+                    'values (?, ?, ?, ?)', rows)
+                if prune:
+                    connection.execute(
+                        'delete from log_entries where timestamp < ?',
+                        (int((now - settings.LOG_INDEX_MAX_AGE) * 1000000),))
+
+    @staticmethod
+    def where(session_id=None, since=None, until=None, after=None):
+        """ SQL conditions and parameters for ``find()`` """
+        conditions = []
+        parameters = []
+        if session_id is not None:
+            conditions.append('session_id = ?')
+            parameters.append(session_id)
+        if since is not None:
+            conditions.append('timestamp >= ?')
+            parameters.append(since)
+        if until is not None:
+            conditions.append('timestamp < ?')
+            parameters.append(until)
+        if after is not None:
+            conditions.append('(timestamp > ? or (timestamp = ? and id > ?))')
+            parameters.extend([after[0], after[0], after[1]])
+        if not conditions:
+            return '', parameters
+        return 'where {0}'.format(' and '.join(conditions)), parameters
+
+    def next_cursor(self, limit, **filters):
+        """ The cursor for the page after ``limit`` entries, or None if
+            that page would be empty. Uses the indexes only. """
+        where, parameters = self.where(**filters)
+        with closing(self.connect()) as connection:
+            rows = connection.execute(
+                'select timestamp, id from log_entries {0} '
+                'order by timestamp, id limit 2 offset ?'.format(where),
+                parameters + [limit - 1]).fetchall()
+        if len(rows) < 2:
+            return None
+        return utilities.encode_cursor(list(rows[0]))
+
+    def find(self, limit=None, **filters):
+        """ Generate the matching entries' JSON, oldest first, without
+            loading them all """
+        where, parameters = self.where(**filters)
+        sql = 'select entry from log_entries {0} order by timestamp, id'.format(where)
+        if limit is not None:
+            sql += ' limit ?'
+            parameters.append(limit)
+        with closing(self.connect()) as connection:
+            for row in connection.execute(sql, parameters):
+                yield row[0]
+
+    def clear(self):
+        with self.lock:
+            self.buffer = []
+            self.pruned_at = 0
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+def iter_entries_json(entries):
+    """ Emit already-serialized entries as a JSON array """
+    separator = '['
+    for entry in entries:
+        yield separator + entry
+        separator = ', '
+    yield '[]' if separator == '[' else ']'
@@ -0,0 +1,358 @@
+""" Fire-and-forget delivery of ``/api/appdata`` log entries to QBank.
+
+    Tools log every click, so ``generic_logging.POST`` only appends the
+    entry to the on-disk ``LogSpool`` and answers 202 straight away; a
+    background ``LogSender`` reads the spool and posts the entries to
+    the default QBank log. An accepted entry is therefore on disk before
+    the tool hears back, and is still sent if the server goes down
+    first. Entries are taken out of the spool in order, up to the first
+    one QBank cannot be reached for or answers with an error; the sender
+    tries that one and those after it again every
+    ``settings.LOG_SPOOL_RETRY_SECONDS``, and sets an entry aside as a
+    dead letter once QBank has failed on it
+    ``settings.LOG_SPOOL_MAX_ATTEMPTS`` times. Entries are only dropped
+    (``settings.LOG_QUEUE_DROP_POLICY``) when the spool is full.
+
+    QBank has no bulk ``logentries`` endpoint, so the sender batches in
+    front of it instead: it gathers entries for a moment, groups them by
+    session, and posts each session's entries back to back over a
+    keep-alive connection, several sessions at a time. """
+import threading
+import time
+
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import qbank
+import settings
+
+from log_index import LogIndex
+from log_spool import LogSpool
+
+DROP_POLICIES = ('oldest', 'newest')
+
+
+class DefaultLogError(Exception):
+    """ QBank did not return the default log """
+    pass
+
+
+def find_default_log():
+    """ Find the default CLIx log in QBank, creating it if needed """
+    url = settings.QBANK_LOGGING_ENDPOINT
+    req = qbank.client.get(url)
+    logs = req.json()
+    if not isinstance(logs, list):
+        # an error body; creating another log would not help
+        raise DefaultLogError('could not list the logs: {0!r}'.format(logs))
+    for log in logs:
+        if log['genusTypeId'] == settings.DEFAULT_LOG_GENUS_TYPE:
+            return log
+    payload = {
+        'name': 'Default CLIx log',
+        'description': 'For logging info from unplatform and ' +
+                       'tools, which do not know about catalog IDs',
+        'genusTypeId': settings.DEFAULT_LOG_GENUS_TYPE
+    }
+    req = qbank.client.post(url, json=payload)
+    return req.json()
+
+
+class DefaultLogCache:
+    """ The default log, looked up once per process instead of listing
+        every log in QBank for each entry. Only one thread looks it up
+        (or creates it) at a time, so racing requests cannot create
+        duplicate default logs. Dropped when QBank answers 404 for it.
+        Only a log (with an ``id``) is kept; anything else, such as an
+        error body, raises ``DefaultLogError`` so the next call tries
+        again. """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.log = None
+
+    def get(self):
+        log = self.log
+        if log is not None:
+            return log
+        with self.lock:
+            if self.log is None:
+                try:
+                    log = find_default_log()
+                except ValueError as ex:
+                    # not JSON
+                    raise DefaultLogError(str(ex))
+                if not isinstance(log, dict) or 'id' not in log:
+                    raise DefaultLogError('could not find the default log: {0!r}'.format(log))
+                self.log = log
+            return self.log
+
+    def invalidate(self):
+        with self.lock:
+            self.log = None
+
+    def check(self, req):
+        """ Forget the log if ``req`` (a call to it) got a 404 """
+        if req.status_code == 404:
+            self.invalidate()
+
+
+default_log_cache = DefaultLogCache()
+
+
+def default_log():
+    return default_log_cache.get()
+
+
+def log_entries_url(log_id):
+    return '{0}/{1}/logentries'.format(settings.QBANK_LOGGING_ENDPOINT,
+                                       log_id)
+
+
+# pylint: disable=too-many-instance-attributes
+class LogPipeline:
+    """ ``(session_id, data)`` log entries waiting in a ``LogSpool`` to
+        be posted to QBank, with counters of what happened to them """
+    def __init__(self, spool, drop_policy=None, threads=None, index=None):
+        if drop_policy is None:
+            drop_policy = settings.LOG_QUEUE_DROP_POLICY
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError('unknown drop policy: {0}'.format(drop_policy))
+        if threads is None:
+            threads = settings.LOG_SENDER_THREADS
+        self.spool = spool
+        self.drop_policy = drop_policy
+        self.threads = threads
+        # started on first use, so that importing this starts no threads
+        self.pool = None
+        self.index = index
+        # notified when an entry is spooled, to wake the sender
+        self.arrived = threading.Condition()
+        # one batch at a time is read from the spool and sent
+        self.sending = threading.Lock()
+        # position in the batch being sent of the first entry that
+        #   failed; sessions do not post entries after it
+        self.stop_at = None
+        # times QBank failed on the entry at the front of the spool
+        self.attempts = 0
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self.lock:
+            self.counters = {
+                'accepted': 0,
+                'dropped': 0,
+                'sent': 0,
+                'failed': 0,
+                'retried': 0,
+                'dead_letters': 0
+            }
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def submit(self, session_id, data):
+        """ Spool an entry for QBank. Returns False if it was dropped
+            because the spool is full. """
+        entry = (session_id, data)
+        while not self.spool.append([entry]):
+            dropped = None
+            if self.drop_policy == 'oldest':
+                # make room by giving up on the oldest entries
+                dropped = self.spool.drop_oldest()
+            if dropped is None:
+                self.count('dropped')
+                return False
+            self.count('dropped', dropped)
+        self.count('accepted')
+        with self.arrived:
+            self.arrived.notify()
+        return True
+
+    def wait_for_entry(self, timeout):
+        """ Wait at most ``timeout`` seconds for an entry to arrive,
+            unless there is one not handed out already """
+        with self.arrived:
+            if not self.spool.unread():
+                self.arrived.wait(timeout)
+
+    def take(self, block=False, timeout=None, wait=0):
+        """ Up to ``settings.LOG_SENDER_BATCH_SIZE`` spooled entries,
+            waiting at most ``wait`` seconds after the first one for the
+            batch to fill up """
+        size = settings.LOG_SENDER_BATCH_SIZE
+        entries = self.spool.read(size)
+        if not entries and block:
+            self.wait_for_entry(timeout)
+            entries = self.spool.read(size)
+        deadline = time.time() + wait
+        while entries and len(entries) < size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            self.wait_for_entry(remaining)
+            entries.extend(self.spool.read(size - len(entries)))
+        return entries
+
+    def send(self, entries):
+        """ Post entries to the default log, grouped by session. Returns
+            how many of them, from the first, were taken (sent, or
+            refused for good) before the first that failed, and the
+            status QBank answered that one with (None if it could not be
+            reached). Entries after it may have been posted already;
+            they are sent again with it. """
+        try:
+            url = log_entries_url(default_log()['id'])
+        except Exception:  # pylint: disable=broad-except
+            return 0, None
+        sessions = OrderedDict()
+        for position, (session_id, data) in enumerate(entries):
+            sessions.setdefault(session_id, []).append((position, data))
+        batches = [(url, session_id, items)
+                   for session_id, items in sessions.items()]
+        self.stop_at = len(entries)
+        if self.threads > 1 and len(batches) > 1:
+            if self.pool is None:
+                self.pool = ThreadPool(self.threads)
+            failures = self.pool.map(self.send_session, batches)
+        else:
+            failures = [self.send_session(batch) for batch in batches]
+        self.commit_index()
+        failures = [failure for failure in failures if failure is not None]
+        if not failures:
+            return len(entries), None
+        return min(failures)
+
+    def send_session(self, batch):
+        """ Post one session's entries, in order, reusing one keep-alive
+            connection from the QBank pool. Stops at the first that
+            fails, returning its (position, status), or at one after an
+            entry of another session that failed. """
+        url, session_id, items = batch
+        for position, data in items:
+            if position > self.stop_at:
+                return None
+            status = self.post(url, session_id, data)
+            if status is None or status >= 500 or status == 404:
+                # 404: the default log is gone; keep the entry for the
+                #   new one
+                with self.lock:
+                    self.stop_at = min(self.stop_at, position)
+                return position, status
+        return None
+
+    def post(self, url, session_id, data):
+        """ Post one entry. Returns QBank's status code, or None if it
+            could not be reached. """
+        try:
+            req = qbank.client.post(url,
+                                    json={'data': data},
+                                    headers={'x-api-proxy': session_id})
+        except Exception:  # pylint: disable=broad-except
+            return None
+        default_log_cache.check(req)
+        if req.status_code >= 500 or req.status_code == 404:
+            return req.status_code
+        if req.status_code >= 400:
+            # QBank refusing the entry (4xx) will not change on a retry
+            self.count('failed')
+            return req.status_code
+        self.count('sent')
+        if self.index is not None:
+            try:
+                self.index.add(session_id, req.json())
+            except ValueError:
+                pass
+        return req.status_code
+
+    def commit_index(self):
+        if self.index is not None:
+            self.index.commit()
+
+    def process(self, block=False, timeout=None, wait=0):
+        """ Send one batch from the spool. Returns how many entries were
+            taken out of the spool: those before the first that failed,
+            which is left at the front of the spool for the next try
+            with the rest. 0 if that was the first. """
+        with self.sending:
+            self.spool.sync_due()
+            entries = self.take(block, timeout, wait)
+            if not entries:
+                return 0
+            try:
+                taken, status = self.send(entries)
+            except Exception:
+                self.spool.rewind()
+                raise
+            if status is not None and status >= 500:
+                # the entry that failed is at the front of the spool now
+                self.attempts = 1 if taken else self.attempts + 1
+            elif taken:
+                self.attempts = 0
+            if not taken and self.attempts >= settings.LOG_SPOOL_MAX_ATTEMPTS:
+                # QBank keeps failing on this entry, not on all of them;
+                #   set it aside so that the rest are sent
+                self.spool.bury(entries[:1])
+                self.count('dead_letters')
+                self.attempts = 0
+                taken = 1
+            if taken < len(entries):
+                self.count('retried', len(entries) - taken)
+            self.spool.ack(taken)
+            return taken
+
+    def flush(self):
+        """ Send everything spooled now, e.g. on shutdown. Stops at the
+            first batch QBank could take none of. """
+        while self.process():
+            pass
+
+    def clear(self):
+        """ Forget the spooled entries without sending them """
+        with self.sending:
+            self.spool.clear()
+            self.attempts = 0
+        if self.index is not None:
+            self.index.clear()
+        self.reset_counters()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats['drop_policy'] = self.drop_policy
+        stats.update(self.spool.stats())
+        return stats
+
+
+class LogSender(threading.Thread):
+    """ Posts spooled entries from a ``LogPipeline`` to QBank as they
+        arrive. While QBank cannot be reached it tries again every
+        ``settings.LOG_SPOOL_RETRY_SECONDS``. """
+    def __init__(self, log_pipeline, interval=1):
+        threading.Thread.__init__(self, name='appdata-log-sender')
+        self.daemon = True
+        self.log_pipeline = log_pipeline
+        # how often to check whether we were stopped while idle
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            sent = self.log_pipeline.process(block=True,
+                                             timeout=self.interval,
+                                             wait=settings.LOG_SENDER_BATCH_WAIT)
+            if not sent and self.log_pipeline.spool.unread():
+                # QBank could not be reached, or failed on the entry at
+                #   the front of the spool
+                self.stopped.wait(settings.LOG_SPOOL_RETRY_SECONDS)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.log_pipeline.flush()
+        self.log_pipeline.spool.close()
+
+
+pipeline = LogPipeline(LogSpool(), index=LogIndex())
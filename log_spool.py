@@ -0,0 +1,317 @@
+""" Durable on-disk spool of ``/api/appdata`` entries. Every entry that
+    ``generic_logging.POST`` accepts is appended here before the request
+    is answered, and the ``LogSender`` reads it back from here to post it
+    to QBank, so an accepted entry survives the server going down.
+
+    Entries are appended, one JSON line each, to numbered segment files.
+    Appends go to the OS page cache, which outlives the server process;
+    ``fsync`` happens every ``settings.LOG_SPOOL_FSYNC_ENTRIES`` entries
+    or ``settings.LOG_SPOOL_FSYNC_SECONDS`` seconds, which bounds what a
+    power cut can lose. A segment is closed once it reaches
+    ``settings.LOG_SPOOL_SEGMENT_BYTES``.
+
+    ``read()`` hands entries out oldest first; ``ack()`` marks them, or
+    the first few of them, done and ``rewind()`` hands them out again. How far the reader got is
+    saved in a ``.ack`` file every ``settings.LOG_SPOOL_ACK_EVERY``
+    entries, and segments read to the end are deleted. Delivery is at
+    least once: entries after the last saved acknowledgement are read
+    again after a crash. """
+import json
+import os
+import shutil
+import threading
+import time
+
+import settings
+
+from main_utilities import LOG_SPOOL_DIR
+
+SEGMENT_SUFFIX = '.jsonl'
+ACK_SUFFIX = '.ack'
+# entries QBank kept failing on, set aside by ``bury()``
+DEAD_LETTERS = 'dead-letters'
+
+
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
+class LogSpool:
+    """ Append-only segment files of ``[session_id, data]`` lines, read
+        back in order by one reader at a time """
+    def __init__(self, path=LOG_SPOOL_DIR, max_bytes=None, segment_bytes=None):
+        if max_bytes is None:
+            max_bytes = settings.LOG_SPOOL_MAX_BYTES
+        if segment_bytes is None:
+            segment_bytes = settings.LOG_SPOOL_SEGMENT_BYTES
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        # the segment being appended to, if any
+        self.segment = None
+        self.segment_number = None
+        self.segment_size = 0
+        # bytes of all segments on disk; None until read from disk by
+        #   ``load()``, which also sets the reader's state below
+        self.total_bytes = None
+        # entries not acknowledged yet
+        self.depth = 0
+        # (segment number, byte offset) of the first entry not
+        #   acknowledged, and of the next one to hand out
+        self.acked_at = (0, 0)
+        self.read_at = (0, 0)
+        # lines handed out since the last ``ack()`` / ``rewind()``, and
+        #   (segment number, byte offset, lines) after each entry
+        self.reading = 0
+        self.handed = []
+        # entries acknowledged since the .ack file was last written
+        self.unsaved = 0
+        self.unsynced = 0
+        self.synced_at = time.time()
+
+    def segment_path(self, number, suffix=SEGMENT_SUFFIX):
+        return os.path.join(self.path, '{0:020d}{1}'.format(number, suffix))
+
+    def segments(self):
+        """ Numbers of the segment files on disk, oldest first """
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)])
+                      for name in os.listdir(self.path)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def load(self):
+        """ Pick up what an earlier run left on disk; call with the lock
+            held """
+        numbers = self.segments()
+        self.total_bytes = sum(os.path.getsize(self.segment_path(number))
+                               for number in numbers)
+        self.acked_at = (numbers[0], self.acked(numbers[0])) if numbers else (0, 0)
+        self.read_at = self.acked_at
+        self.handed = []
+        self.depth = sum(self.count(number, self.acked_at[1] if number == numbers[0] else 0)
+                         for number in numbers)
+        self.reading = 0
+        self.unsaved = 0
+
+    def loaded(self):
+        """ ``load()`` unless done already; call with the lock held """
+        if self.total_bytes is None:
+            self.load()
+
+    def count(self, number, offset=0):
+        """ Whole lines in a segment after ``offset`` """
+        with open(self.segment_path(number), 'rb') as segment:
+            segment.seek(offset)
+            return sum(1 for line in segment if line.endswith(b'\n'))
+
+    def append(self, entries, bounded=True):
+        """ Spool ``(session_id, data)`` entries. Returns False, and
+            keeps none of them, if that would go over ``max_bytes``
+            (unless not ``bounded``). """
+        lines = ''.join('{0}\n'.format(json.dumps(entry)) for entry in entries)
+        with self.lock:
+            self.loaded()
+            if bounded and self.total_bytes + len(lines) > self.max_bytes:
+                return False
+            if self.segment is None:
+                if not os.path.isdir(self.path):
+                    os.makedirs(self.path)
+                # never append to a segment from before a restart, which
+                #   may end in a torn line, nor behind the reader
+                self.segment_number = max(self.segments() + [self.read_at[0]]) + 1
+                self.segment = open(self.segment_path(self.segment_number), 'ab')
+                self.segment_size = 0
+            self.segment.write(lines)
+            self.segment.flush()
+            self.segment_size += len(lines)
+            self.total_bytes += len(lines)
+            self.depth += len(entries)
+            self.unsynced += len(entries)
+            if self.segment_size >= self.segment_bytes:
+                self.rotate()
+            elif self.unsynced >= settings.LOG_SPOOL_FSYNC_ENTRIES:
+                self.fsync()
+        return True
+
+    def appending(self):
+        """ Number of the segment being appended to, if any """
+        return self.segment_number if self.segment is not None else None
+
+    def fsync(self):
+        """ Make the current segment durable; call with the lock held """
+        if self.segment is not None:
+            os.fsync(self.segment.fileno())
+        self.unsynced = 0
+        self.synced_at = time.time()
+
+    def sync_due(self):
+        """ ``fsync`` if entries have waited ``LOG_SPOOL_FSYNC_SECONDS`` """
+        with self.lock:
+            if self.unsynced and \
+                    time.time() - self.synced_at >= settings.LOG_SPOOL_FSYNC_SECONDS:
+                self.fsync()
+
+    def rotate(self):
+        """ Close the current segment; call with the lock held """
+        if self.segment is not None:
+            self.fsync()
+            self.segment.close()
+            self.segment = None
+
+    def close(self):
+        with self.lock:
+            self.rotate()
+            if self.unsaved:
+                self.save_ack()
+
+    def read(self, limit):
+        """ Up to ``limit`` entries after those handed out already,
+            oldest first """
+        entries = []
+        with self.lock:
+            self.loaded()
+            number, offset = self.read_at
+            for current in [current for current in self.segments()
+                            if current >= number]:
+                if current != number:
+                    number, offset = current, 0
+                with open(self.segment_path(number), 'rb') as segment:
+                    segment.seek(offset)
+                    while len(entries) < limit:
+                        line = segment.readline()
+                        if not line.endswith(b'\n'):
+                            # the end, or a torn last line from a crash
+                            #   mid-append
+                            break
+                        offset += len(line)
+                        self.reading += 1
+                        try:
+                            entries.append(tuple(json.loads(line)))
+                        except ValueError:
+                            continue
+                        self.handed.append((number, offset, self.reading))
+                if len(entries) >= limit:
+                    break
+            self.read_at = (number, offset)
+        return entries
+
+    def unread(self):
+        """ Whether there are entries not handed out yet """
+        with self.lock:
+            self.loaded()
+            return self.depth > self.reading
+
+    def ack(self, count=None):
+        """ Mark the entries handed out so far as done, or only the first
+            ``count`` of them, in which case the rest are handed out
+            again """
+        with self.lock:
+            if count is None or count >= len(self.handed):
+                done = self.reading
+            elif count > 0:
+                number, offset, done = self.handed[count - 1]
+                self.read_at = (number, offset)
+            else:
+                done = 0
+                self.read_at = self.acked_at
+            self.acked_at = self.read_at
+            self.depth -= done
+            self.unsaved += done
+            self.reading = 0
+            self.handed = []
+            number, offset = self.acked_at
+            for done in self.segments():
+                if done > number:
+                    break
+                if done < number or \
+                        (self.appending() != done and
+                         offset >= os.path.getsize(self.segment_path(done))):
+                    # read to the end, and not being appended to
+                    self.compact(done)
+            if self.unsaved >= settings.LOG_SPOOL_ACK_EVERY:
+                self.save_ack()
+
+    def rewind(self):
+        """ Hand the entries handed out since the last ``ack()`` out
+            again, e.g. because QBank could not take them """
+        with self.lock:
+            self.read_at = self.acked_at
+            self.reading = 0
+            self.handed = []
+
+    def bury(self, entries):
+        """ Keep entries that are given up on in the dead letters file,
+            out of the reader's way """
+        lines = ''.join('{0}\n'.format(json.dumps(entry)) for entry in entries)
+        with self.lock:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            with open(os.path.join(self.path, DEAD_LETTERS), 'ab') as dead_letters:
+                dead_letters.write(lines)
+
+    def acked(self, number):
+        """ Bytes of a segment already acknowledged """
+        try:
+            with open(self.segment_path(number, ACK_SUFFIX), 'rb') as ack_file:
+                return int(ack_file.read())
+        except (IOError, ValueError):
+            return 0
+
+    def save_ack(self):
+        """ Write down how far the reader got; call with the lock held """
+        number, offset = self.acked_at
+        self.unsaved = 0
+        if not os.path.isfile(self.segment_path(number)):
+            return
+        ack_path = self.segment_path(number, ACK_SUFFIX)
+        temp_path = '{0}.tmp'.format(ack_path)
+        with open(temp_path, 'wb') as ack_file:
+            ack_file.write(str(offset))
+        os.rename(temp_path, ack_path)
+
+    def compact(self, number):
+        """ Delete a segment; call with the lock held """
+        path = self.segment_path(number)
+        size = os.path.getsize(path)
+        os.remove(path)
+        ack_path = self.segment_path(number, ACK_SUFFIX)
+        if os.path.isfile(ack_path):
+            os.remove(ack_path)
+        self.total_bytes -= size
+
+    def drop_oldest(self):
+        """ Make room by deleting the oldest closed segment that is not
+            being read. Returns how many entries in it were not
+            acknowledged yet, or None if there was none to delete. """
+        with self.lock:
+            self.loaded()
+            first = self.read_at[0] + 1 if self.reading else self.acked_at[0]
+            numbers = [number for number in self.segments()
+                       if number >= first and number != self.appending()]
+            if not numbers:
+                return None
+            number = numbers[0]
+            offset = self.acked_at[1] if number == self.acked_at[0] else 0
+            dropped = self.count(number, offset)
+            self.compact(number)
+            self.depth -= dropped
+            if number == self.acked_at[0]:
+                self.acked_at = self.read_at = (number + 1, 0)
+            return dropped
+
+    def stats(self):
+        with self.lock:
+            self.loaded()
+            return {
+                'depth': self.depth,
+                'spool_bytes': self.total_bytes,
+                'spool_segments': len(self.segments())
+            }
+
+    def clear(self):
+        """ Delete everything spooled """
+        with self.lock:
+            self.rotate()
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+            self.segment_number = None
+            self.total_bytes = None
@@ -2,30 +2,33 @@
 # pylint: disable=assigning-non-slot,duplicate-code
 from __future__ import unicode_literals, print_function
 
-import codecs
 import functools
 import json
-import mimetypes
 import os
-import sqlite3
-import string
+import stat
 import sys
 import time
-import urllib
 
 from datetime import datetime
-from natsort import natsorted
-from requests.exceptions import ConnectionError
+from requests.exceptions import RequestException
 
-import requests
 import web
 from web.wsgiserver import CherryPyWSGIServer
 
+import byte_ranges
+import content_serving
+import log_index
+import log_pipeline
+import project_store
+import qbank
+import session_store
 import settings
 import utilities
 from main_utilities import get_configuration_file, set_configuration_file,\
     set_user_data_file
-from star_logo_nova import SLNProject, SLNProjects, sln_shared
+from module_tree import ModuleTreeIndex
+from star_logo_nova import SLNProject, SLNProjects, sln_shared, bootstrap,\
+    iter_projects_json
 
 # http://pythonhosted.org/PyInstaller/runtime-information.html#run-time-information
 if getattr(sys, 'frozen', False):
@@ -55,6 +58,8 @@ web.config.debug = False
 urls = (
     '/api/v1/configuration/?', 'configuration',
     '/api/v1/session/?', 'user_session',
+    '/api/v1/qbank/stats/?', 'qbank_stats',
+    '/api/v1/logging/stats/?', 'logging_stats',
     '/api/appdata/?', 'generic_logging',
     '/datastore_path/?', 'bootloader_storage_path',
     '/version/?', 'version',
@@ -66,6 +71,7 @@ urls = (
     '/editor/?', 'star_logo_nova',
     '/api/projects/?', 'sln_projects',
     '/api/project/(.*)/remixes/?', 'sln_remix_project',
+    '/api/project/(.*)/lineage/?', 'sln_project_lineage',
     '/api/project/(.*[^/])/?', 'sln_project',
     # End SLN endpoints
     '/common/(.*)', 'common_tools',
@@ -88,44 +94,15 @@ web.config.session_parameters['timeout'] = 20 * 60  # 20 minutes of inactivity
 # store sessions in SQLite3, because we're running into concurrency issues
 # when using filesystem
 DB_PATH = os.path.join(ABS_PATH, 'unplatform.sqlite3')
-db = web.database(dbn='sqlite', db=DB_PATH)
-store = web.session.DBStore(db, 'sessions')
-
-connection = sqlite3.connect(DB_PATH)
-connection.execute('PRAGMA journal_mode=WAL;')
+store = session_store.SessionStore(DB_PATH)
 
 session = web.session.Session(app,
                               store,
                               initializer={'login': 0, 'survey': {}})
 
-
-def list_dir(root, directory, current_level=0, max_level=4):
-    # recursively list the directories under modules. Set limit to 4, given how
-    # the epubs are structured, but let's make that an option
-    # Tools will show up with an extra level of depth.
-    # Sample output:
-    # ['modules/English Elementary', 'modules/English Elementary/G9',
-    #       'modules/English Elementary/G9/U1',
-    #  'modules/Tools', 'modules/Tools/Bio- Mechanic',
-    #       'modules/Tools/Open Story',
-    #  'modules/Tools/Open Story/css', 'modules/Tools/Open Story/fonts',
-    #       'modules/Tools/Physics Video Player',
-    #  'modules/Tools/Police Quad', 'modules/Tools/Turtle Blocks']
-    sub_dirs = []
-    if current_level < max_level:
-        if (os.path.isdir('{0}/{1}'.format(root, directory)) and
-                not directory.startswith('.')):
-            for sub_dir in os.listdir('{0}/{1}'.format(root, directory)):
-                new_sub_dir = '{0}/{1}'.format(directory, sub_dir)
-                full_sub_dir_path = '{0}/{1}'.format(root, new_sub_dir)
-                if (not sub_dir.startswith('.') and
-                        os.path.isdir(full_sub_dir_path)):
-                    sub_dirs.append(new_sub_dir)
-                    sub_dirs += list_dir(root,
-                                         new_sub_dir,
-                                         current_level=current_level + 1)
-            sub_dirs = natsorted(sub_dirs)
-    return sub_dirs
+modules_index = ModuleTreeIndex(ABS_PATH,
+                                'modules',
+                                max_level=settings.MODULES_MAX_LEVEL)
 
 
 def logged_in():
@@ -141,9 +118,9 @@ def require_login(func):
     @functools.wraps(func)
     def wrapper(self, *args):
         if not logged_in():
-            with open('{0}/templates/session_expired.html'.format(ABS_PATH),
-                      'rb') as session_template:
-                raise web.Forbidden(session_template.read())
+            session_template = content_serving.static_files.get(
+                '{0}/templates/session_expired.html'.format(ABS_PATH))
+            raise web.Forbidden(session_template.data)
         results = func(self, *args)
         return results
     return wrapper
@@ -164,79 +141,127 @@ class index:
 
         # render the unplatform v2 front-end
         index_file = '{0}/static/ui/index.html'.format(ABS_PATH)
-        yield open(index_file, 'rb').read()
+        return content_serving.serve_cached(
+            content_serving.static_files.get(index_file))
 
 
 class generic_logging:
     def _get_log(self):
-        url = settings.QBANK_LOGGING_ENDPOINT
-        req = requests.get(url, verify=False)
-        logs = req.json()
-        default_log = None
-        for log in logs:
-            if log['genusTypeId'] == settings.DEFAULT_LOG_GENUS_TYPE:
-                default_log = log
-                break
-        if default_log is None:
-            payload = {
-                'name': 'Default CLIx log',
-                'description': 'For logging info from unplatform and ' +
-                               'tools, which do not know about catalog IDs',
-                'genusTypeId': settings.DEFAULT_LOG_GENUS_TYPE
-            }
-            req = requests.post(url, json=payload, verify=False)
-            default_log = req.json()
-        return default_log
+        return log_pipeline.default_log()
 
     @require_login
     @utilities.format_response
     def GET(self):
+        """ Log entries, streamed as a JSON list. Optional query
+            parameters, answered from the local index of the entries
+            posted by this server:
+            * ``session_id``
+            * ``since`` / ``until``, ISO times (UTC)
+            * ``limit``, and ``cursor`` from the previous page's
+              X-Next-Cursor header, with at least one of the above
+            Without any of them, QBank's whole list is passed through,
+            with QBank's status. """
+        params = web.input(session_id=None, since=None, until=None,
+                           limit=None, cursor=None)
+        if any(params[key] is not None
+               for key in ('session_id', 'since', 'until')):
+            return self.find(params)
+        if params.limit is not None or params.cursor is not None:
+            # the index only has what this server posted, so it cannot
+            #   page QBank's whole list
+            raise web.BadRequest('limit and cursor need session_id, since or until')
+        # RequestException covers timeouts (QBANK_TIMEOUT) as well as
+        #   QBank being unreachable; DefaultLogError, QBank answering
+        #   the lookup of the default log with an error
         try:
-            default_log = self._get_log()
-        except ConnectionError:
+            url = log_pipeline.log_entries_url(self._get_log()['id'])
+            req = qbank.client.get(url, stream=True)
+            if req.status_code == 404:
+                # the cached default log was deleted; find or make it again
+                req.close()
+                log_pipeline.default_log_cache.invalidate()
+                url = log_pipeline.log_entries_url(self._get_log()['id'])
+                req = qbank.client.get(url, stream=True)
+        except (RequestException, log_pipeline.DefaultLogError):
             return []
-        else:
-            url = '{0}/{1}/logentries'.format(settings.QBANK_LOGGING_ENDPOINT,
-                                              default_log['id'])
-            req = requests.get(url, verify=False)
-            log_entries = req.json()
-            return log_entries
+        if req.status_code >= 400:
+            web.ctx.status = str('{0} {1}'.format(req.status_code, req.reason))
+        # Pass QBank's JSON through a block at a time, rather than
+        #   parsing and re-serializing what can be hundreds of
+        #   thousands of entries
+        return req.iter_content(settings.CONTENT_BLOCK_SIZE)
+
+    @staticmethod
+    def find(params):
+        """ GET from the local log index """
+        filters = {'session_id': params.session_id}
+        limit = None
+        try:
+            if params.since is not None:
+                filters['since'] = utilities.parse_iso_time(params.since)
+            if params.until is not None:
+                filters['until'] = utilities.parse_iso_time(params.until)
+            if params.limit is not None:
+                limit = int(params.limit)
+                if not 1 <= limit <= settings.LOG_MAX_PAGE_SIZE:
+                    raise ValueError('limit out of range')
+            if params.cursor is not None:
+                filters['after'] = utilities.decode_cursor(params.cursor)
+                if len(filters['after']) != 2:
+                    raise ValueError('invalid cursor')
+        except ValueError as ex:
+            raise web.BadRequest(str(ex))
+        entries = log_pipeline.pipeline.index
+        if limit is not None:
+            next_cursor = entries.next_cursor(limit, **filters)
+            if next_cursor is not None:
+                web.header('X-Next-Cursor', next_cursor)
+                web.header('Access-Control-Expose-Headers', 'X-Next-Cursor')
+        return log_index.iter_entries_json(entries.find(limit, **filters))
 
     @require_login
     @utilities.format_response
     def POST(self):
-        # get or find a default log genus type
-        try:
-            default_log = self._get_log()
-        except ConnectionError:
-            return {"msg": "No QBank connection, nothing logged"}
-        else:
-            received_data = web.data()
-            if isinstance(received_data, basestring):
-                try:
-                    received_data = json.loads(received_data)
-                except TypeError:
-                    pass
-
-            payload = {
-                'data': received_data
-            }
-            log_entry_url = '{0}/{1}/logentries'.format(
-                settings.QBANK_LOGGING_ENDPOINT,
-                default_log['id'])
-            session_id = 'none_provided'
-            if 'session_id' in received_data:
-                session_id = received_data['session_id']
-            elif 'sessionId' in received_data:
-                session_id = received_data['sessionId']
-            elif 'user_id' in received_data:
-                session_id = received_data['user_id']
-            elif 'userId' in received_data:
-                session_id = received_data['userId']
-
-            req = requests.post(log_entry_url, json=payload, verify=False,
-                                headers={'x-api-proxy': session_id})
-            return req.json()
+        # Spool the entry for the background sender, so that the
+        #   request never waits on QBank
+        received_data = web.data()
+        if isinstance(received_data, basestring):
+            try:
+                received_data = json.loads(received_data)
+            except (TypeError, ValueError):
+                pass  # log it as it came
+
+        session_id = 'none_provided'
+        if 'session_id' in received_data:
+            session_id = received_data['session_id']
+        elif 'sessionId' in received_data:
+            session_id = received_data['sessionId']
+        elif 'user_id' in received_data:
+            session_id = received_data['user_id']
+        elif 'userId' in received_data:
+            session_id = received_data['userId']
+
+        if not log_pipeline.pipeline.submit(session_id, received_data):
+            # the spool is full, and the drop policy kept the older entries
+            web.ctx.status = str('503 Service Unavailable')
+            web.header('Retry-After', str(settings.LOG_SPOOL_RETRY_SECONDS))
+            return {'queued': False}
+        web.ctx.status = str('202 Accepted')
+        return {'queued': True}
+
+
+class logging_stats:
+    """ Depth of the /api/appdata spool, and what happened to entries """
+    @utilities.format_response
+    def GET(self):
+        return log_pipeline.pipeline.stats()
+
+
+class qbank_stats:
+    """ Latency of the calls made to QBank, per endpoint """
+    @utilities.format_response
+    def GET(self):
+        return qbank.client.stats()
 
 
 class reset_session:
@@ -253,19 +278,18 @@ class common_tools:
     @require_login
     @utilities.format_html_response
     def GET(self, tool_name=None):
-        tool_file = '{0}/modules/Tools/{1}/index.html'.format(
-            ABS_PATH, tool_name)
-        if not os.path.isfile(tool_file):
-            yield web.notfound("Sorry, that tool was not found.")
-        else:
-            with open(tool_file, 'rb') as tool:
-                if 'lang' in web.input():
-                    template = string.Template(tool.read())
-                    yield template.substitute({
-                        'lang': web.input()['lang']
-                    })
-                else:
-                    yield tool.read()
+        tool_path = 'Tools/{0}/index.html'.format(tool_name)
+        tool_file = '{0}/modules/{1}'.format(ABS_PATH, tool_path)
+        params = web.input()
+        try:
+            page = content_serving.tool_pages.get(tool_file,
+                                                  params.get('lang'))
+        except (IOError, OSError):
+            return web.notfound("Sorry, that tool was not found.")
+
+        return content_serving.serve_cached(
+            page,
+            content_serving.cache_control_for(tool_path))
 
 
 class configuration:
@@ -285,87 +309,90 @@ class content:
     # whenever content logs to the generic logging API, that will check
     # logged in state.
     # @require_login
-    # pylint: disable=too-many-locals
     def GET(self, path=None):
         full_path = os.path.join(ABS_PATH, 'modules', path)
-        if not os.path.isfile(full_path):
-            yield web.notfound("Sorry, {0} was not found".format(path))
-        else:
-            url = urllib.pathname2url(full_path)
-            mimetype = mimetypes.guess_type(url)
-            web.header('Content-Type', mimetype[0])
-
-            if url.endswith('css'):
-                web.header('Content-Type', 'text/css')
-            # web.header('Content-Length', os.path.getsize(full_path))
-            web.header('Accept-Ranges', 'bytes')
-
-            file_handle = codecs.open(full_path, 'r', encoding='utf-8')
-            try:
-                file_handle.read()
-            except UnicodeDecodeError:
-                file_handle = open(full_path, 'rb')
-            file_handle.seek(0)
-
-            # The algorithm below for streaming partial content was
-            # based off of this post:
-            # https://benramsey.com/blog/2008/05/206-partial-content-and-range-requests/
-
-            continue_with_stream = True
-            byte_range = utilities.get_byte_ranges()
-            total_bytes_to_read = os.path.getsize(file_handle.name)
-            content_length = os.path.getsize(file_handle.name)
-            bytes_to_throw_away = 0
-            if byte_range is not None:
-                bytes_to_throw_away = int(byte_range[0])
-                if (bytes_to_throw_away > total_bytes_to_read or
-                        bytes_to_throw_away < 0):
-                    web.ctx.status = '416 Requested Range Not Satisfiable'
-                    continue_with_stream = False
-                    yield ''
-                file_handle.read(bytes_to_throw_away)
-                total_bytes_to_read = os.path.getsize(
-                    file_handle.name
-                ) - bytes_to_throw_away
-                if byte_range[1] != '':
-                    total_bytes_to_read = int(
-                        byte_range[1]
-                    ) - bytes_to_throw_away
-
-            bytes_read = 0
-
-            num_bytes_to_read = 1024 * 8
-            starting_bytes = bytes_to_throw_away
-            # BEWARE for python 3 ... if ever used. Web.py is not
-            #   Python 3 compatible, though.
-            web.ctx.status = str('206 Partial Content')
-
-            while continue_with_stream:
-                remaining_bytes = total_bytes_to_read - bytes_read
-                bytes_to_read = min(num_bytes_to_read, remaining_bytes)
-                buf = file_handle.read(bytes_to_read)
-                if not buf:
-                    break
-
-                # web.header('Content-Length', str(bytes_to_read))
-                web.header('Content-Range', 'bytes {0}-{1}/{2}'.format(
-                    str(starting_bytes),
-                    str(starting_bytes + bytes_to_read),
-                    str(content_length)))
-
-                bytes_read += bytes_to_read
-                starting_bytes += bytes_to_read
-                yield buf
+        try:
+            file_stat = os.stat(full_path)
+        except OSError:
+            file_stat = None
+        if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+            return web.notfound("Sorry, {0} was not found".format(path))
+
+        # Decided from the mimetype alone, so the file is never read
+        #   (or decoded) just to pick a Content-Type.
+        content_type = content_serving.content_types.get(full_path,
+                                                         file_stat.st_mtime)
+        web.header('Accept-Ranges', 'bytes')
+
+        etag, last_modified = content_serving.validators.get(full_path,
+                                                             file_stat)
+        if content_serving.set_validators(
+                etag,
+                last_modified,
+                file_stat.st_mtime,
+                content_serving.cache_control_for(path)):
+            return ''
+
+        size = file_stat.st_size
+        range_header = web.ctx.env.get('HTTP_RANGE')
+        if not content_serving.is_current_range(web.ctx.env,
+                                                etag,
+                                                file_stat.st_mtime):
+            range_header = None
+        try:
+            ranges = byte_ranges.parse_range_header(range_header, size)
+        except byte_ranges.RangeNotSatisfiable:
+            web.ctx.status = str('416 Requested Range Not Satisfiable')
+            web.header('Content-Range', 'bytes */{0}'.format(size))
+            return ''
+
+        # Always stream raw bytes -- a descriptor handed off to the
+        #   server cannot be decoded on the way out.
+        file_handle = open(full_path, 'rb')
+
+        if ranges is None:
+            web.header('Content-Type', content_type)
+            web.header('Content-Length', str(size))
+            return content_serving.send_file(web.ctx.env, file_handle)
+
+        # BEWARE for python 3 ... if ever used. Web.py is not
+        #   Python 3 compatible, though.
+        web.ctx.status = str('206 Partial Content')
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            web.header('Content-Type', content_type)
+            web.header('Content-Length', str(end - start + 1))
+            web.header('Content-Range',
+                       byte_ranges.content_range(start, end, size))
+            return content_serving.send_file(web.ctx.env,
+                                             file_handle,
+                                             start,
+                                             end - start + 1)
+
+        body = byte_ranges.MultipartByteranges(file_handle,
+                                               ranges,
+                                               size,
+                                               content_type)
+        web.header('Content-Type', body.content_type)
+        web.header('Content-Length', str(body.content_length))
+        return iter(body)
 
 
 class modules_list:
-    @utilities.format_response
+    @utilities.allow_cors
     def GET(self):
         # send the entire
         # file structure for /modules in one go, so that the
         # OS doesn't have to be re-walked every time.
-        data = list_dir(ABS_PATH, 'modules')
-        return data
+        body, etag = modules_index.get()
+        web.header('ETag', etag)
+        web.header('Cache-Control', 'no-cache')
+        if content_serving.etag_matches(
+                web.ctx.env.get('HTTP_IF_NONE_MATCH', ''), etag):
+            web.ctx.status = str('304 Not Modified')
+            return ''
+        web.header('Content-type', 'application/json')
+        return body
 
 
 class oea_tool:
@@ -375,8 +402,8 @@ class oea_tool:
     # pylint: disable=unused-argument
     def GET(self, path=None):
         oea_file_path = '{0}/static/oea/index.html'.format(ABS_PATH)
-        with open(oea_file_path, 'rb') as oea_index:
-            yield oea_index.read()
+        return content_serving.serve_cached(
+            content_serving.static_files.get(oea_file_path))
 
 
 class star_logo_nova:
@@ -385,23 +412,70 @@ class star_logo_nova:
     # pylint: disable=unused-argument
     def GET(self, path=None):
         sln_file_path = '{0}/static/sln_editor/editor.html'.format(ABS_PATH)
-        with open(sln_file_path, 'rb') as sln_index:
-            yield sln_index.read()
+        return content_serving.serve_cached(
+            content_serving.static_files.get(sln_file_path))
 
 
 class sln_projects(sln_shared, utilities.BaseClass):
     """ Shows the list of available StarLogoNova projects """
     @utilities.format_response
     def GET(self):
-        """ get all StarLogoNova projects """
+        """ get StarLogoNova projects, streamed as a JSON list.
+            Optional query parameters:
+            * ``limit`` / ``offset``
+            * ``cursor``, from the previous page's X-Next-Cursor header
+            * ``metadata=true`` to leave out each ``project_str``
+            * ``ids=a,b,c`` for just those projects, in that order
+              (paging parameters are then ignored) """
+        params = web.input(limit=None, offset='0', cursor=None,
+                           metadata='false', ids=None)
+        metadata_only = params.metadata.lower() in ('1', 'true')
+        if params.ids is not None:
+            return self.get_batch(params.ids, metadata_only)
+        try:
+            limit = None
+            if params.limit is not None:
+                limit = int(params.limit)
+            offset = int(params.offset)
+            if (limit is not None and limit < 1) or offset < 0:
+                raise ValueError('limit / offset out of range')
+            if params.cursor is not None:
+                SLNProjects.decode_cursor(params.cursor)
+        except ValueError as ex:
+            raise web.BadRequest(str(ex))
+
+        bank = self.get_or_create_bank()
+        offered = self.get_or_create_assessment_offered(bank['id'])
+        req = qbank.client.get(self.results_url(bank['id'], offered['id']))
+        bootstrap.check(req)
+        # The results already carry each project's section, so index
+        #   them once instead of fetching them again. Now sort the
+        #   projects by genusTypeId (locked status) and save date
+        takens = project_store.store.overlay(req.json())
+        projects, next_cursor = SLNProjects(takens, results=takens).page(
+            order_by=['is_locked', 'saved_time'],
+            limit=limit,
+            offset=offset,
+            cursor=params.cursor)
+        if next_cursor is not None:
+            web.header('X-Next-Cursor', next_cursor)
+            web.header('Access-Control-Expose-Headers', 'X-Next-Cursor')
+        return iter_projects_json(projects, metadata_only=metadata_only)
+
+    def get_batch(self, ids, metadata_only):
+        """ Several projects by ID, from the local project store where
+            possible; one /results download covers the rest """
+        taken_ids = [taken_id for taken_id in ids.split(',') if taken_id]
+        if not taken_ids or len(taken_ids) > settings.SLN_MAX_BATCH_IDS:
+            raise web.BadRequest('ids must list 1 to {0} project IDs'.format(
+                settings.SLN_MAX_BATCH_IDS))
         bank = self.get_or_create_bank()
         offered = self.get_or_create_assessment_offered(bank['id'])
-        req = requests.get(self.results_url(bank['id'], offered['id']),
-                           verify=False)
-        # Now sort the projects by genusTypeId (locked status) and
-        #   save date
-        return SLNProjects(req.json()).serialize(
-            order_by=['is_locked', 'saved_at'])
+        takens = project_store.store.load_many(bank['id'], offered['id'],
+                                               taken_ids)
+        return iter_projects_json([SLNProject(taken, results=[taken])
+                                   for taken in takens],
+                                  metadata_only=metadata_only)
 
     @utilities.format_response
     def POST(self):
@@ -446,24 +520,65 @@ class sln_remix_project(sln_shared, utilities.BaseClass):
         return SLNProject(taken).serialize
 
 
+class sln_project_lineage(sln_shared, utilities.BaseClass):
+    """ Where a StarLogoNova project was remixed from, and its remixes """
+    @utilities.format_response
+    def GET(self, project_id):
+        """ The project, its ancestors (parent first) and its remixes
+            as a tree, each as metadata only (no ``project_str``).
+            ``depth`` limits how many levels are walked each way. """
+        params = web.input(depth=str(settings.SLN_LINEAGE_DEPTH))
+        try:
+            depth = int(params.depth)
+            if not 0 < depth <= settings.SLN_LINEAGE_MAX_DEPTH:
+                raise ValueError('depth must be 1 to {0}'.format(
+                    settings.SLN_LINEAGE_MAX_DEPTH))
+        except ValueError as ex:
+            raise web.BadRequest(str(ex))
+
+        bank = self.get_or_create_bank()
+        offered = self.get_or_create_assessment_offered(bank['id'])
+        results = self.get_results_index(bank['id'], offered['id'])
+        taken_id = utilities.escape(project_id)
+        if taken_id not in results.by_id:
+            raise web.NotFound('Project {0} not found'.format(taken_id))
+        unsynced = project_store.store.unsynced()
+
+        def metadata(taken):
+            taken = unsynced.get(taken['id'], taken)
+            return SLNProject(taken, results=[taken]).metadata
+
+        def remixes(tree):
+            return [dict(metadata(taken), remixes=remixes(children))
+                    for taken, children in tree]
+
+        return {
+            'project': metadata(results.by_id[taken_id]),
+            'ancestors': [metadata(taken)
+                          for taken in results.ancestors(taken_id, depth)],
+            'remixes': remixes(results.descendants(taken_id, depth))
+        }
+
+
 class sln_project(sln_shared, utilities.BaseClass):
     """ Manage a specific StarLogoNova project """
     @utilities.format_response
     def PATCH(self, project_id):
-        """ Save the data for an existing StarLogoNova project """
+        """ Save the data for an existing StarLogoNova project. The save
+            is recorded locally and pushed to QBank in the background. """
         data = self.data()
         bank = self.get_or_create_bank()
-        taken = self.update_assessment_taken(bank['id'],
-                                             project_id,
-                                             data)
-        return SLNProject(taken).serialize
+        taken = project_store.store.save(bank['id'],
+                                         project_id,
+                                         data)
+        return SLNProject(taken, results=[taken]).serialize
 
     @utilities.format_response
     def GET(self, project_id):
         """ get the specific project """
         bank = self.get_or_create_bank()
-        taken = self.get_assessment_taken(bank['id'], project_id)
-        return SLNProject(taken).serialize
+        taken = project_store.store.load(bank['id'], project_id)
+        return SLNProject(taken, results=[taken]).serialize
 
 
 class user_session:
@@ -504,4 +619,14 @@ def is_test():
 
 if (not is_test()) and __name__ == "__main__":
     sys.argv.append('8888')
-    app.run()
+    modules_index.build()
+    sync_worker = project_store.SyncWorker(project_store.store)
+    sync_worker.start()
+    log_sender = log_pipeline.LogSender(log_pipeline.pipeline)
+    log_sender.start()
+    try:
+        app.run(content_serving.sendfile_middleware)
+    finally:
+        log_sender.stop()
+        sync_worker.stop()
+        store.flush_touches()
@@ -12,8 +12,12 @@ else:
 
 CONFIG_DIR = '{0}/webapps/unplatform/configuration'.format(ABS_PATH)
 CONFIG_FILE = '{0}/config.json'.format(CONFIG_DIR)
+SLN_BOOTSTRAP_FILE = '{0}/sln_bootstrap.json'.format(CONFIG_DIR)
+SLN_PROJECTS_DB = '{0}/sln_projects.sqlite3'.format(ABS_PATH)
 
 USER_DATA_DIR = '{0}/webapps/unplatform/user_data'.format(ABS_PATH)
+LOG_SPOOL_DIR = '{0}/webapps/unplatform/log_spool'.format(ABS_PATH)
+LOG_INDEX_DB = '{0}/webapps/unplatform/log_index.sqlite3'.format(ABS_PATH)
 
 
 def get_configuration_file():
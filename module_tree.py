@@ -0,0 +1,213 @@
+""" In-memory index of the directory tree under ``modules/``, served by
+    ``/modules_list``. """
+import hashlib
+import json
+import os
+import threading
+import time
+
+from natsort import natsort_keygen
+
+import settings
+
+try:
+    from os import scandir  # pylint: disable=ungrouped-imports
+except ImportError:
+    try:
+        # Python 2 backport
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+natural_key = natsort_keygen()
+
+
+def list_sub_dirs(full_path):
+    """ Names of the visible sub-directories of ``full_path``, in
+        natural order. Uses the dirent type from ``scandir`` where
+        available, so no extra stat is needed per entry. """
+    if scandir is not None:
+        names = [entry.name
+                 for entry in scandir(full_path)
+                 if not entry.name.startswith('.') and entry.is_dir()]
+    else:
+        names = [name
+                 for name in os.listdir(full_path)
+                 if (not name.startswith('.') and
+                     os.path.isdir(os.path.join(full_path, name)))]
+    names.sort(key=natural_key)
+    return names
+
+
+def _sub_dir_paths(root, directory):
+    try:
+        names = list_sub_dirs(os.path.join(root, directory))
+    except OSError:
+        return []
+    return ['{0}/{1}'.format(directory, name) for name in names]
+
+
+def iter_module_dirs(root, directory, max_level=None):
+    """ Yield the directories under ``root/directory`` (relative to
+        ``root``), down to ``max_level`` levels, parents before their
+        children and siblings in natural order. Iterative, so deep
+        trees do not recurse. """
+    if max_level is None:
+        max_level = settings.MODULES_MAX_LEVEL
+    if directory.startswith('.') or max_level <= 0:
+        return
+    # (relative directory, level) still to yield, depth-first; children
+    #   are pushed in reverse so the first one comes off next
+    stack = [(sub_dir, 1)
+             for sub_dir in reversed(_sub_dir_paths(root, directory))]
+    while stack:
+        current, level = stack.pop()
+        yield current
+        if level < max_level:
+            stack.extend((sub_dir, level + 1)
+                         for sub_dir in reversed(_sub_dir_paths(root,
+                                                                current)))
+
+
+def walk_modules(root, directory, max_level=None):
+    """ List form of ``iter_module_dirs`` """
+    return list(iter_module_dirs(root, directory, max_level))
+
+
+def iter_json_listing(root, directory, max_level=None):
+    """ Emit the ``iter_module_dirs`` listing as a JSON array, one
+        directory at a time """
+    separator = '['
+    for path in iter_module_dirs(root, directory, max_level):
+        yield separator + json.dumps(path)
+        separator = ', '
+    yield '[]' if separator == '[' else ']'
+
+
+# pylint: disable=too-many-instance-attributes
+class ModuleTreeIndex:
+    """ Keeps the listing of every directory under ``root/directory``,
+        down to ``max_level`` levels, in memory.
+
+        The tree is walked once. After that, ``refresh()`` only stats the
+        directories already in the index (at most once every
+        ``refresh_interval`` seconds), and re-lists just the ones whose
+        mtime changed -- a directory's mtime changes whenever an entry is
+        added, removed or renamed in it. """
+    def __init__(self, root, directory='modules', max_level=None,
+                 refresh_interval=None):
+        if max_level is None:
+            max_level = settings.MODULES_MAX_LEVEL
+        if refresh_interval is None:
+            refresh_interval = settings.MODULES_INDEX_REFRESH_INTERVAL
+        self.root = root
+        self.directory = directory
+        self.max_level = max_level
+        self.refresh_interval = refresh_interval
+        # relative directory -> (level, mtime, [relative sub-directories])
+        self.listed = {}
+        self.body = None
+        self.etag = None
+        self.last_refresh = None
+        self.lock = threading.Lock()
+
+    def _full_path(self, directory):
+        return os.path.join(self.root, directory)
+
+    def _list(self, directory):
+        """ Return ``(mtime, sub_dirs)`` for one directory, or None if
+            it is gone """
+        full_path = self._full_path(directory)
+        try:
+            mtime = os.stat(full_path).st_mtime
+            names = list_sub_dirs(full_path)
+        except OSError:
+            return None
+        return mtime, ['{0}/{1}'.format(directory, name) for name in names]
+
+    def _scan(self, directory, level):
+        """ Index ``directory`` and everything under it """
+        if level >= self.max_level or directory.startswith('.'):
+            return
+        listing = self._list(directory)
+        if listing is None:
+            return
+        mtime, sub_dirs = listing
+        self.listed[directory] = (level, mtime, sub_dirs)
+        for sub_dir in sub_dirs:
+            self._scan(sub_dir, level + 1)
+
+    def _forget(self, directory):
+        """ Drop ``directory`` and everything under it from the index """
+        entry = self.listed.pop(directory, None)
+        if entry is not None:
+            for sub_dir in entry[2]:
+                self._forget(sub_dir)
+
+    def _iter_paths(self):
+        """ Same order as ``iter_module_dirs`` """
+        if self.directory not in self.listed:
+            return
+        stack = list(reversed(self.listed[self.directory][2]))
+        while stack:
+            current = stack.pop()
+            yield current
+            if current in self.listed:
+                stack.extend(reversed(self.listed[current][2]))
+
+    def _render(self):
+        self.body = json.dumps(list(self._iter_paths()))
+        self.etag = '"{0}"'.format(hashlib.md5(self.body).hexdigest())
+
+    def build(self):
+        """ Walk the whole tree """
+        with self.lock:
+            self.listed = {}
+            self._scan(self.directory, 0)
+            self._render()
+            self.last_refresh = time.time()
+
+    def refresh(self, force=False):
+        """ Re-list only the directories whose mtime changed """
+        if self.body is None:
+            self.build()
+            return
+        with self.lock:
+            now = time.time()
+            if not force and now - self.last_refresh < self.refresh_interval:
+                return
+            self.last_refresh = now
+            changed = False
+            if self.directory not in self.listed:
+                # e.g. modules/ did not exist yet at the last walk
+                self._scan(self.directory, 0)
+                changed = self.directory in self.listed
+            for directory, (level, mtime, sub_dirs) in self.listed.items():
+                if directory not in self.listed:
+                    continue  # forgotten earlier in this loop
+                try:
+                    current_mtime = os.stat(
+                        self._full_path(directory)).st_mtime
+                except OSError:
+                    current_mtime = None
+                if current_mtime == mtime:
+                    continue
+                changed = True
+                listing = self._list(directory)
+                if listing is None:
+                    self._forget(directory)
+                    continue
+                current_mtime, current_sub_dirs = listing
+                for sub_dir in set(sub_dirs) - set(current_sub_dirs):
+                    self._forget(sub_dir)
+                self.listed[directory] = (level, current_mtime,
+                                          current_sub_dirs)
+                for sub_dir in set(current_sub_dirs) - set(sub_dirs):
+                    self._scan(sub_dir, level + 1)
+            if changed:
+                self._render()
+
+    def get(self):
+        """ Return ``(json_body, etag)`` for the current tree """
+        self.refresh()
+        return self.body, self.etag
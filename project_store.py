@@ -0,0 +1,382 @@
+""" Local write-through store for StarLogoNova projects.
+
+    Saves are written to SQLite and acknowledged straight away, without
+    calling QBank whenever there is a local copy to edit; a background
+    ``SyncWorker`` pushes them to QBank later, and parks edits to
+    projects locked in QBank meanwhile. Only the latest edit of each
+    project is kept, so a burst of autosaves turns into a single
+    submit. """
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+import qbank
+import settings
+import utilities
+
+from main_utilities import SLN_PROJECTS_DB
+from star_logo_nova import ProjectLocked, SLNProject, SLNResults, bootstrap, sln_shared
+
+SCHEMA = """
+create table if not exists sln_projects (
+    taken_id text primary key,
+    bank_id text not null,
+    taken text not null,
+    pending text,
+    version integer not null default 0,
+    first_saved_at real,
+    saved_at real,
+    attempts integer not null default 0,
+    fetched_at real,
+    next_attempt_at real,
+    parked text
+)"""
+
+# Why an edit is parked when QBank has the project as read-only
+LOCKED_IN_QBANK = 'locked in QBank'
+
+# The parts of a project that the editor can change
+EDITABLE_FIELDS = ('title', 'description', 'project_str')
+
+
+def apply_edits(taken, data, now):
+    """ Change the taken (as returned by ``/results``, so with its
+        section) the way QBank will once ``data`` is submitted """
+    if 'title' in data:
+        taken.setdefault('displayName', {})['text'] = data['title']
+    if 'description' in data:
+        taken.setdefault('description', {})['text'] = data['description']
+    question = taken['sections'][0]['questions'][0]
+    response = question.get('response') or {}
+    response['text'] = {'text': data['project_str']}
+    response['submissionTime'] = {
+        'year': now.year,
+        'month': now.month,
+        'day': now.day,
+        'hour': now.hour,
+        'minute': now.minute,
+        'second': now.second,
+        'microsecond': now.microsecond
+    }
+    question['response'] = response
+    question['responded'] = True
+    return taken
+
+
+# pylint: disable=too-many-public-methods
+class ProjectStore:
+    """ SQLite copy of the StarLogoNova projects this server has served,
+        plus the edits not yet pushed to QBank. Projects are keyed by
+        their escaped ID, as QBank returns it (``...%3A...%40...``).
+
+        Edits that QBank will not take are parked rather than dropped:
+        the edit stays in the store (see ``parked()``), but is no longer
+        pushed or shown in place of QBank's copy. """
+    def __init__(self, path=SLN_PROJECTS_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # every connection handed out, so that ``reset()`` can close them
+        self.connections = []
+
+    def connect(self):
+        """ This thread's connection """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10,
+                                         check_same_thread=False)
+            connection.execute(SCHEMA)
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    @contextmanager
+    def write(self):
+        """ A connection for one committed read-modify-write """
+        connection = self.connect()
+        with self.lock, connection:
+            yield connection
+
+    def get(self, taken_id):
+        """ The local copy of the taken, with its section, or None """
+        taken_id = utilities.escape(taken_id)
+        row = self.connect().execute(
+            'select taken from sln_projects where taken_id = ?',
+            (taken_id,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def fresh(self, taken_id):
+        """ The local copy of the taken, if it has edits still to be
+            pushed or was fetched from QBank less than
+            ``settings.SLN_PROJECT_MAX_AGE`` seconds ago; otherwise None """
+        taken_id = utilities.escape(taken_id)
+        return self.fresh_many([taken_id]).get(taken_id)
+
+    def fresh_many(self, taken_ids):
+        """ escaped taken ID -> ``fresh()`` local copy, in one query """
+        if not taken_ids:
+            return {}
+        rows = self.connect().execute(
+            'select taken_id, taken from sln_projects where taken_id in ({0}) and '
+            '((pending is not null and parked is null) or fetched_at >= ?)'.format(
+                ', '.join('?' * len(taken_ids))),
+            list(taken_ids) + [time.time() - settings.SLN_PROJECT_MAX_AGE]).fetchall()
+        return dict((taken_id, json.loads(taken)) for taken_id, taken in rows)
+
+    def remember(self, bank_id, taken_id, taken):
+        """ Keep a copy of a taken fetched from QBank, unless it has
+            local edits that QBank does not have yet """
+        taken_id = utilities.escape(taken_id)
+        now = time.time()
+        with self.write() as connection:
+            connection.execute(
+                'insert or ignore into sln_projects (taken_id, bank_id, taken, fetched_at) '
+                'values (?, ?, ?, ?)',
+                (taken_id, bank_id, json.dumps(taken), now))
+            connection.execute(
+                'update sln_projects set taken = ?, fetched_at = ? '
+                'where taken_id = ? and (pending is null or parked is not null)',
+                (json.dumps(taken), now, taken_id))
+
+    def load(self, bank_id, taken_id):
+        """ The local copy of the taken, fetched from QBank the first
+            time it is asked for, and again once it is
+            ``settings.SLN_PROJECT_MAX_AGE`` seconds old. While QBank
+            cannot be reached, a stale local copy is returned as it is. """
+        taken = self.fresh(taken_id)
+        if taken is not None:
+            return taken
+        try:
+            project = SLNProject(sln_shared().get_assessment_taken(bank_id, taken_id))
+            taken = dict(project.my_map, sections=[project.get_section()])
+        except Exception:  # pylint: disable=broad-except
+            taken = self.get(taken_id)
+            if taken is None:
+                raise
+            return taken
+        self.remember(bank_id, taken_id, taken)
+        return taken
+
+    def load_many(self, bank_id, offered_id, taken_ids):
+        """ The local copies of several takens, in the order asked for.
+            Any not seen before come from one ``/results`` download
+            (which also carries their sections); IDs that QBank does not
+            know are left out. """
+        taken_ids = [utilities.escape(taken_id) for taken_id in taken_ids]
+        found = self.fresh_many(taken_ids)
+        missing = [taken_id for taken_id in taken_ids if taken_id not in found]
+        if missing:
+            shared = sln_shared()
+            req = qbank.client.get(shared.results_url(bank_id, offered_id))
+            bootstrap.check(req)
+            results = SLNResults(req.json())
+            for taken_id in missing:
+                taken = results.by_id.get(taken_id)
+                if taken is not None:
+                    self.remember(bank_id, taken_id, taken)
+                    found[taken_id] = taken
+        return [found[taken_id] for taken_id in taken_ids if taken_id in found]
+
+    def save(self, bank_id, taken_id, data):
+        """ Record an edit locally and return the updated taken. The
+            edit is merged into any that are still waiting for QBank.
+            QBank is only asked for the project if there is no local
+            copy at all, however old, so saves do not wait on it; the
+            sync checks QBank's lock and parks the edit if it is set.
+            Raises ``ProjectLocked`` if the local copy is read-only, or
+            the last edit was parked because QBank's copy was. """
+        if 'project_str' not in data:
+            raise KeyError('project_str required in data')
+        if self.get(taken_id) is None:
+            self.load(bank_id, taken_id)
+        taken_id = utilities.escape(taken_id)
+        edits = dict((field, data[field])
+                     for field in EDITABLE_FIELDS
+                     if field in data)
+        with self.write() as connection:
+            taken_json, pending_json, parked, fetched_at = connection.execute(
+                'select taken, pending, parked, fetched_at from sln_projects '
+                'where taken_id = ?',
+                (taken_id,)).fetchone()
+            # until QBank's copy is fetched again, a lock found by the
+            #   sync is only known from why the edit was parked
+            if SLNProject.locked(json.loads(taken_json)) or \
+                    (parked == LOCKED_IN_QBANK and fetched_at is None):
+                raise ProjectLocked('Cannot edit this project')
+            pending = json.loads(pending_json) if pending_json else {}
+            pending.update(edits)
+            taken = apply_edits(json.loads(taken_json), edits,
+                                datetime.utcnow())
+            now = time.time()
+            # a new edit is pushed again, even if the last one was parked
+            connection.execute(
+                'update sln_projects set taken = ?, pending = ?, '
+                'version = version + 1, saved_at = ?, '
+                'first_saved_at = coalesce(first_saved_at, ?), '
+                'attempts = 0, next_attempt_at = null, parked = null '
+                'where taken_id = ?',
+                (json.dumps(taken), json.dumps(pending), now, now, taken_id))
+        return taken
+
+    def unsynced(self):
+        """ taken ID -> local copy, for the takens with unsynced edits """
+        rows = self.connect().execute(
+            'select taken_id, taken from sln_projects '
+            'where pending is not null and parked is null').fetchall()
+        return dict((taken_id, json.loads(taken)) for taken_id, taken in rows)
+
+    def overlay(self, takens):
+        """ Swap in the local copy of any taken with unsynced edits """
+        local = self.unsynced()
+        if not local:
+            return takens
+        return [local.get(taken.get('id'), taken) for taken in takens]
+
+    def due(self, now=None):
+        """ IDs of the takens whose edits should be pushed now """
+        if now is None:
+            now = time.time()
+        rows = self.connect().execute(
+            'select taken_id from sln_projects '
+            'where pending is not null and parked is null '
+            'and (saved_at <= ? or first_saved_at <= ?) '
+            'and (next_attempt_at is null or next_attempt_at <= ?)',
+            (now - settings.SLN_SYNC_DELAY,
+             now - settings.SLN_SYNC_MAX_DELAY,
+             now)).fetchall()
+        return [row[0] for row in rows]
+
+    def pending(self):
+        """ IDs of all takens with unsynced edits, other than parked
+            ones """
+        rows = self.connect().execute(
+            'select taken_id from sln_projects '
+            'where pending is not null and parked is null').fetchall()
+        return [row[0] for row in rows]
+
+    def parked(self):
+        """ taken ID -> why its edit was parked, the edit, and how many
+            times it was tried """
+        rows = self.connect().execute(
+            'select taken_id, parked, pending, attempts from sln_projects '
+            'where parked is not null').fetchall()
+        return dict((taken_id, {'reason': reason,
+                                'edit': json.loads(pending),
+                                'attempts': attempts})
+                    for taken_id, reason, pending, attempts in rows)
+
+    def sync(self, taken_id):
+        """ Push the latest edit of one taken to QBank. The edit is only
+            cleared once QBank has taken the submit. Returns False if it
+            failed and will be tried again later. """
+        row = self.connect().execute(
+            'select bank_id, pending, version, attempts from sln_projects '
+            'where taken_id = ? and parked is null',
+            (taken_id,)).fetchone()
+        if row is None or row[1] is None:
+            return True
+        bank_id, pending, version, attempts = row
+        try:
+            sln_shared().update_assessment_taken(bank_id, taken_id,
+                                                 json.loads(pending))
+        except ProjectLocked:
+            # Locked in QBank meanwhile; keep the edit, but stop pushing it
+            self.park(taken_id, LOCKED_IN_QBANK)
+            return True
+        except qbank.QBankError as ex:
+            self.retry_later(taken_id, attempts + 1,
+                             refused=400 <= ex.status_code < 500)
+            return False
+        except Exception:  # pylint: disable=broad-except
+            self.retry_later(taken_id, attempts + 1)
+            return False
+        with self.write() as connection:
+            # Leave anything saved while we were talking to QBank for
+            #   the next round
+            connection.execute(
+                'update sln_projects set pending = null, '
+                'first_saved_at = null, attempts = 0, next_attempt_at = null '
+                'where taken_id = ? and version = ?',
+                (taken_id, version))
+        return True
+
+    def retry_later(self, taken_id, attempts, refused=False):
+        """ Back off exponentially after a failed push. An edit QBank
+            refused after ``settings.SLN_SYNC_MAX_ATTEMPTS`` tries is
+            parked instead. """
+        if refused and attempts >= settings.SLN_SYNC_MAX_ATTEMPTS:
+            self.park(taken_id, 'refused by QBank', attempts)
+            return
+        delay = min(settings.SLN_SYNC_RETRY_DELAY * 2 ** (attempts - 1),
+                    settings.SLN_SYNC_RETRY_MAX_DELAY)
+        with self.write() as connection:
+            connection.execute(
+                'update sln_projects set attempts = ?, next_attempt_at = ? '
+                'where taken_id = ?',
+                (attempts, time.time() + delay, taken_id))
+
+    def park(self, taken_id, reason, attempts=None):
+        """ Stop pushing a taken's edit, keeping it for ``parked()``.
+            The local copy is fetched from QBank again on next use. """
+        with self.write() as connection:
+            connection.execute(
+                'update sln_projects set parked = ?, '
+                'attempts = coalesce(?, attempts), next_attempt_at = null, '
+                'fetched_at = null '
+                'where taken_id = ?',
+                (reason, attempts, taken_id))
+
+    def sync_due(self, now=None):
+        for taken_id in self.due(now):
+            self.sync(taken_id)
+
+    def flush(self):
+        """ Push every unsynced edit now, e.g. on shutdown """
+        for taken_id in self.pending():
+            self.sync(taken_id)
+
+    def reset(self):
+        """ Close every connection, e.g. before the file is removed """
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for connection in connections:
+            connection.close()
+        self.local = threading.local()
+
+    def clear(self):
+        self.reset()
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+class SyncWorker(threading.Thread):
+    """ Pushes due edits from a ``ProjectStore`` to QBank every
+        ``interval`` seconds """
+    def __init__(self, project_store, interval=None):
+        threading.Thread.__init__(self, name='sln-project-sync')
+        if interval is None:
+            interval = settings.SLN_SYNC_INTERVAL
+        self.daemon = True
+        self.project_store = project_store
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.project_store.sync_due()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.project_store.flush()
+
+
+store = ProjectStore()
@@ -0,0 +1,104 @@
+""" Shared HTTP client for QBank. All calls from unplatform go through
+    ``qbank.client``, so that connections (and their TLS sessions) are
+    kept alive and reused across requests. """
+import re
+import threading
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+import settings
+
+# QBank / OSID identifiers in URLs, like
+#   assessment.Bank%3A5a9f...%40ODL.MIT.EDU, collapse to one metrics key
+OSID_ID = re.compile(r'[^/?]*%3A[^/?]*%40[^/?]*')
+
+# Methods that are safe to retry when QBank does not answer. POST is
+#   left out, so a slow submit is never replayed.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+class QBankError(Exception):
+    """ QBank answered a request with an error status """
+    def __init__(self, req):
+        Exception.__init__(self, 'QBank answered {0}'.format(req.status_code))
+        self.status_code = req.status_code
+
+
+class QBankClient:
+    """ A ``requests.Session`` with a keep-alive connection pool sized for
+        the server's worker threads, default timeouts and retries, and
+        per-endpoint latency metrics """
+    def __init__(self, pool_size=None, timeout=None, retries=None):
+        if pool_size is None:
+            pool_size = settings.QBANK_POOL_SIZE
+        if timeout is None:
+            timeout = settings.QBANK_TIMEOUT
+        if retries is None:
+            retries = settings.QBANK_RETRIES
+        self.timeout = timeout
+        self.session = requests.Session()
+        # QBank runs locally, with a self-signed certificate
+        self.session.verify = False
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=retries,
+                              read=retries,
+                              connect=retries,
+                              backoff_factor=0.1,
+                              method_whitelist=IDEMPOTENT_METHODS))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # (method, endpoint) -> [calls, total seconds, slowest seconds]
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def endpoint(url):
+        """ The metrics key for ``url``: its path, with IDs collapsed """
+        return OSID_ID.sub('{id}', url.split('?', 1)[0])
+
+    def record(self, method, url, seconds):
+        key = (method, self.endpoint(url))
+        with self.lock:
+            metric = self.metrics.setdefault(key, [0, 0.0, 0.0])
+            metric[0] += 1
+            metric[1] += seconds
+            metric[2] = max(metric[2], seconds)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.time()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            self.record(method, url, time.time() - start)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def stats(self):
+        """ Latency metrics, as a list of dicts """
+        with self.lock:
+            metrics = sorted((key, tuple(metric))
+                             for key, metric in self.metrics.items())
+        return [{
+            'method': method,
+            'endpoint': endpoint,
+            'calls': calls,
+            'mean_ms': round(total * 1000 / calls, 2),
+            'max_ms': round(slowest * 1000, 2)
+        } for (method, endpoint), (calls, total, slowest) in metrics]
+
+
+client = QBankClient()
@@ -0,0 +1,110 @@
+""" Throughput of /api/appdata logging against a stub QBank that takes
+    ``--latency`` ms per call: posting on the request thread (the old
+    way) vs. the spool with one sender connection vs. several.
+
+    Run from the repository root:
+
+        python scripts/benchmarks/bench_log_pipeline.py
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+# pylint: disable=wrong-import-position
+from mock import patch  # noqa: E402
+
+import log_pipeline  # noqa: E402
+import qbank  # noqa: E402
+import settings  # noqa: E402
+
+from log_spool import LogSpool  # noqa: E402
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def stub_qbank(latency):
+    def request(method, url, **_kwargs):
+        time.sleep(latency)
+        if method == 'GET' and url.endswith('/logs'):
+            return FakeResponse([{'id': 'log',
+                                  'genusTypeId': settings.DEFAULT_LOG_GENUS_TYPE}])
+        return FakeResponse({})
+    return request
+
+
+def clicks(entries, seats):
+    return [('session{0}'.format(index % seats), {'action': 'click', 'index': index})
+            for index in range(entries)]
+
+
+def inline(entries):
+    """ What POST /api/appdata did before: find the log, then post """
+    for session_id, data in entries:
+        log = log_pipeline.find_default_log()
+        qbank.client.post(log_pipeline.log_entries_url(log['id']),
+                          json={'data': data},
+                          headers={'x-api-proxy': session_id})
+
+
+def spooled(threads):
+    def run(entries):
+        log_pipeline.default_log_cache.invalidate()
+        directory = tempfile.mkdtemp()
+        try:
+            pipeline = log_pipeline.LogPipeline(
+                LogSpool(os.path.join(directory, 'spool')), threads=threads)
+            for session_id, data in entries:
+                pipeline.submit(session_id, data)
+            pipeline.flush()
+            pipeline.spool.close()
+            assert pipeline.stats()['sent'] == len(entries)
+        finally:
+            shutil.rmtree(directory)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--seats', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=2.0)
+    args = parser.parse_args()
+    entries = clicks(args.entries, args.seats)
+    scenarios = [
+        ('inline (old POST handler)', inline),
+        ('spooled, 1 sender connection', spooled(1)),
+        ('spooled, {0} sender connections'.format(settings.LOG_SENDER_THREADS),
+         spooled(settings.LOG_SENDER_THREADS)),
+    ]
+    print('{0} entries from {1} seats, {2} ms per QBank call'.format(
+        args.entries, args.seats, args.latency))
+    with patch.object(qbank.client.session, 'request',
+                      side_effect=stub_qbank(args.latency / 1000.0)):
+        for name, func in scenarios:
+            qbank.client.metrics.clear()
+            start = time.time()
+            func(entries)
+            seconds = time.time() - start
+            calls = sum(metric['calls'] for metric in qbank.client.stats())
+            print('{0:>32}: {1:8.0f} entries/s, {2} QBank calls'.format(
+                name, args.entries / seconds, calls))
+
+
+if __name__ == '__main__':
+    main()
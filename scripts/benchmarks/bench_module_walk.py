@@ -0,0 +1,84 @@
+""" Compare the original recursive ``list_dir`` (from main.py) with the
+    scandir-based ``module_tree.walk_modules``, on a synthetic tree of
+    roughly 50,000 directories.
+
+    Run from the repository root:
+
+        python scripts/benchmarks/bench_module_walk.py [repeats]
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+# pylint: disable=wrong-import-position
+from natsort import natsorted  # noqa: E402
+
+from module_tree import walk_modules  # noqa: E402
+
+# subjects / grades / units / lessons
+FAN_OUT = (10, 10, 20, 25)
+
+
+def list_dir(root, directory, current_level=0, max_level=4):
+    """ The implementation /modules_list used before module_tree """
+    sub_dirs = []
+    if current_level < max_level:
+        if (os.path.isdir('{0}/{1}'.format(root, directory)) and
+                not directory.startswith('.')):
+            for sub_dir in os.listdir('{0}/{1}'.format(root, directory)):
+                new_sub_dir = '{0}/{1}'.format(directory, sub_dir)
+                full_sub_dir_path = '{0}/{1}'.format(root, new_sub_dir)
+                if (not sub_dir.startswith('.') and
+                        os.path.isdir(full_sub_dir_path)):
+                    sub_dirs.append(new_sub_dir)
+                    sub_dirs += list_dir(root,
+                                         new_sub_dir,
+                                         current_level=current_level + 1)
+            sub_dirs = natsorted(sub_dirs)
+    return sub_dirs
+
+
+def build_tree(root):
+    count = 0
+    paths = ['modules']
+    for level, fan_out in enumerate(FAN_OUT):
+        paths = ['{0}/L{1}-{2}'.format(path, level, index)
+                 for path in paths
+                 for index in range(fan_out)]
+        count += len(paths)
+    for path in paths:
+        os.makedirs(os.path.join(root, path))
+        # a file next to each leaf, like the ePub content
+        with open(os.path.join(root, path + '.html'), 'w') as page:
+            page.write('x')
+    return count
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    root = tempfile.mkdtemp()
+    try:
+        count = build_tree(root)
+        print('{0} directories'.format(count))
+        old = list_dir(root, 'modules')
+        new = walk_modules(root, 'modules', 4)
+        assert sorted(old) == sorted(new) and len(new) == count
+        for name, func in (('list_dir', lambda: list_dir(root, 'modules')),
+                           ('walk_modules',
+                            lambda: walk_modules(root, 'modules', 4))):
+            best = min(timeit.repeat(func, number=1, repeat=repeats))
+            print('{0:>14}: {1:.3f}s (best of {2})'.format(name, best,
+                                                           repeats))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+""" A class logging in at once: ``--seats`` threads each create a
+    session and then make ``--requests`` requests with it, the way
+    ``web.session.Session`` uses its store, against web.py's ``DBStore``
+    and against ``session_store.SessionStore``.
+
+    Run from the repository root:
+
+        python scripts/benchmarks/bench_sessions.py
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+# pylint: disable=wrong-import-position
+import web  # noqa: E402
+
+from session_store import SessionStore  # noqa: E402
+
+web.config.debug = False
+
+SCHEMA = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                      'sql', 'session_schema.sql')
+
+
+def create_database(path):
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    with open(SCHEMA) as schema:
+        connection.executescript(schema.read())
+    connection.close()
+
+
+def db_store(path):
+    return web.session.DBStore(web.database(dbn='sqlite', db=path), 'sessions')
+
+
+def seat(store, number, requests, errors):
+    key = 'session{0}'.format(number)
+    try:
+        store[key] = {'login': 0, 'survey': {}}
+        for index in range(requests):
+            # Session._load, then Session._save
+            if key in store:
+                data = store[key]
+            if index == 0:
+                data['login'] = 1
+            store[key] = data
+    except Exception:  # pylint: disable=broad-except
+        errors.append(number)
+
+
+def run(make_store, seats, requests):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'unplatform.sqlite3')
+        create_database(path)
+        store = make_store(path)
+        errors = []
+        threads = [threading.Thread(target=seat, args=(store, number, requests, errors))
+                   for number in range(seats)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.time() - start, len(errors)
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seats', type=int, default=40)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+    print('{0} seats, {1} requests each'.format(args.seats, args.requests))
+    for name, make_store in [('web.session.DBStore', db_store),
+                             ('SessionStore', SessionStore)]:
+        seconds, errors = run(make_store, args.seats, args.requests)
+        print('{0:>20}: {1:8.0f} requests/s, {2} seats failed'.format(
+            name, args.seats * args.requests / seconds, errors))
+
+
+if __name__ == '__main__':
+    main()
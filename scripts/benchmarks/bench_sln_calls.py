@@ -0,0 +1,135 @@
+""" Count the QBank calls made by each StarLogoNova endpoint, against a
+    stub QBank, once the bank / offered bootstrap is warm.
+
+    Run from the repository root:
+
+        python scripts/benchmarks/bench_sln_calls.py
+"""
+from __future__ import print_function
+
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+os.environ.setdefault('WEBPY_ENV', 'test')
+
+# pylint: disable=wrong-import-position
+from mock import patch  # noqa: E402
+from webtest import TestApp  # noqa: E402
+
+import project_store  # noqa: E402
+import qbank  # noqa: E402
+import star_logo_nova  # noqa: E402
+
+from main import app  # noqa: E402
+from session_migration import create_session_database  # noqa: E402
+
+TAKEN_ID = 'assessment.AssessmentTaken%3A1%40ODL.MIT.EDU'
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+
+def make_taken(taken_id=TAKEN_ID, agent='%3Auser%40'):
+    return {
+        'id': taken_id,
+        'takingAgentId': agent,
+        'assignedBankIds': ['bootstrap'],
+        'assessmentOfferedId': 'bootstrap',
+        'displayName': {'text': 'project'},
+        'description': {'text': 'a cool simulation'},
+        'actualStartTime': {'year': 2018, 'month': 1, 'day': 1},
+        'sections': [{
+            'questions': [{
+                'responded': True,
+                'response': {
+                    'text': {'text': 'x' * 100},
+                    'submissionTime': {'year': 2018, 'month': 1, 'day': 2}
+                }
+            }]
+        }]
+    }
+
+
+def stub_qbank(method, url, **_kwargs):
+    """ Just enough of QBank's assessment service for the SLN endpoints """
+    path = url.split('?', 1)[0]
+    if method == 'GET' and path.endswith('/results'):
+        return FakeResponse([make_taken('taken{0}'.format(index),
+                                        'agent{0}'.format(index))
+                             for index in range(50)] + [make_taken()])
+    if method == 'GET' and path.endswith('/questions'):
+        return FakeResponse({'data': [{'id': 'question'}]})
+    if method == 'POST' and path.endswith('/submit'):
+        return FakeResponse({})
+    if method == 'POST' and path.endswith('/assessmentstaken'):
+        return FakeResponse(dict(make_taken(), sections=None))
+    if re.search(r'/assessmentstaken/[^/]+$', path):
+        return FakeResponse(dict(make_taken(), sections=None))
+    # bank / item / assessment / offered lookups
+    return FakeResponse([{'id': 'bootstrap'}])
+
+
+def count_calls(func):
+    qbank.client.metrics.clear()
+    func()
+    return sum(metric['calls'] for metric in qbank.client.stats())
+
+
+def main():
+    try:
+        create_session_database()
+    except sqlite3.OperationalError:
+        pass  # already there
+    directory = tempfile.mkdtemp()
+    star_logo_nova.bootstrap.path = os.path.join(directory, 'bootstrap.json')
+    project_store.store.path = os.path.join(directory, 'projects.sqlite3')
+    test_app = TestApp(app.wsgifunc())
+    payload = json.dumps({'title': 'new title', 'project_str': 'y' * 100})
+    headers = {'content-type': 'application/json'}
+    scenarios = [
+        ('GET /api/projects',
+         lambda: test_app.get('/api/projects')),
+        ('POST /api/projects',
+         lambda: test_app.post('/api/projects', params='{}', headers=headers)),
+        ('GET /api/projects?ids=<3 ids>',
+         lambda: test_app.get('/api/projects?ids=taken1,taken2,taken3')),
+        ('GET /api/project/<id>',
+         lambda: test_app.get('/api/project/{0}'.format(TAKEN_ID))),
+        ('PATCH /api/project/<id>',
+         lambda: test_app.patch('/api/project/{0}'.format(TAKEN_ID),
+                                params=payload, headers=headers)),
+        ('GET /api/project/<id>/lineage',
+         lambda: test_app.get('/api/project/{0}/lineage'.format(TAKEN_ID))),
+        ('background sync of a save',
+         project_store.store.flush),
+        ('POST /api/project/<id>/remixes',
+         lambda: test_app.post('/api/project/{0}/remixes'.format(TAKEN_ID),
+                               params=payload, headers=headers)),
+    ]
+    try:
+        with patch.object(qbank.client.session, 'request', side_effect=stub_qbank):
+            # warm the bootstrap and the question / taken caches
+            for _, func in scenarios:
+                func()
+            for name, func in scenarios:
+                print('{0:>32}: {1} QBank calls'.format(name, count_calls(func)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
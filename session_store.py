@@ -0,0 +1,183 @@
+""" web.py session store on SQLite, tuned for a classroom logging in at
+    once: each server thread keeps its own connection (WAL,
+    ``synchronous=NORMAL``, a busy timeout), and statements are fixed so
+    that sqlite3's statement cache reuses them.
+
+    web.py's ``Session`` loads the session and saves it back on every
+    request, ``/content/`` assets included. Recently used sessions are
+    kept in memory, so loading them reads nothing from disk, and saving
+    one writes it only if it changed. Otherwise only its ``atime`` moves
+    on, and those updates are written in batches. ``cleanup()`` writes
+    them before deleting sessions idle longer than the timeout, and
+    drops those from memory too, so sessions expire exactly as with
+    web.py's ``DBStore``. """
+import datetime
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+
+import web
+
+import settings
+
+LOAD = 'select data from sessions where session_id = ?'
+EXISTS = 'select 1 from sessions where session_id = ?'
+SAVE = 'insert or replace into sessions (session_id, atime, data) values (?, ?, ?)'
+TOUCH = 'update sessions set atime = ? where session_id = ?'
+DELETE = 'delete from sessions where session_id = ?'
+CLEANUP = 'delete from sessions where atime < ?'
+
+
+def now(delta=None):
+    """ ``atime`` as web.py's DBStore writes it, so that ``cleanup()``
+        compares rows from either store correctly """
+    time_ = datetime.datetime.now()
+    if delta is not None:
+        time_ -= delta
+    return time_.isoformat()
+
+
+# pylint: disable=too-many-instance-attributes
+class SessionStore(web.session.Store):
+    """ Drop-in replacement for ``web.session.DBStore(db, 'sessions')``,
+        using the same table and encoding """
+    def __init__(self, path, max_entries=None):
+        if max_entries is None:
+            max_entries = settings.SESSION_CACHE_SIZE
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # held while writing a session and updating its copy in memory,
+        #   so that the two agree
+        self.write_lock = threading.Lock()
+        # session ID -> (encoded data as on disk, time last used), most
+        #   recently used last
+        self.hot = OrderedDict()
+        # every connection handed out, so that ``reset()`` can close them
+        self.connections = []
+        # session ID -> atime not yet written
+        self.touches = {}
+        self.touched_at = time.time()
+
+    def connect(self):
+        """ This thread's connection """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path,
+                                         timeout=settings.SESSION_BUSY_TIMEOUT,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA busy_timeout={0:d}'.format(
+                int(settings.SESSION_BUSY_TIMEOUT * 1000)))
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def __contains__(self, key):
+        with self.lock:
+            if key in self.hot:
+                return True
+        return self.connect().execute(EXISTS, (key,)).fetchone() is not None
+
+    def __getitem__(self, key):
+        with self.lock:
+            entry = self.hot.pop(key, None)
+            if entry is not None:
+                self.hot[key] = entry
+                return self.decode(entry[0])
+        with self.write_lock:
+            # not read before taking the lock, so that a save racing this
+            #   cannot be overwritten with what it replaced
+            row = self.connect().execute(LOAD, (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            self.remember(key, row[0])
+        return self.decode(row[0])
+
+    def __setitem__(self, key, value):
+        data = self.encode(value)
+        if self.touch(key, data):
+            return
+        with self.write_lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(SAVE, (key, now(), data))
+            with self.lock:
+                # the write set atime
+                self.touches.pop(key, None)
+            self.remember(key, data)
+
+    def touch(self, key, data):
+        """ If ``data`` is what is stored for the session already, note
+            that the session was used, for the next batch of ``atime``
+            updates, and return True """
+        with self.lock:
+            entry = self.hot.get(key)
+            if entry is None or entry[0] != data:
+                return False
+            del self.hot[key]
+            self.hot[key] = (data, time.time())
+            self.touches[key] = now()
+            due = len(self.touches) >= settings.SESSION_TOUCH_BATCH or \
+                time.time() - self.touched_at >= settings.SESSION_TOUCH_INTERVAL
+        if due:
+            self.flush_touches()
+        return True
+
+    def __delitem__(self, key):
+        with self.write_lock:
+            with self.lock:
+                self.hot.pop(key, None)
+                self.touches.pop(key, None)
+            connection = self.connect()
+            with connection:
+                connection.execute(DELETE, (key,))
+
+    def remember(self, key, data):
+        """ Keep a session in memory; call with ``write_lock`` held """
+        with self.lock:
+            self.hot.pop(key, None)
+            self.hot[key] = (data, time.time())
+            while len(self.hot) > self.max_entries:
+                self.hot.popitem(last=False)
+
+    def flush_touches(self):
+        with self.lock:
+            touches, self.touches = self.touches, {}
+            self.touched_at = time.time()
+        if not touches:
+            return
+        connection = self.connect()
+        with connection:
+            connection.executemany(TOUCH, [(atime, key)
+                                           for key, atime in touches.items()])
+
+    def cleanup(self, timeout):
+        # write pending touches first, so active sessions are kept
+        self.flush_touches()
+        last_allowed_time = now(datetime.timedelta(seconds=timeout))
+        last_allowed_use = time.time() - timeout
+        with self.write_lock:
+            with self.lock:
+                for key in [key for key, entry in self.hot.items()
+                            if entry[1] < last_allowed_use]:
+                    del self.hot[key]
+            connection = self.connect()
+            with connection:
+                connection.execute(CLEANUP, (last_allowed_time,))
+
+    def reset(self):
+        """ Close every connection, e.g. after the database file was
+            replaced """
+        with self.lock:
+            connections, self.connections = self.connections, []
+            self.hot.clear()
+            self.touches = {}
+        for connection in connections:
+            connection.close()
+        self.local = threading.local()
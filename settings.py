@@ -13,3 +13,112 @@ DEFAULT_OFFERED_GENUS_TYPE = (
 READ_ONLY_TAKEN_GENUS_TYPE = (
     'assessment-taken-genus-type%3A'
     'star-logo-nova-read-only%40ODL.MIT.EDU')
+
+# Size of each read when streaming files out of modules/
+CONTENT_BLOCK_SIZE = 64 * 1024
+# Number of paths to remember a Content-Type for
+CONTENT_TYPE_CACHE_SIZE = 10000
+# Range requests with more ranges than this get the whole file instead
+MAX_BYTE_RANGES = 100
+
+# Cache-Control sent with /content/ and /common/ responses. Every
+#   response carries an ETag and Last-Modified, so the default makes
+#   browsers revalidate (and get a 304) rather than re-download.
+DEFAULT_CACHE_CONTROL = 'no-cache'
+# (prefix under modules/, Cache-Control) pairs; the longest matching
+#   prefix wins, e.g. ('Tools/', 'public, max-age=86400')
+CACHE_CONTROL_POLICIES = ()
+
+# How many directory levels under modules/ that /modules_list reports
+MODULES_MAX_LEVEL = 4
+# Minimum seconds between mtime checks of the cached modules/ tree
+MODULES_INDEX_REFRESH_INTERVAL = 5
+# Memory budget for the HTML shells kept by content_serving.static_files
+STATIC_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# Number of rendered (tool, lang) pages kept by content_serving.tool_pages
+TOOL_PAGE_CACHE_SIZE = 200
+
+# Keep-alive connections to QBank; matches the CherryPy worker threads
+QBANK_POOL_SIZE = 10
+# Seconds to wait for QBank to (connect, respond)
+QBANK_TIMEOUT = (5, 30)
+# Retries for connection errors, and for read errors on idempotent calls
+QBANK_RETRIES = 2
+
+# StarLogoNova saves are acknowledged from the local project store and
+#   pushed to QBank once a project has had no new save for this many
+#   seconds...
+SLN_SYNC_DELAY = 10
+# ... or has had unsynced changes for this long, whichever comes first
+SLN_SYNC_MAX_DELAY = 60
+# How often the background worker looks for projects to push
+SLN_SYNC_INTERVAL = 2
+# After a failed push, wait this long before trying again, doubling with
+#   each failure up to SLN_SYNC_RETRY_MAX_DELAY
+SLN_SYNC_RETRY_DELAY = 5
+SLN_SYNC_RETRY_MAX_DELAY = 600
+# Edits QBank refuses (4xx) this many times in a row are parked: kept in
+#   the store, but no longer pushed
+SLN_SYNC_MAX_ATTEMPTS = 8
+# Seconds a local copy without unsynced edits is served before it is
+#   fetched from QBank again, to pick up locks set there
+SLN_PROJECT_MAX_AGE = 300
+# Number of taken -> question IDs remembered for project saves
+SLN_QUESTION_CACHE_SIZE = 10000
+# Number of takens kept after QBank returns them, and for how many seconds
+SLN_TAKEN_CACHE_SIZE = 1000
+SLN_TAKEN_CACHE_MAX_AGE = 60
+# Most project IDs accepted by one /api/projects?ids=... request
+SLN_MAX_BATCH_IDS = 100
+# Seconds that the /results index used for remix lineage is reused
+SLN_RESULTS_CACHE_MAX_AGE = 30
+# Default and largest depth of /api/project/<id>/lineage
+SLN_LINEAGE_DEPTH = 10
+SLN_LINEAGE_MAX_DEPTH = 50
+
+# What is dropped when the /api/appdata spool is full (LOG_SPOOL_MAX_BYTES):
+#   the 'newest' (incoming) entry, which is answered with a 503, or the
+#   'oldest' spooled entries, a segment at a time, which
+#   nobody is told about
+LOG_QUEUE_DROP_POLICY = 'newest'
+# The sender posts up to this many entries per lookup of the default log...
+LOG_SENDER_BATCH_SIZE = 50
+# ... waiting at most this many seconds after the first for more to arrive
+LOG_SENDER_BATCH_WAIT = 0.2
+# Sessions whose entries are posted at the same time, each over its own
+#   keep-alive connection (QBank has no bulk logentries endpoint)
+LOG_SENDER_THREADS = 4
+
+# /api/appdata entries are spooled to disk until they are posted to QBank,
+#   up to this many bytes...
+LOG_SPOOL_MAX_BYTES = 512 * 1024 * 1024
+# ... in segment files of about this size
+LOG_SPOOL_SEGMENT_BYTES = 4 * 1024 * 1024
+# Spooled entries are fsync'ed in batches of this many, or after this many
+#   seconds, whichever comes first
+LOG_SPOOL_FSYNC_ENTRIES = 100
+LOG_SPOOL_FSYNC_SECONDS = 1
+# The sender's progress through the spool is saved every this many entries;
+#   at most this many are sent twice after a crash
+LOG_SPOOL_ACK_EVERY = 100
+# Seconds between attempts to send spooled entries while QBank is unreachable
+#   or fails on the first of them
+LOG_SPOOL_RETRY_SECONDS = 30
+# An entry QBank answers with a server error (5xx) this many times in a row
+#   is moved to the spool's dead-letters file, so that those after it are sent
+LOG_SPOOL_MAX_ATTEMPTS = 10
+# Largest ?limit= for GET /api/appdata
+LOG_MAX_PAGE_SIZE = 10000
+# Seconds that entries are kept in the local /api/appdata index, by their
+#   QBank timestamp, and how often older ones are deleted
+LOG_INDEX_MAX_AGE = 90 * 24 * 60 * 60
+LOG_INDEX_PRUNE_SECONDS = 60 * 60
+
+# sessions in unplatform.sqlite3: seconds to wait for a locked database,
+#   and how many, or after how many seconds, pending atime updates of
+#   unchanged sessions are written in one batch
+SESSION_BUSY_TIMEOUT = 10
+SESSION_TOUCH_BATCH = 100
+SESSION_TOUCH_INTERVAL = 30
+# Recently used sessions kept in memory, so that loading them reads nothing
+SESSION_CACHE_SIZE = 1000
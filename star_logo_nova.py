@@ -1,42 +1,125 @@
+import copy
+import json
+import os
 import re
+import threading
+import time
 
-from datetime import datetime
-from operator import attrgetter
-
-import pytz
-import requests
+from collections import OrderedDict
+from operator import attrgetter, itemgetter
 
+import qbank
 import settings
+import utilities
+from utilities import iso_format, qbank_time
+
+from main_utilities import SLN_BOOTSTRAP_FILE
+
+
+class SLNResults:
+    """ The ``/results`` takens for one AssessmentOffered, indexed
+        once by takingAgentId, taken id and provenanceId so that every
+        project built from them can find its section, parent and
+        remixes without scanning the whole list. Behaves like the
+        original list otherwise. """
+    def __init__(self, results):
+        self.results = results
+        self.by_agent = {}
+        self.by_id = {}
+        self.by_provenance = {}
+        for result in results:
+            # first match wins, like the old list scans
+            self.by_agent.setdefault(result.get('takingAgentId'), result)
+            self.by_id.setdefault(result.get('id'), result)
+            if 'provenanceId' in result:
+                self.by_provenance.setdefault(result['provenanceId'],
+                                              []).append(result)
+
+    @classmethod
+    def of(cls, results):
+        """ Index ``results`` unless that has already been done """
+        if isinstance(results, cls):
+            return results
+        return cls(results)
+
+    def __getitem__(self, index):
+        return self.results[index]
+
+    def __iter__(self):
+        return iter(self.results)
 
-
-class SLNProject:
+    def __len__(self):
+        return len(self.results)
+
+    def ancestors(self, taken_id, depth):
+        """ The parent, grandparent, ... of a taken, nearest first,
+            at most ``depth`` of them """
+        ancestors = []
+        seen = set([taken_id])
+        taken = self.by_id.get(taken_id)
+        while taken is not None and len(ancestors) < depth:
+            parent = self.by_id.get(taken.get('provenanceId'))
+            if parent is None or parent.get('id') in seen:
+                break
+            seen.add(parent.get('id'))
+            ancestors.append(parent)
+            taken = parent
+        return ancestors
+
+    def descendants(self, taken_id, depth):
+        """ The remixes of a taken, as ``(taken, [its descendants])``
+            pairs, down to ``depth`` levels """
+        tree = []
+        # (taken ID, list to add its remixes to, levels left)
+        pending = [(taken_id, tree, depth)]
+        seen = set([taken_id])
+        while pending:
+            parent_id, children, levels_left = pending.pop()
+            if levels_left < 1:
+                continue
+            for remix in self.by_provenance.get(parent_id, []):
+                if remix.get('id') in seen:
+                    continue
+                seen.add(remix.get('id'))
+                grandchildren = []
+                children.append((remix, grandchildren))
+                pending.append((remix.get('id'), grandchildren,
+                                levels_left - 1))
+        return tree
+
+
+# pylint: disable=too-many-public-methods
+class SLNProject(object):
     """ Convenience wrapper around our AssessmentTaken
-        objects that maps to StarLogoNova projects """
+        objects that maps to StarLogoNova projects. Galleries hold
+        thousands of these, so they use ``__slots__`` and parse each
+        timestamp only once. """
+    __slots__ = ('my_map', '_section', 'all_results', '_created_time',
+                 '_saved_time')
+
     def __init__(self, object_map, results=None):
         self.my_map = object_map
-        self.section = None
-        self.time_format = '%Y-%m-%dT%H:%M:%S.%fZ'
-        # for performance, try to get the section / result
-        #   on __init__ -- that means we can call
-        #   ``get_results()`` on the ProjectsList once,
-        #   and get all the data for each Project?
-        # Don't want to make individual results calls
-        #   for each project -- that will get expensive as
-        #   the number of projects grows.
-        if results is None:
-            results = self.get_all_results()
-        self.all_results = results
-        self.section = self.find_my_section(results)
+        self._section = None
+        self._created_time = None
+        self._saved_time = None
+        # for performance, lists of projects get the results once
+        #   (``SLNProjects``) and pass them in here. A project on
+        #   its own only fetches its own result, and only once its
+        #   section is needed (``get_section()``), rather than every
+        #   result for the offered.
+        self.all_results = None
+        if results is not None:
+            self.all_results = SLNResults.of(results)
+            self.section = self.find_my_section(self.all_results)
 
     def find_my_section(self, results):
         """ find the taken with matching takingAgentId and
             return the section """
-        my_sections = [r
-                       for r in results
-                       if r['takingAgentId'] == self.my_map['takingAgentId']]
-        if not my_sections:
+        my_result = SLNResults.of(results).by_agent.get(
+            self.my_map['takingAgentId'])
+        if my_result is None:
             raise KeyError('No result found??')
-        return my_sections[0]['sections'][0]
+        return my_result['sections'][0]
 
     @staticmethod
     def get_agent_id(taking_agent_id):
@@ -48,7 +131,7 @@ class SLNProject:
         """ Get all the results / AssessmentTakens for the
             same AssessmentOffered. Used in the provenance
             methods. """
-        req = requests.get(self.results_url, verify=False)
+        req = qbank.client.get(self.results_url)
         takens = req.json()
         return takens
 
@@ -59,10 +142,10 @@ class SLNProject:
             self.results_url,
             self.get_agent_id(self.my_map['takingAgentId'])
         )
-        req = requests.get(url, verify=False)
+        req = qbank.client.get(url)
         data = req.json()
         # Should only have one match on the takingAgentId
-        self.section = data[0]
+        self.section = self.find_my_section(data)
         return self.section
 
     @property
@@ -101,33 +184,53 @@ class SLNProject:
             return latest_response['text']['text']
         return None
 
+    @property
+    def section(self):
+        return self._section
+
+    @section.setter
+    def section(self, section):
+        self._section = section
+        # saved_time comes from the section
+        self._saved_time = None
+
+    @property
+    def created_time(self):
+        """ actualStartTime, as ``qbank_time()`` """
+        if self._created_time is None:
+            self._created_time = qbank_time(self.my_map['actualStartTime'])
+        return self._created_time
+
+    @property
+    def saved_time(self):
+        """ Submission time of the last response, as ``qbank_time()``;
+            needs the AssessmentSection with responses """
+        if self._saved_time is None:
+            if self.section is None:
+                self.get_section()
+            # First question (1 of 1)
+            # Last response
+            # Submission time, if present
+            question = self.section['questions'][0]
+            if question['responded']:
+                latest_response = question['response']
+                self._saved_time = qbank_time(latest_response['submissionTime'])
+            else:
+                self._saved_time = self.created_time
+        return self._saved_time
+
     @property
     def created_at(self):
         """ This should be an ISO String, like
             2018-03-22T15:40:14.533736Z """
-        start_time_with_tz = self.my_map['actualStartTime']
-        start_time_with_tz['tzinfo'] = pytz.utc
-        created_at = datetime(**start_time_with_tz)
-        return created_at.strftime(self.time_format)
+        return iso_format(self.created_time)
 
     @property
     def saved_at(self):
         """ Have to get the AssessmentSection with responses
             for this... should be an ISO String, like
             2018-03-22T15:40:14.533736Z """
-        if self.section is None:
-            self.get_section()
-        # First question (1 of 1)
-        # Last response
-        # Submission time, if present
-        question = self.section['questions'][0]
-        if question['responded']:
-            latest_response = question['response']
-            submission_time_with_tz = latest_response['submissionTime']
-            submission_time_with_tz['tzinfo'] = pytz.utc
-            submission_time = datetime(**submission_time_with_tz)
-            return submission_time.strftime(self.time_format)
-        return self.created_at
+        return iso_format(self.saved_time)
 
     @property
     def parent_project(self):
@@ -142,14 +245,11 @@ class SLNProject:
         #   otherwise we have to make 2 requests (one for AssessmentTaken
         #   and another for the responses). Assuming the cost of
         #   2 HTTP requests is worse.
-        takens = self.get_all_results()
-        parent_takens = [taken
-                         for taken in takens
-                         if taken['id'] == self.my_map['provenanceId']]
-        if not parent_takens:
+        takens = SLNResults.of(self.get_all_results())
+        parent_taken = takens.by_id.get(self.my_map['provenanceId'])
+        if parent_taken is None:
             raise KeyError('parent taken not found ...')
-        parent_taken = parent_takens[0]
-        return SLNProject(parent_taken)
+        return SLNProject(parent_taken, results=takens)
 
     @property
     def remixes(self):
@@ -158,25 +258,35 @@ class SLNProject:
         #   otherwise we have to make 2 requests (one for AssessmentTaken
         #   and another for the responses). Assuming the cost of
         #   2 HTTP requests is worse.
-        takens = self.get_all_results()
-        remixes = [taken
-                   for taken in takens
-                   if taken['provenanceId'] == self.my_map['id']]
+        takens = SLNResults.of(self.get_all_results())
+        remixes = takens.by_provenance.get(self.my_map['id'], [])
 
-        return SLNProjects(remixes)
+        return SLNProjects(remixes, results=takens)
 
     @property
     def is_locked(self):
         """ Returns a boolean if the taken is read-only or not,
             based on its genusTypeId. read-only === is_locked """
-        if 'genusTypeId' not in self.my_map:
+        return self.locked(self.my_map)
+
+    @staticmethod
+    def locked(object_map):
+        """ ``is_locked`` for a bare taken, without fetching results """
+        if 'genusTypeId' not in object_map:
             return False  # should only ever happen during testing
-        return self.my_map['genusTypeId'] == \
+        return object_map['genusTypeId'] == \
             settings.READ_ONLY_TAKEN_GENUS_TYPE
 
     @property
     def serialize(self):
         """ turn into the JSON blob that SLN expects """
+        blob = self.metadata
+        blob['project_str'] = self.project_str
+        return blob
+
+    @property
+    def metadata(self):
+        """ the JSON blob without ``project_str``, which can be many KB """
         return {
             'id': self.id,
             'title': self.title,
@@ -184,21 +294,23 @@ class SLNProject:
             'created_at': self.created_at,
             'saved_at': self.saved_at,
             'parent_project': self.parent_project,
-            'project_str': self.project_str,
             'is_locked': self.is_locked
         }
 
 
 class SLNProjects:
     """ List of SLNProject objects """
-    def __init__(self, object_maps):
-        # For performance, get results here once and then pass
-        #   that in to each SLNProject object.
+    def __init__(self, object_maps, results=None):
+        # For performance, get results here once (unless the caller
+        #   already has them) and then pass that in to each SLNProject
+        #   object.
         self.projects = []
         if object_maps:
-            first_project = SLNProject(object_maps[0])
+            if results is None:
+                results = SLNProject(object_maps[0]).get_all_results()
+            results = SLNResults.of(results)
             self.projects = [SLNProject(object_map,
-                                        results=first_project.all_results)
+                                        results=results)
                              for object_map in object_maps]
         self.index = 0
 
@@ -214,21 +326,212 @@ class SLNProjects:
 
     def serialize(self, order_by=None):
         if order_by is not None and isinstance(order_by, list):
-            # Sort by the fields given in the order_by list, i.e.
-            #   ['is_locked', 'saved_at']
+            # Sort by the SLNProject attributes named in order_by, e.g.
+            #   ['is_locked', 'saved_time'] for GET /api/projects in main.py
             # May want to make reverse also configurable...
-            return [p.serialize for p in sorted(self.projects,
-                                                key=attrgetter(*order_by),
-                                                reverse=True)]
+            return [p.serialize for _, p in self.sorted_by(order_by)]
         return [project.serialize for project in self.projects]
 
+    def sorted_by(self, order_by):
+        """ (key, project) pairs, largest key first. Each key is computed
+            once per project rather than on every comparison, and ends
+            with the project id so that ties always sort the same way
+            (``page()`` cursors rely on that). """
+        get_key = attrgetter(*order_by)
+        keyed = []
+        for project in self.projects:
+            key = get_key(project)
+            if len(order_by) == 1:
+                key = (key,)
+            keyed.append((key + (project.id,), project))
+        keyed.sort(key=itemgetter(0), reverse=True)
+        return keyed
+
+    def page(self, order_by, limit=None, offset=0, cursor=None):
+        """ One page of the sorted projects, and the cursor for the next
+            page (``None`` on the last one). A cursor names the last
+            project already seen by its sort key, so paging stays
+            consistent while other projects are being saved. """
+        keyed = self.sorted_by(order_by)
+        if cursor is not None:
+            after = self.decode_cursor(cursor)
+            keyed = [(key, project)
+                     for key, project in keyed
+                     if key < after]
+        keyed = keyed[offset:]
+        next_cursor = None
+        if limit is not None and len(keyed) > limit:
+            keyed = keyed[:limit]
+            next_cursor = self.encode_cursor(keyed[-1][0])
+        return [project for _, project in keyed], next_cursor
+
+    @staticmethod
+    def encode_cursor(key):
+        return utilities.encode_cursor(key)
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """ raises ValueError for anything ``encode_cursor`` did not make """
+        return tuple(utilities.decode_cursor(cursor))
+
+
+def iter_projects_json(projects, metadata_only=False):
+    """ Emit the projects as a JSON array, one project at a time, so
+        large galleries never sit in memory as one string """
+    separator = '['
+    for project in projects:
+        if metadata_only:
+            blob = project.metadata
+        else:
+            blob = project.serialize
+        yield separator + json.dumps(blob)
+        separator = ', '
+    yield '[]' if separator == '[' else ']'
+
+
+class ProjectLocked(AttributeError):
+    """ The project is read-only (locked by a teacher) """
+    pass
+
+
+class BootstrapError(Exception):
+    """ QBank did not return a bank, item, assessment or offered """
+    pass
+
+
+def has_id(qbank_object):
+    return isinstance(qbank_object, dict) and 'id' in qbank_object
+
+
+class SLNBootstrap:
+    """ Process-wide cache of the default bank, item, assessment and
+        offered that every StarLogoNova endpoint needs. They never change
+        once created, so each is resolved against QBank once (under a lock,
+        so concurrent requests cannot create duplicates), saved to
+        ``path`` to survive restarts, and only dropped when QBank
+        answers 404 for them. """
+    def __init__(self, path=SLN_BOOTSTRAP_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.objects = None
+
+    def load(self):
+        self.objects = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'rb') as bootstrap_file:
+                    objects = json.load(bootstrap_file)
+                # skip whatever older versions saved from a failed call
+                self.objects = dict((key, value) for key, value in objects.items()
+                                    if has_id(value))
+            except (AttributeError, IOError, ValueError):
+                pass
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp_path = '{0}.tmp'.format(self.path)
+        with open(temp_path, 'wb') as bootstrap_file:
+            json.dump(self.objects, bootstrap_file)
+        os.rename(temp_path, self.path)
+
+    def resolve(self, key, resolver):
+        """ Return the cached object for ``key``, calling ``resolver``
+            (at most once across threads) when it is missing. Only QBank
+            objects (with an ``id``) are kept; anything else, such as an
+            error body, raises ``BootstrapError`` so the next request
+            tries again. """
+        objects = self.objects
+        if objects is not None and key in objects:
+            return objects[key]
+        with self.lock:
+            if self.objects is None:
+                self.load()
+            if key not in self.objects:
+                resolved = resolver()
+                if not has_id(resolved):
+                    raise BootstrapError('could not resolve {0}: {1!r}'.format(
+                        key, resolved))
+                self.objects[key] = resolved
+                self.save()
+            return self.objects[key]
+
+    def invalidate(self):
+        with self.lock:
+            self.objects = {}
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+
+    def check(self, req):
+        """ Drop the cache if QBank no longer knows a cached ID """
+        if getattr(req, 'status_code', None) == 404:
+            self.invalidate()
+
+
+bootstrap = SLNBootstrap()
+
+
+class LRUCache:
+    """ Small thread-safe LRU map. Entries older than ``max_age`` seconds
+        (if given) are treated as missing. """
+    def __init__(self, max_entries, max_age=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        # key -> (value, time stored), most recently used last
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            if self.max_age is not None and time.time() - entry[1] > self.max_age:
+                return None
+            self.entries[key] = entry
+            return entry[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, time.time())
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# A taken's question never changes, so ``save_project`` only has to look
+#   it up once per taken (when the taken is created, for new projects)
+question_ids = LRUCache(settings.SLN_QUESTION_CACHE_SIZE)
+
+# Takens as last returned by QBank (GET, create or PUT), so that saves do
+#   not have to read back what they just wrote. Kept briefly, because a
+#   teacher can lock a project in QBank directly.
+taken_cache = LRUCache(settings.SLN_TAKEN_CACHE_SIZE,
+                       max_age=settings.SLN_TAKEN_CACHE_MAX_AGE)
+
+# Indexed /results per (bank, offered), for lineage lookups. Dropped
+#   when a project is created, and otherwise kept briefly.
+results_cache = LRUCache(16, max_age=settings.SLN_RESULTS_CACHE_MAX_AGE)
+
 
 class sln_shared:
     """ Contains shared helper methods for StarLogoNova endpoints """
     def get_or_create_bank(self):
+        return bootstrap.resolve('bank', self.find_or_create_bank)
+
+    def find_or_create_bank(self):
         url = '{0}?genusTypeId={1}'.format(settings.QBANK_ASSESSMENT_ENDPOINT,
                                            settings.DEFAULT_BANK_GENUS_TYPE)
-        req = requests.get(url, verify=False)
+        req = qbank.client.get(url)
         banks = req.json()
         default_bank = None
         if banks:
@@ -239,22 +542,25 @@ class sln_shared:
                 'description': 'For storing student projects',
                 'genusTypeId': settings.DEFAULT_BANK_GENUS_TYPE
             }
-            req = requests.post(settings.QBANK_ASSESSMENT_ENDPOINT,
-                                json=payload,
-                                verify=False)
+            req = qbank.client.post(settings.QBANK_ASSESSMENT_ENDPOINT,
+                                    json=payload)
             default_bank = req.json()
         return default_bank
 
     def get_or_create_item(self, bank_id):
         """ In the given bank, find or create a SLN item (extended
             text interaction). """
+        return bootstrap.resolve('item:{0}'.format(bank_id),
+                                 lambda: self.find_or_create_item(bank_id))
+
+    def find_or_create_item(self, bank_id):
         base_url = '{0}/{1}/items'.format(
             settings.QBANK_ASSESSMENT_ENDPOINT,
             bank_id)
         url = '{0}?genusTypeId={1}'.format(
             base_url,
             settings.DEFAULT_ITEM_GENUS_TYPE)
-        req = requests.get(url, verify=False)
+        req = qbank.client.get(url)
         items = req.json()
         default_item = None
         if items:
@@ -277,22 +583,26 @@ class sln_shared:
                     'questionString': 'Please submit your SLN project'
                 }
             }
-            req = requests.post(base_url,
-                                json=payload,
-                                verify=False)
+            req = qbank.client.post(base_url,
+                                    json=payload)
             default_item = req.json()
         return default_item
 
     def get_or_create_assessment(self, bank_id, item_id):
         """ In the given bank, find or create a SLN assessment,
             and make sure the given item is part of it """
+        return bootstrap.resolve(
+            'assessment:{0}:{1}'.format(bank_id, item_id),
+            lambda: self.find_or_create_assessment(bank_id, item_id))
+
+    def find_or_create_assessment(self, bank_id, item_id):
         base_url = '{0}/{1}/assessments'.format(
             settings.QBANK_ASSESSMENT_ENDPOINT,
             bank_id)
         url = '{0}?genusTypeId={1}'.format(
             base_url,
             settings.DEFAULT_ASSESSMENT_GENUS_TYPE)
-        req = requests.get(url, verify=False)
+        req = qbank.client.get(url)
         assessments = req.json()
         default_assessment = None
         if assessments:
@@ -300,16 +610,15 @@ class sln_shared:
 
             # check if the item is part of this assessment
             url = '{0}/items'.format(base_url)
-            req = requests.get(url)
+            req = qbank.client.get(url)
             assessment_items = req.json()
             current_item_ids = [i['id'] for i in assessment_items]
             if current_item_ids or item_id not in current_item_ids:
                 payload = {
                     'itemIds': [item_id]
                 }
-                requests.post(base_url,
-                              json=payload,
-                              verify=False)
+                qbank.client.post(base_url,
+                                  json=payload)
         else:
             payload = {
                 'name': 'Default StarLogoNova Assessment',
@@ -319,9 +628,8 @@ class sln_shared:
                 'genusTypeId': settings.DEFAULT_ASSESSMENT_GENUS_TYPE,
                 'itemIds': [item_id]
             }
-            req = requests.post(base_url,
-                                json=payload,
-                                verify=False)
+            req = qbank.client.post(base_url,
+                                    json=payload)
             default_assessment = req.json()
         return default_assessment
 
@@ -332,13 +640,18 @@ class sln_shared:
             we do **NOT** need to create the item / assessment. If the
             offered does not exist, we will need to create the item and
             assessment. """
+        return bootstrap.resolve(
+            'offered:{0}'.format(bank_id),
+            lambda: self.find_or_create_assessment_offered(bank_id))
+
+    def find_or_create_assessment_offered(self, bank_id):
         base_url = '{0}/{1}/assessmentsoffered'.format(
             settings.QBANK_ASSESSMENT_ENDPOINT,
             bank_id)
         url = '{0}?genusTypeId={1}'.format(
             base_url,
             settings.DEFAULT_OFFERED_GENUS_TYPE)
-        req = requests.get(url, verify=False)
+        req = qbank.client.get(url)
         offereds = req.json()
         default_offered = None
         if offereds:
@@ -358,20 +671,40 @@ class sln_shared:
                 ),
                 'genusTypeId': settings.DEFAULT_OFFERED_GENUS_TYPE
             }
-            req = requests.post(url,
-                                json=payload,
-                                verify=False)
+            req = qbank.client.post(url,
+                                    json=payload)
             default_offered = req.json()
         return default_offered
 
     def get_assessment_taken(self, bank_id, taken_id):
         """ get the specific taken """
+        taken = taken_cache.get(utilities.escape(taken_id))
+        if taken is None:
+            return self.fetch_assessment_taken(bank_id, taken_id)
+        return copy.deepcopy(taken)
+
+    def fetch_assessment_taken(self, bank_id, taken_id):
+        """ get the specific taken from QBank, bypassing ``taken_cache``
+            (and refreshing it) """
         url = '{0}/{1}/assessmentstaken/{2}'.format(
             settings.QBANK_ASSESSMENT_ENDPOINT,
             bank_id,
             taken_id)
-        req = requests.get(url, verify=False)
-        return req.json()
+        req = qbank.client.get(url)
+        taken = req.json()
+        self.remember_taken(taken_id, req, taken)
+        return taken
+
+    @staticmethod
+    def remember_taken(taken_id, req, taken):
+        """ Cache a taken that QBank just returned, or forget the cached
+            one if QBank refused the request. Keyed by the escaped ID,
+            which callers pass in either form. """
+        taken_id = utilities.escape(taken_id)
+        if getattr(req, 'status_code', 200) >= 400 or 'id' not in taken:
+            taken_cache.discard(taken_id)
+        else:
+            taken_cache.set(taken_id, copy.deepcopy(taken))
 
     def create_assessment_taken(self, bank_id, offered_id, data):
         """ data should be all the editable things for a project:
@@ -414,18 +747,18 @@ class sln_shared:
         if 'genusTypeId' in data:
             payload['genusTypeId'] = data['genusTypeId']
 
-        req = requests.post(url,
-                            json=payload,
-                            verify=False,
-                            headers={'x-api-proxy': data['user_id']})
+        req = qbank.client.post(url,
+                                json=payload,
+                                headers={'x-api-proxy': data['user_id']})
+        bootstrap.check(req)
+        results_cache.discard((bank_id, offered_id))
 
-        # Now submit the text response
+        # Now submit the text response, then read the taken back once
+        #   for the state after the submit (actualStartTime and the
+        #   updated timestamps); the submit itself does not return it
         taken = req.json()
         self.save_project(bank_id, taken['id'], data)
-
-        # Now we need to get the updated taken (with timestamp)
-        taken = self.get_assessment_taken(bank_id, taken['id'])
-        return taken
+        return self.fetch_assessment_taken(bank_id, taken['id'])
 
     def update_assessment_taken(self, bank_id, taken_id, data):
         """ data should be all the editable things for a project:
@@ -439,8 +772,8 @@ class sln_shared:
             raise KeyError('project_str required in data')
         # reject anything that changes a read-only taken
         taken = self.get_assessment_taken(bank_id, taken_id)
-        if SLNProject(taken).is_locked:
-            raise AttributeError('Cannot edit this project')
+        if SLNProject.locked(taken):
+            raise ProjectLocked('Cannot edit this project')
 
         url = '{0}/{1}/assessmentstaken/{2}'.format(
             settings.QBANK_ASSESSMENT_ENDPOINT,
@@ -453,16 +786,16 @@ class sln_shared:
             payload['description'] = data['description']
 
         if 'title' in data or 'description' in data:
-            req = requests.put(url,
-                               json=payload,
-                               verify=False)
-            taken = req.json()
-
-        # Re-submit the project_str
+            req = qbank.client.put(url,
+                                   json=payload)
+            self.remember_taken(taken_id, req, req.json())
+            if getattr(req, 'status_code', 200) >= 400:
+                raise qbank.QBankError(req)
+
+        # Re-submit the project_str, then read the taken back once for
+        #   its state after the submit
         self.save_project(bank_id, taken_id, data)
-
-        taken = self.get_assessment_taken(bank_id, taken_id)
-        return taken
+        return self.fetch_assessment_taken(bank_id, taken_id)
 
     def save_project(self, bank_id, taken_id, data):
         """ Submits a text string to an existing AssessmentTaken.
@@ -470,26 +803,57 @@ class sln_shared:
 
             ``data`` is required to have one field:
                 * project_str
+
+            Raises ``qbank.QBankError`` if QBank refuses the submit.
         """
         if 'project_str' not in data:
             raise KeyError('project_str required in data')
-        # First, get the question ID
-        url = '{0}/{1}/assessmentstaken/{2}/questions'.format(
+        payload = {
+            'text': data['project_str']
+        }
+        # First, get the question ID. If a remembered one is refused,
+        #   look it up again and retry once.
+        question_id = question_ids.get(taken_id)
+        if question_id is not None:
+            req = qbank.client.post(self.submit_url(bank_id, taken_id, question_id),
+                                    json=payload)
+            if getattr(req, 'status_code', 200) < 400:
+                return
+            question_ids.discard(taken_id)
+        question_id = self.get_question_id(bank_id, taken_id)
+        req = qbank.client.post(self.submit_url(bank_id, taken_id, question_id),
+                                json=payload)
+        if getattr(req, 'status_code', 200) >= 400:
+            raise qbank.QBankError(req)
+
+    def get_question_id(self, bank_id, taken_id):
+        """ Look up (and remember) the taken's one question """
+        req = qbank.client.get(self.questions_url(bank_id, taken_id))
+        questions = req.json()
+        question_id = questions['data'][0]['id']
+        question_ids.set(taken_id, question_id)
+        return question_id
+
+    @staticmethod
+    def questions_url(bank_id, taken_id):
+        return '{0}/{1}/assessmentstaken/{2}/questions'.format(
             settings.QBANK_ASSESSMENT_ENDPOINT,
             bank_id,
             taken_id)
 
-        req = requests.get(url,
-                           verify=False)
-        questions = req.json()
-        url = '{0}/{1}/submit'.format(url,
-                                      questions['data'][0]['id'])
-        payload = {
-            'text': data['project_str']
-        }
-        req = requests.post(url,
-                            json=payload,
-                            verify=False)
+    def submit_url(self, bank_id, taken_id, question_id):
+        return '{0}/{1}/submit'.format(self.questions_url(bank_id, taken_id),
+                                       question_id)
+
+    def get_results_index(self, bank_id, offered_id):
+        """ ``SLNResults`` for every project in the offered """
+        results = results_cache.get((bank_id, offered_id))
+        if results is None:
+            req = qbank.client.get(self.results_url(bank_id, offered_id))
+            bootstrap.check(req)
+            results = SLNResults(req.json())
+            results_cache.set((bank_id, offered_id), results)
+        return results
 
     def results_url(self, bank_id, offered_id):
         """ helper method to return the results URL """
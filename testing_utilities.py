@@ -8,8 +8,11 @@ import os
 from unittest import TestCase
 from webtest import TestApp
 
-from main import app
+from main import app, store as session_store
+from log_pipeline import default_log_cache, pipeline as log_pipeline
+from project_store import store as project_store
 from session_migration import create_session_database
+from star_logo_nova import bootstrap, question_ids, results_cache, taken_cache
 
 if getattr(sys, 'frozen', False):
     ABS_PATH = os.path.dirname(sys.executable)
@@ -49,12 +52,21 @@ class BaseTestCase(TestCase):
     def setUp(self):
         middleware = []
         self.app = TestApp(app.wsgifunc(*middleware))
+        session_store.reset()
         if os.path.isfile(SESSIONS_DB):
             os.remove(SESSIONS_DB)
         create_session_database()
+        bootstrap.invalidate()
+        project_store.clear()
+        question_ids.clear()
+        taken_cache.clear()
+        results_cache.clear()
+        log_pipeline.clear()
+        default_log_cache.invalidate()
         self.logout()
 
     def tearDown(self):
         self.logout()
+        session_store.reset()
         if os.path.isfile(SESSIONS_DB):
             os.remove(SESSIONS_DB)
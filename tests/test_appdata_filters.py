@@ -0,0 +1,90 @@
+# pylint: disable=unused-argument
+
+import itertools
+import json
+
+import mock
+
+import settings
+from log_pipeline import pipeline as log_pipeline
+from .test_main import BaseMainTestCase, SAMPLE_ENTRY, mocked_logging_get, mocked_logging_post, osid_agent
+
+
+class AppDataFilterTests(BaseMainTestCase):
+    """ GET /api/appdata: QBank's list passed through, or filtered and
+        paged from the local index """
+    def setUp(self):
+        super(AppDataFilterTests, self).setUp()
+        self.url = '/api/appdata'
+        # keep the 2016 sample entries in the index
+        patcher = mock.patch('settings.LOG_INDEX_MAX_AGE', 100 * 365 * 24 * 60 * 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    def test_unfiltered_get_is_streamed_from_qbank(self, mock_get):
+        self.login()
+        req = self.app.get(self.url)
+        self.assertEqual(self.json(req), [SAMPLE_ENTRY])
+        self.assertTrue(mock_get.call_args[1]['stream'])
+
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post')
+    def test_filtered_get_uses_local_index(self, mock_post, mock_get):
+        ids = itertools.count()
+
+        def side_effect(*args, **kwargs):
+            response = mocked_logging_post(*args, **kwargs)
+            response.json_data['id'] += str(next(ids))
+            return response
+
+        mock_post.side_effect = side_effect
+        self.login()
+        for session_id in ['foo', 'bar', 'foo', 'foo']:
+            self.app.post(self.url,
+                          params=json.dumps({'session_id': session_id}),
+                          headers={'content-type': 'application/json'})
+        log_pipeline.flush()
+        mock_get.reset_mock()
+
+        req = self.app.get('{0}?session_id=foo&limit=2'.format(self.url))
+        data = self.json(req)
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data[0]['agentId'], osid_agent('foo'))
+        req = self.app.get('{0}?session_id=foo&limit=2&cursor={1}'.format(
+            self.url, req.headers['X-Next-Cursor']))
+        self.assertEqual(len(self.json(req)), 1)
+        self.assertNotIn('X-Next-Cursor', req.headers)
+
+        req = self.app.get('{0}?since=2016-08-26T04:58:04.157476Z'.format(self.url))
+        self.assertEqual(len(self.json(req)), 4)
+        req = self.app.get('{0}?until=2016-08-26'.format(self.url))
+        self.assertEqual(self.json(req), [])
+        self.assertFalse(mock_get.called)
+
+    def test_filtered_get_rejects_bad_parameters(self):
+        self.login()
+        for query in ['limit=0', 'limit=x', 'since=yesterday',
+                      'cursor=bad', 'limit={0}'.format(settings.LOG_MAX_PAGE_SIZE + 1)]:
+            req = self.app.get('{0}?{1}'.format(self.url, query),
+                               expect_errors=True)
+            self.code(req, 400)
+
+    def test_limit_and_cursor_need_a_filter(self):
+        self.login()
+        for query in ['limit=2', 'cursor=abc']:
+            req = self.app.get('{0}?{1}'.format(self.url, query),
+                               expect_errors=True)
+            self.code(req, 400)
+
+    @mock.patch('qbank.client.get')
+    @mock.patch('main.generic_logging._get_log')
+    def test_unfiltered_get_passes_qbank_errors_through(self, mock_log, mock_get):
+        mock_log.return_value = {'id': 'log'}
+        mock_get.return_value.status_code = 503
+        mock_get.return_value.reason = 'Service Unavailable'
+        mock_get.return_value.iter_content.return_value = iter(['{"error": "down"}'])
+        self.login()
+        req = self.app.get(self.url, expect_errors=True)
+        self.code(req, 503)
+        self.assertEqual(self.json(req), {'error': 'down'})
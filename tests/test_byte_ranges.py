@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+from unittest import TestCase
+
+import pytest
+
+from byte_ranges import MultipartByteranges, RangeNotSatisfiable,\
+    merge_ranges, parse_range_header
+
+
+class TestParseRangeHeader:
+    def test_missing_header_returns_none(self):
+        assert parse_range_header(None, 100) is None
+        assert parse_range_header('', 100) is None
+
+    def test_other_units_return_none(self):
+        assert parse_range_header('items=0-5', 100) is None
+
+    def test_malformed_header_returns_none(self):
+        assert parse_range_header('bytes=abc', 100) is None
+        assert parse_range_header('bytes=5-2', 100) is None
+        assert parse_range_header('bytes=a-2', 100) is None
+
+    def test_single_range_is_inclusive(self):
+        assert parse_range_header('bytes=0-99', 1000) == [(0, 99)]
+
+    def test_open_ended_range_runs_to_end(self):
+        assert parse_range_header('bytes=500-', 1000) == [(500, 999)]
+
+    def test_suffix_range_returns_last_bytes(self):
+        assert parse_range_header('bytes=-300', 1000) == [(700, 999)]
+
+    def test_suffix_longer_than_file_returns_whole_file(self):
+        assert parse_range_header('bytes=-3000', 1000) == [(0, 999)]
+
+    def test_end_is_clipped_to_file(self):
+        assert parse_range_header('bytes=900-5000', 1000) == [(900, 999)]
+
+    def test_multiple_ranges(self):
+        assert parse_range_header('bytes=0-9, 20-29,-10', 1000) == \
+            [(0, 9), (20, 29), (990, 999)]
+
+    def test_unsatisfiable_ranges_are_dropped(self):
+        assert parse_range_header('bytes=0-9,2000-', 1000) == [(0, 9)]
+
+    def test_all_unsatisfiable_raises(self):
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range_header('bytes=1000-', 1000)
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range_header('bytes=-0', 1000)
+
+    def test_too_many_ranges_returns_none(self):
+        header = 'bytes=' + ','.join(['{0}-{0}'.format(i * 2)
+                                      for i in range(200)])
+        assert parse_range_header(header, 1000) is None
+
+    def test_merge_ranges_merges_overlapping_and_adjacent(self):
+        assert merge_ranges([(20, 30), (0, 10), (5, 15), (31, 40)]) == \
+            [(0, 15), (20, 40)]
+
+
+class TestMultipartByteranges(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.write(handle, b'0123456789')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_body_contains_each_range(self):
+        body = MultipartByteranges(open(self.path, 'rb'),
+                                   [(0, 1), (5, 7)], 10, 'text/plain',
+                                   block_size=2)
+        data = b''.join(body)
+        assert data.startswith(b'--' + body.boundary.encode('utf-8'))
+        assert b'Content-Range: bytes 0-1/10\r\n\r\n01\r\n' in data
+        assert b'Content-Range: bytes 5-7/10\r\n\r\n567\r\n' in data
+        assert data.endswith(b'--' + body.boundary.encode('utf-8') + b'--\r\n')
+
+    def test_content_length_matches_body(self):
+        body = MultipartByteranges(open(self.path, 'rb'),
+                                   [(0, 1), (5, 7), (9, 9)], 10, 'text/plain')
+        assert body.content_length == len(b''.join(body))
+
+    def test_closes_file(self):
+        handle = open(self.path, 'rb')
+        list(MultipartByteranges(handle, [(0, 1), (3, 4)], 10, 'text/plain'))
+        assert handle.closed
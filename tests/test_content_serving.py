@@ -0,0 +1,275 @@
+# pylint: disable=unused-argument
+import os
+import shutil
+import string
+import tempfile
+import zlib
+
+from unittest import TestCase
+
+import pytest
+
+from mock import patch
+
+from content_serving import ContentTypes, FileWrapper, FILE_RESPONSE_KEY,\
+    StaticFileCache, accepts_encoding, ToolPages, Validators, etag_matches, is_current_range, is_not_modified,\
+    send_file, sendfile_middleware
+
+
+class FakeServerFileWrapper:
+    def __init__(self, file_handle, block_size):
+        self.file_handle = file_handle
+        self.block_size = block_size
+        self.position = file_handle.tell()
+
+
+class TestFileWrapper(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.write(handle, b'0123456789')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_first_chunk_is_empty(self):
+        wrapper = FileWrapper(open(self.path, 'rb'))
+        assert next(wrapper) == b''
+
+    def test_iterates_whole_file_by_default(self):
+        wrapper = FileWrapper(open(self.path, 'rb'), block_size=4)
+        assert list(wrapper) == [b'', b'0123', b'4567', b'89']
+
+    def test_iterates_only_requested_slice(self):
+        wrapper = FileWrapper(open(self.path, 'rb'), offset=3, length=4,
+                              block_size=3)
+        assert b''.join(wrapper) == b'3456'
+        assert not wrapper.reaches_eof
+
+    def test_closes_file_when_exhausted(self):
+        wrapper = FileWrapper(open(self.path, 'rb'))
+        list(wrapper)
+        assert wrapper.file_handle.closed
+
+    def test_stops_iterating_after_hand_off(self):
+        wrapper = FileWrapper(open(self.path, 'rb'), offset=2)
+        next(wrapper)
+        server_wrapper = wrapper.hand_off(FakeServerFileWrapper)
+        assert server_wrapper.position == 2
+        assert list(wrapper) == []
+
+
+class TestSendfileMiddleware(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.write(handle, b'0123456789')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def app(self, offset, length=None):
+        def wsgi_app(environ, start_response):
+            response = send_file(environ, open(self.path, 'rb'),
+                                 offset, length)
+            return iter([next(response)] + [response])
+        return sendfile_middleware(wsgi_app)
+
+    def test_hands_off_to_server_file_wrapper(self):
+        environ = {'wsgi.file_wrapper': FakeServerFileWrapper}
+        result = self.app(4)(environ, None)
+        assert isinstance(result, FakeServerFileWrapper)
+        assert result.position == 4
+        assert FILE_RESPONSE_KEY not in environ
+
+    def test_does_not_hand_off_without_server_file_wrapper(self):
+        environ = {}
+        result = self.app(4)(environ, None)
+        assert not isinstance(result, FakeServerFileWrapper)
+
+    def test_does_not_hand_off_partial_file(self):
+        environ = {'wsgi.file_wrapper': FakeServerFileWrapper}
+        result = self.app(4, 2)(environ, None)
+        assert not isinstance(result, FakeServerFileWrapper)
+
+
+class TestContentTypes(TestCase):
+    def setUp(self):
+        self.content_types = ContentTypes(max_entries=2)
+
+    def test_text_types_get_utf8_charset(self):
+        assert ContentTypes.guess('a/page.html') == 'text/html; charset=utf-8'
+        assert ContentTypes.guess('a/data.json') == 'application/json; charset=utf-8'
+
+    def test_css_is_always_text_css(self):
+        assert ContentTypes.guess('a/STYLE.CSS') == 'text/css; charset=utf-8'
+
+    def test_binary_types_have_no_charset(self):
+        assert ContentTypes.guess('a/video.mp4') == 'video/mp4'
+        assert ContentTypes.guess('a/image.png') == 'image/png'
+
+    def test_unknown_types_are_octet_stream(self):
+        assert ContentTypes.guess('a/blob.unknownext') == 'application/octet-stream'
+
+    def test_cached_until_mtime_changes(self):
+        with patch.object(ContentTypes, 'guess', return_value='foo/bar') as MockGuess:
+            assert self.content_types.get('a.html', 1) == 'foo/bar'
+            assert self.content_types.get('a.html', 1) == 'foo/bar'
+            assert MockGuess.call_count == 1
+            self.content_types.get('a.html', 2)
+            assert MockGuess.call_count == 2
+
+    def test_cache_is_bounded(self):
+        for index in range(5):
+            self.content_types.get('{0}.html'.format(index), 1)
+        assert len(self.content_types.cache) <= 2
+
+
+class TestValidators(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.write(handle, b'0123456789')
+        os.close(handle)
+        self.validators = Validators()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_etag_changes_with_mtime(self):
+        etag, _ = self.validators.get(self.path, os.stat(self.path))
+        os.utime(self.path, (1000, 1000))
+        new_etag, last_modified = self.validators.get(self.path,
+                                                      os.stat(self.path))
+        assert etag != new_etag
+        assert last_modified == 'Thu, 01 Jan 1970 00:16:40 GMT'
+
+    def test_etag_matches_lists_and_weak_tags(self):
+        assert etag_matches('"a", "b"', '"b"')
+        assert etag_matches('W/"b"', '"b"')
+        assert etag_matches('*', '"b"')
+        assert not etag_matches('"a"', '"b"')
+
+    def test_accepts_encoding_parses_tokens_and_qvalues(self):
+        assert accepts_encoding('gzip, deflate', 'gzip')
+        assert accepts_encoding('deflate;q=0.5, GZIP;q=0.8', 'gzip')
+        assert accepts_encoding('*', 'gzip')
+        assert not accepts_encoding('gzip;q=0', 'gzip')
+        assert not accepts_encoding('gzip; q=0.0, *', 'gzip')
+        assert not accepts_encoding('x-gzipped, notgzip', 'gzip')
+        assert not accepts_encoding('*;q=0', 'gzip')
+        assert not accepts_encoding('', 'gzip')
+        assert not accepts_encoding(None, 'gzip')
+
+    def test_if_none_match_wins_over_if_modified_since(self):
+        environ = {
+            'HTTP_IF_NONE_MATCH': '"a"',
+            'HTTP_IF_MODIFIED_SINCE': 'Thu, 01 Jan 1970 00:16:40 GMT'
+        }
+        assert not is_not_modified(environ, '"b"', 1000)
+        assert is_not_modified(environ, '"a"', 1000)
+
+    def test_if_modified_since(self):
+        environ = {
+            'HTTP_IF_MODIFIED_SINCE': 'Thu, 01 Jan 1970 00:16:40 GMT'
+        }
+        assert is_not_modified(environ, '"a"', 1000.5)
+        assert not is_not_modified(environ, '"a"', 1001)
+        assert not is_not_modified({'HTTP_IF_MODIFIED_SINCE': 'junk'},
+                                   '"a"', 1)
+
+    def test_if_range(self):
+        assert is_current_range({}, '"a"', 1)
+        assert is_current_range({'HTTP_IF_RANGE': '"a"'}, '"a"', 1)
+        assert not is_current_range({'HTTP_IF_RANGE': 'W/"a"'}, '"a"', 1)
+        assert not is_current_range({'HTTP_IF_RANGE': '"b"'}, '"a"', 1)
+
+
+class TestStaticFileCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = StaticFileCache(max_bytes=4000)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as file_handle:
+            file_handle.write(data)
+        return path
+
+    def test_serves_from_memory_until_file_changes(self):
+        path = self.write('index.html', b'<html>one</html>')
+        cached = self.cache.get(path)
+        with patch('content_serving.open', create=True) as MockOpen:
+            assert self.cache.get(path) is cached
+            assert not MockOpen.called
+        self.write('index.html', b'<html>two!</html>')
+        assert self.cache.get(path).data == b'<html>two!</html>'
+        assert self.cache.get(path).etag != cached.etag
+
+    def test_precomputes_gzip_variant(self):
+        path = self.write('big.html', b'<p>hello</p>' * 100)
+        cached = self.cache.get(path)
+        assert zlib.decompress(cached.gzipped, 16 + zlib.MAX_WBITS) == cached.data
+
+    def test_skips_gzip_when_it_does_not_help(self):
+        path = self.write('tiny.html', b'a')
+        assert self.cache.get(path).gzipped is None
+
+    def test_evicts_least_recently_used_over_budget(self):
+        first = self.write('first.html', os.urandom(1500))
+        second = self.write('second.html', os.urandom(1500))
+        self.cache.get(first)
+        self.cache.get(second)
+        self.cache.get(first)
+        self.cache.get(self.write('third.html', os.urandom(1500)))
+        assert first in self.cache.files
+        assert second not in self.cache.files
+        assert self.cache.total_bytes <= 4000
+
+    def test_does_not_cache_files_over_budget(self):
+        path = self.write('huge.html', os.urandom(5000))
+        assert len(self.cache.get(path).data) == 5000
+        assert not self.cache.files
+
+    def test_missing_file_raises(self):
+        with pytest.raises(OSError):
+            self.cache.get(os.path.join(self.directory, 'missing.html'))
+
+
+class TestToolPages(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'index.html')
+        self.write(b'<html lang="${lang}"></html>')
+        self.pages = ToolPages(max_entries=2, files=StaticFileCache())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data):
+        with open(self.path, 'wb') as file_handle:
+            file_handle.write(data)
+
+    def test_without_lang_returns_raw_file(self):
+        assert self.pages.get(self.path).data == b'<html lang="${lang}"></html>'
+
+    def test_renders_each_language_once(self):
+        with patch('string.Template', wraps=string.Template) as MockTemplate:
+            hindi = self.pages.get(self.path, 'hi')
+            assert hindi.data == b'<html lang="hi"></html>'
+            assert self.pages.get(self.path, 'hi') is hindi
+            assert self.pages.get(self.path, 'te').data == b'<html lang="te"></html>'
+            assert MockTemplate.call_count == 1
+
+    def test_rerenders_when_file_changes(self):
+        self.pages.get(self.path, 'hi')
+        self.write(b'<body lang="${lang}"></body>')
+        assert self.pages.get(self.path, 'hi').data == b'<body lang="hi"></body>'
+
+    def test_keeps_only_recent_renderings(self):
+        for lang in ['en', 'hi', 'te']:
+            self.pages.get(self.path, lang)
+        assert list(self.pages.rendered) == [(self.path, 'hi'),
+                                             (self.path, 'te')]
@@ -0,0 +1,113 @@
+# pylint: disable=unused-argument
+
+import json
+
+import mock
+
+import settings
+from log_pipeline import pipeline as log_pipeline
+from .test_main import BaseMainTestCase, mocked_logging_get, mocked_logging_post
+
+
+class DefaultLogTests(BaseMainTestCase):
+    """ GET and POST /api/appdata find QBank's default log, and keep it for
+        the life of the process """
+    def setUp(self):
+        super(DefaultLogTests, self).setUp()
+        self.url = '/api/appdata'
+
+    @mock.patch('qbank.client.get')
+    def test_get_log_with_default_log_present(self,
+                                              MockGet):
+        class FakeGet:
+            status_code = 200
+
+            @staticmethod
+            def json():
+                return [{
+                    'genusTypeId': settings.DEFAULT_LOG_GENUS_TYPE,
+                    'id': 'foo'
+                }]
+
+            @staticmethod
+            def iter_content(_chunk_size):
+                return iter([json.dumps(FakeGet.json())])
+
+        MockGet.return_value = FakeGet
+
+        self.login()
+        req = self.app.get(self.url)
+        self.ok(req)
+        data = self.json(req)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], 'foo')
+
+    @mock.patch('qbank.client.post')
+    @mock.patch('qbank.client.get')
+    def test_get_log_with_no_default_log(self,
+                                         MockGet,
+                                         MockPost):
+        class FakeGet:
+            status_code = 200
+
+            @staticmethod
+            def json():
+                return []
+
+            @staticmethod
+            def iter_content(_chunk_size):
+                return iter([json.dumps(FakeGet.json())])
+
+        class FakePost:
+            @staticmethod
+            def json():
+                return {
+                    'id': 'foo2'
+                }
+
+        MockGet.return_value = FakeGet
+        MockPost.return_value = FakePost
+
+        self.login()
+        req = self.app.get(self.url)
+        self.ok(req)
+        data = self.json(req)
+        self.assertEqual(len(data), 0)  # from FakeGet
+
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
+    def test_default_log_is_looked_up_once(self, mock_post, mock_get):
+        self.login()
+        for _ in range(3):
+            self.app.get(self.url)
+            self.app.post(self.url,
+                          params=json.dumps({'action': 'click'}),
+                          headers={'content-type': 'application/json'})
+            log_pipeline.flush()
+        logs_calls = [call for call in mock_get.call_args_list
+                      if call[0][0] == settings.QBANK_LOGGING_ENDPOINT]
+        self.assertEqual(len(logs_calls), 1)
+        self.assertEqual(mock_post.call_count, 3)
+
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
+    def test_failed_lookup_is_not_kept(self, mock_post, mock_get):
+        hiccup = mock.Mock(status_code=500)
+        hiccup.json.return_value = {'detail': 'QBank hiccup'}
+        mock_get.side_effect = [hiccup, hiccup]
+        self.login()
+        req = self.app.get(self.url)
+        self.ok(req)
+        self.assertEqual(self.json(req), [])
+        self.app.post(self.url,
+                      params=json.dumps({'action': 'click'}),
+                      headers={'content-type': 'application/json'})
+        log_pipeline.flush()
+        self.assertEqual(mock_post.call_count, 0)
+        # QBank is back: the next lookup finds the log, and the entry
+        #   kept in the spool is sent to it
+        mock_get.side_effect = mocked_logging_get
+        self.ok(self.app.get(self.url))
+        log_pipeline.flush()
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(log_pipeline.stats()['depth'], 0)
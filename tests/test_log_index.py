@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from mock import patch
+
+import utilities
+
+from log_index import LogIndex, iter_entries_json
+
+
+def make_entry(index, day=1):
+    return {
+        'id': 'entry{0}'.format(index),
+        'timestamp': {'year': 2018, 'month': 6, 'day': day, 'hour': index},
+    }
+
+
+class TestLogIndex(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = LogIndex(os.path.join(self.directory, 'logs', 'index.sqlite3'))
+        # keep the 2018 entries
+        patcher = patch('settings.LOG_INDEX_MAX_AGE', 100 * 365 * 24 * 60 * 60)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def ids(self, limit=None, **filters):
+        return [json.loads(entry)['id']
+                for entry in self.index.find(limit, **filters)]
+
+    def test_entries_are_buffered_until_commit(self):
+        self.index.add('a', make_entry(1))
+        self.assertEqual(self.ids(), [])
+        self.index.commit()
+        self.assertEqual(self.ids(), ['entry1'])
+
+    def test_filters_by_session_and_time(self):
+        for index in range(6):
+            self.index.add('a' if index % 2 else 'b', make_entry(index))
+        self.index.commit()
+        self.assertEqual(self.ids(session_id='a'), ['entry1', 'entry3', 'entry5'])
+        since = utilities.parse_iso_time('2018-06-01T02:00:00Z')
+        until = utilities.parse_iso_time('2018-06-01T05:00:00Z')
+        self.assertEqual(self.ids(since=since, until=until),
+                         ['entry2', 'entry3', 'entry4'])
+        self.assertEqual(self.ids(session_id='b', since=since),
+                         ['entry2', 'entry4'])
+
+    def test_oldest_first_by_qbank_timestamp(self):
+        self.index.add('a', make_entry(1, day=2))
+        self.index.add('a', make_entry(2, day=1))
+        self.index.commit()
+        self.assertEqual(self.ids(), ['entry2', 'entry1'])
+
+    def test_pages_with_cursor(self):
+        for index in range(5):
+            self.index.add('a', make_entry(index))
+        # same timestamp: ordered by when they were indexed
+        self.index.add('a', dict(make_entry(4), id='entry4b'))
+        self.index.commit()
+        pages = []
+        after = None
+        while True:
+            pages.append(self.ids(2, after=after))
+            cursor = self.index.next_cursor(2, after=after)
+            if cursor is None:
+                break
+            after = utilities.decode_cursor(cursor)
+        self.assertEqual(pages, [['entry0', 'entry1'],
+                                 ['entry2', 'entry3'],
+                                 ['entry4', 'entry4b']])
+
+    def test_old_entries_are_pruned(self):
+        self.index.add('a', make_entry(1))
+        self.index.add('a', {'id': 'now'})
+        self.index.commit()
+        self.assertEqual(self.ids(), ['entry1', 'now'])
+        with patch('settings.LOG_INDEX_MAX_AGE', 24 * 60 * 60):
+            # not before LOG_INDEX_PRUNE_SECONDS have passed
+            self.index.commit()
+            self.assertEqual(self.ids(), ['entry1', 'now'])
+            with patch('settings.LOG_INDEX_PRUNE_SECONDS', 0):
+                self.index.commit()
+        self.assertEqual(self.ids(), ['now'])
+
+    def test_ignores_entries_that_are_not_objects(self):
+        self.index.add('a', ['not', 'an', 'entry'])
+        self.index.add('a', {'id': 'no-timestamp'})
+        self.index.commit()
+        self.assertEqual(self.ids(), ['no-timestamp'])
+
+    def test_iter_entries_json(self):
+        self.assertEqual(json.loads(''.join(iter_entries_json([]))), [])
+        self.assertEqual(json.loads(''.join(iter_entries_json(['1', '{}']))),
+                         [1, {}])
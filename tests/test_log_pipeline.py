@@ -0,0 +1,288 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from log_pipeline import DefaultLogCache, LogPipeline, LogSender
+from log_spool import DEAD_LETTERS, LogSpool
+
+
+class TestLogPipeline(TestCase):
+    def setUp(self):
+        patcher = patch('log_pipeline.default_log',
+                        return_value={'id': 'log'})
+        self.mock_log = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('qbank.client.post')
+        self.mock_post = patcher.start()
+        self.mock_post.return_value.status_code = 200
+        self.addCleanup(patcher.stop)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'spool')
+
+    def posted(self):
+        return [call[1]['json']['data'] for call in self.mock_post.call_args_list]
+
+    def pipeline(self, max_bytes=None, segment_bytes=None, **kwargs):
+        spool = LogSpool(self.path, max_bytes=max_bytes, segment_bytes=segment_bytes)
+        self.addCleanup(spool.close)
+        return LogPipeline(spool, **kwargs)
+
+    def test_rejects_unknown_drop_policy(self):
+        with self.assertRaises(ValueError):
+            self.pipeline(drop_policy='random')
+
+    def test_entries_are_spooled_before_submit_returns(self):
+        log_pipeline = self.pipeline()
+        log_pipeline.submit('s', 1)
+        log_pipeline.submit('s', 2)
+        # as if the server went down before sending anything
+        self.pipeline().flush()
+        self.assertEqual(self.posted(), [1, 2])
+
+    def test_full_spool_drops_oldest(self):
+        # one segment per entry
+        log_pipeline = self.pipeline(max_bytes=20, segment_bytes=1,
+                                     drop_policy='oldest')
+        for index in range(4):
+            self.assertTrue(log_pipeline.submit('s', index))
+        stats = log_pipeline.stats()
+        self.assertEqual(stats['depth'], 2)
+        self.assertEqual(stats['dropped'], 2)
+        log_pipeline.flush()
+        self.assertEqual(self.posted(), [2, 3])
+
+    def test_full_spool_drops_newest(self):
+        log_pipeline = self.pipeline(max_bytes=20, segment_bytes=1,
+                                     drop_policy='newest')
+        results = [log_pipeline.submit('s', index) for index in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        log_pipeline.flush()
+        self.assertEqual(self.posted(), [0, 1])
+
+    def test_session_id_is_sent_as_proxy_header(self):
+        log_pipeline = self.pipeline()
+        log_pipeline.submit('foo', {'a': 1})
+        log_pipeline.flush()
+        url = self.mock_post.call_args[0][0]
+        self.assertTrue(url.endswith('/log/logentries'))
+        self.assertEqual(self.mock_post.call_args[1]['headers'],
+                         {'x-api-proxy': 'foo'})
+
+    def test_failures_are_counted(self):
+        log_pipeline = self.pipeline()
+        self.mock_post.side_effect = [MagicMock(status_code=400),
+                                      MagicMock(status_code=200),
+                                      IOError('QBank is down'),
+                                      MagicMock(status_code=400)]
+        for index in range(3):
+            log_pipeline.submit('s', index)
+        log_pipeline.flush()
+        stats = log_pipeline.stats()
+        self.assertEqual((stats['sent'], stats['failed'], stats['retried']),
+                         (1, 2, 1))
+        self.assertEqual(stats['depth'], 0)
+
+    def test_clear_forgets_entries(self):
+        log_pipeline = self.pipeline()
+        log_pipeline.submit('s', 1)
+        log_pipeline.clear()
+        self.assertEqual(log_pipeline.stats()['depth'], 0)
+        self.assertEqual(log_pipeline.stats()['accepted'], 0)
+        log_pipeline.flush()
+        self.assertFalse(self.mock_post.called)
+
+    def test_entries_are_grouped_by_session(self):
+        log_pipeline = self.pipeline(threads=1)
+        for session_id, data in [('a', 1), ('b', 2), ('a', 3), ('b', 4)]:
+            log_pipeline.submit(session_id, data)
+        log_pipeline.flush()
+        self.assertEqual(self.mock_log.call_count, 1)
+        self.assertEqual(self.posted(), [1, 3, 2, 4])
+
+    def test_sessions_are_posted_in_parallel(self):
+        log_pipeline = self.pipeline(threads=4)
+        for index in range(20):
+            log_pipeline.submit('session{0}'.format(index % 5), index)
+        log_pipeline.flush()
+        self.assertEqual(sorted(self.posted()), range(20))
+        for index in range(5):
+            session = [call[1]['json']['data']
+                       for call in self.mock_post.call_args_list
+                       if call[1]['headers']['x-api-proxy'] == 'session{0}'.format(index)]
+            self.assertEqual(session, range(index, 20, 5))
+        self.assertEqual(log_pipeline.stats()['sent'], 20)
+
+    @patch('settings.LOG_SENDER_BATCH_SIZE', 2)
+    def test_take_waits_for_the_batch_to_fill(self):
+        log_pipeline = self.pipeline()
+        log_pipeline.submit('s', 1)
+        timer = threading.Timer(0.05, log_pipeline.submit, ('s', 2))
+        timer.start()
+        start = time.time()
+        entries = log_pipeline.take(wait=5)
+        timer.join()
+        self.assertEqual(entries, [('s', 1), ('s', 2)])
+        # returned as soon as the batch was full
+        self.assertLess(time.time() - start, 5)
+
+    def test_take_stops_waiting_after_wait(self):
+        log_pipeline = self.pipeline()
+        log_pipeline.submit('s', 1)
+        self.assertEqual(log_pipeline.take(wait=0.01), [('s', 1)])
+
+    def test_unreachable_qbank_retries_the_rest(self):
+        log_pipeline = self.pipeline(threads=1)
+        self.mock_post.side_effect = [MagicMock(status_code=200),
+                                      IOError('QBank is down'),
+                                      MagicMock(status_code=503)]
+        for session_id, data in [('a', 1), ('a', 2), ('a', 3), ('b', 4)]:
+            log_pipeline.submit(session_id, data)
+        # b's entry comes after the one that failed, so is not posted
+        self.assertEqual(log_pipeline.process(), 1)
+        stats = log_pipeline.stats()
+        self.assertEqual((stats['sent'], stats['retried'], stats['failed']),
+                         (1, 3, 0))
+        self.assertEqual(stats['depth'], 3)
+
+        self.mock_post.side_effect = None
+        log_pipeline.flush()
+        self.assertEqual(self.posted()[-3:], [2, 3, 4])
+        self.assertEqual(log_pipeline.stats()['depth'], 0)
+
+    def test_entries_are_sent_in_order_after_a_failure(self):
+        log_pipeline = self.pipeline()
+        for index in range(5):
+            log_pipeline.submit('a', index)
+        sent = []
+
+        def post(*_args, **kwargs):
+            data = kwargs['json']['data']
+            if data == 2 and 2 not in self.posted()[:-1]:
+                # QBank hiccups while another entry is submitted
+                log_pipeline.submit('a', 5)
+                return MagicMock(status_code=502)
+            sent.append(data)
+            return MagicMock(status_code=200)
+
+        self.mock_post.side_effect = post
+        log_pipeline.flush()
+        self.assertEqual(sent, range(6))
+        self.assertEqual(log_pipeline.stats()['depth'], 0)
+
+    @patch('settings.LOG_SPOOL_MAX_ATTEMPTS', 3)
+    def test_entry_qbank_keeps_failing_on_is_set_aside(self):
+        log_pipeline = self.pipeline()
+        for index in range(3):
+            log_pipeline.submit('s', index)
+        self.mock_post.side_effect = lambda *args, **kwargs: MagicMock(
+            status_code=500 if kwargs['json']['data'] == 1 else 200)
+        self.assertEqual(log_pipeline.process(), 1)
+        self.assertEqual(log_pipeline.process(), 0)
+        # the third time, it is set aside
+        self.assertEqual(log_pipeline.process(), 1)
+        log_pipeline.flush()
+        self.assertEqual(self.posted(), [0, 1, 1, 1, 2])
+        stats = log_pipeline.stats()
+        self.assertEqual((stats['sent'], stats['dead_letters'], stats['depth']),
+                         (2, 1, 0))
+        with open(os.path.join(self.path, DEAD_LETTERS)) as dead_letters:
+            self.assertEqual(dead_letters.read(), '["s", 1]\n')
+
+    def test_missing_default_log_keeps_everything(self):
+        log_pipeline = self.pipeline()
+        self.mock_log.side_effect = IOError('QBank is down')
+        log_pipeline.submit('s', 1)
+        log_pipeline.submit('s', 2)
+        log_pipeline.flush()
+        self.assertEqual(log_pipeline.stats()['depth'], 2)
+        self.mock_log.side_effect = None
+        log_pipeline.flush()
+        self.assertEqual(self.posted(), [1, 2])
+        self.assertEqual(log_pipeline.stats()['depth'], 0)
+
+    def test_sender_posts_in_background(self):
+        log_pipeline = self.pipeline()
+        sender = LogSender(log_pipeline, interval=0.01)
+        sender.start()
+        log_pipeline.submit('s', 1)
+        deadline = time.time() + 5
+        while not self.posted() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.posted(), [1])
+        log_pipeline.submit('s', 2)
+        sender.stop()
+        self.assertFalse(sender.is_alive())
+        self.assertEqual(self.posted(), [1, 2])
+
+    @patch('settings.LOG_SENDER_BATCH_WAIT', 0)
+    @patch('settings.LOG_SPOOL_RETRY_SECONDS', 60)
+    def test_sender_waits_while_qbank_is_unreachable(self):
+        log_pipeline = self.pipeline()
+        self.mock_log.side_effect = IOError('QBank is down')
+        sender = LogSender(log_pipeline, interval=0.01)
+        sender.start()
+        log_pipeline.submit('s', 1)
+        time.sleep(0.2)
+        self.assertEqual(self.mock_log.call_count, 1)
+        sender.stop()
+        self.assertEqual(log_pipeline.stats()['depth'], 1)
+
+
+class TestDefaultLogCache(TestCase):
+    @patch('log_pipeline.find_default_log')
+    def test_log_is_looked_up_once(self, MockFind):
+        MockFind.return_value = {'id': 'log'}
+        cache = DefaultLogCache()
+        for _ in range(3):
+            self.assertEqual(cache.get(), {'id': 'log'})
+        self.assertEqual(MockFind.call_count, 1)
+
+    @patch('log_pipeline.find_default_log')
+    def test_racing_threads_look_up_once(self, MockFind):
+        def slow_find():
+            time.sleep(0.05)
+            return {'id': 'log'}
+
+        MockFind.side_effect = slow_find
+        cache = DefaultLogCache()
+        threads = [threading.Thread(target=cache.get) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(MockFind.call_count, 1)
+
+    @patch('log_pipeline.find_default_log')
+    def test_404_invalidates(self, MockFind):
+        MockFind.return_value = {'id': 'log'}
+        cache = DefaultLogCache()
+        cache.get()
+        cache.check(MagicMock(status_code=200))
+        cache.get()
+        cache.check(MagicMock(status_code=404))
+        cache.get()
+        self.assertEqual(MockFind.call_count, 2)
+
+    @patch('qbank.client.post')
+    @patch('log_pipeline.find_default_log')
+    def test_entry_for_a_deleted_log_is_kept(self, MockFind, MockPost):
+        MockFind.side_effect = [{'id': 'old'}, {'id': 'new'}]
+        MockPost.return_value.status_code = 404
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with patch('log_pipeline.default_log_cache', DefaultLogCache()):
+            log_pipeline = LogPipeline(LogSpool(os.path.join(directory, 'spool')))
+            log_pipeline.submit('s', 1)
+            log_pipeline.flush()
+            self.assertEqual(log_pipeline.stats()['depth'], 1)
+            MockPost.return_value.status_code = 201
+            log_pipeline.flush()
+            self.assertEqual(log_pipeline.stats()['sent'], 1)
+        self.assertTrue(MockPost.call_args[0][0].endswith('/new/logentries'))
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from mock import patch
+
+from log_spool import LogSpool
+
+
+class TestLogSpool(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'spool')
+        self.spool = LogSpool(self.path, max_bytes=10000, segment_bytes=100)
+
+    def tearDown(self):
+        self.spool.close()
+        shutil.rmtree(self.directory)
+
+    def test_reads_in_order_across_segments(self):
+        for index in range(20):
+            self.assertTrue(self.spool.append([('s', index)]))
+        self.assertGreater(len(self.spool.segments()), 1)
+        self.assertEqual(self.spool.read(100), [('s', index) for index in range(20)])
+        self.assertFalse(self.spool.unread())
+        self.spool.ack()
+        # acknowledged segments are deleted, bar the one still appended to
+        self.assertEqual(len(self.spool.segments()), 1)
+        self.assertEqual(self.spool.stats()['depth'], 0)
+
+    def test_reads_what_is_appended_meanwhile(self):
+        self.spool.append([('s', 1)])
+        self.assertEqual(self.spool.read(10), [('s', 1)])
+        self.assertEqual(self.spool.read(10), [])
+        self.spool.append([('s', 2)])
+        self.assertTrue(self.spool.unread())
+        self.assertEqual(self.spool.read(10), [('s', 2)])
+
+    def test_rewind_hands_entries_out_again(self):
+        self.spool.append([('s', index) for index in range(5)])
+        self.assertEqual(self.spool.read(2), [('s', 0), ('s', 1)])
+        self.spool.rewind()
+        self.assertEqual([data for _, data in self.spool.read(3)], range(3))
+        self.spool.ack()
+        self.assertEqual([data for _, data in self.spool.read(10)], [3, 4])
+
+    def test_ack_of_the_first_entries_hands_the_rest_out_again(self):
+        for index in range(6):
+            self.spool.append([('s', index)])
+        self.spool.read(2)
+        self.spool.read(2)
+        self.spool.ack(3)
+        self.assertEqual(self.spool.stats()['depth'], 3)
+        self.assertEqual([data for _, data in self.spool.read(10)], [3, 4, 5])
+        self.spool.ack(0)
+        self.assertEqual([data for _, data in self.spool.read(10)], [3, 4, 5])
+
+    @patch('settings.LOG_SPOOL_ACK_EVERY', 1)
+    def test_restart_resumes_after_acknowledged_entries(self):
+        self.spool.append([('s', index) for index in range(5)])
+        self.spool.read(2)
+        self.spool.ack()
+        self.spool.read(1)  # not acknowledged
+        restarted = LogSpool(self.path)
+        self.assertEqual(restarted.stats()['depth'], 3)
+        self.assertEqual([data for _, data in restarted.read(10)], [2, 3, 4])
+
+    def test_entries_after_the_saved_ack_are_read_again(self):
+        self.spool.append([('s', index) for index in range(5)])
+        self.spool.read(2)
+        self.spool.ack()
+        # a crash before LOG_SPOOL_ACK_EVERY entries were acknowledged
+        restarted = LogSpool(self.path)
+        self.assertEqual([data for _, data in restarted.read(10)], range(5))
+
+    def test_refuses_entries_over_max_bytes(self):
+        spool = LogSpool(self.path, max_bytes=30)
+        self.assertTrue(spool.append([('s', 1)]))
+        self.assertFalse(spool.append([('s', 'x' * 30)]))
+        self.assertEqual(spool.stats()['spool_bytes'], len('["s", 1]\n'))
+        self.assertTrue(spool.append([('s', 'x' * 30)], bounded=False))
+        spool.close()
+
+    def test_size_survives_restart(self):
+        self.spool.append([('s', 1)])
+        self.spool.close()
+        self.assertEqual(LogSpool(self.path).stats()['spool_bytes'],
+                         len('["s", 1]\n'))
+
+    @patch('settings.LOG_SPOOL_FSYNC_ENTRIES', 3)
+    @patch('os.fsync')
+    def test_fsync_is_batched(self, MockFsync):
+        spool = LogSpool(self.path)
+        for index in range(5):
+            spool.append([('s', index)])
+        self.assertEqual(MockFsync.call_count, 1)
+        with patch('settings.LOG_SPOOL_FSYNC_SECONDS', 0):
+            spool.sync_due()
+        self.assertEqual(MockFsync.call_count, 2)
+        spool.sync_due()  # nothing new
+        self.assertEqual(MockFsync.call_count, 2)
+        spool.close()
+
+    def test_torn_line_is_skipped(self):
+        self.spool.append([('s', 1)])
+        self.spool.close()
+        with open(self.spool.segment_path(self.spool.segments()[-1]), 'ab') as segment:
+            segment.write('["s", ')
+        self.spool.append([('s', 2)])
+        self.assertEqual(self.spool.read(10), [('s', 1), ('s', 2)])
+
+    def test_drop_oldest_spares_segments_being_read(self):
+        spool = LogSpool(self.path, segment_bytes=1)
+        spool.append([('s', 0)])
+        spool.append([('s', 1)])
+        spool.append([('s', 2)])
+        self.assertEqual(spool.read(1), [('s', 0)])
+        self.assertEqual(spool.drop_oldest(), 1)
+        spool.ack()
+        self.assertEqual(spool.read(10), [('s', 2)])
+        self.assertEqual(spool.stats()['depth'], 1)
+        spool.close()
+
+    def test_drop_oldest_spares_the_open_segment(self):
+        self.spool.append([('s', 0)])
+        self.assertIsNone(self.spool.drop_oldest())
+        self.assertEqual(self.spool.read(10), [('s', 0)])
@@ -4,15 +4,19 @@ import glob
 import json
 import shutil
 import sqlite3
+import zlib
 
 from copy import deepcopy
 
 import os
 import mock
 
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, ReadTimeout
+from webob import Request
 
 import settings
+
+from log_pipeline import pipeline as log_pipeline
 from testing_utilities import BaseTestCase
 
 PROJECT_PATH = os.path.dirname(os.path.abspath(__file__))
@@ -123,6 +127,12 @@ def mocked_logging_get(*args, **kwargs):
 
         def json(self):
             return self.json_data
+
+        def iter_content(self, _chunk_size):
+            return iter([json.dumps(self.json_data)])
+
+        def close(self):
+            pass
     if args[0] == "https://localhost:8080/api/v1/logging/logs":
         return MockResponse([SAMPLE_LOG], 200)
     return MockResponse([SAMPLE_ENTRY], 200)
@@ -185,6 +195,11 @@ class BasicServiceTests(BaseMainTestCase):
         req = self.app.get('/datastore_path')
         self.ok(req)
 
+    def test_can_get_qbank_stats(self):
+        req = self.app.get('/api/v1/qbank/stats')
+        self.ok(req)
+        self.assertIsInstance(self.json(req), list)
+
 
 class OEATests(BaseMainTestCase):
     """Test the views for getting the OEA player
@@ -222,6 +237,29 @@ class OEATests(BaseMainTestCase):
         self.ok(req)
         self.message(req, 'Clix assessment activity')
 
+    def test_oea_index_supports_etag_and_gzip(self):
+        self.login()
+        # straight to the app, because webtest decodes gzip responses
+        cookie = 'unplatform_session_id={0}'.format(
+            self.app.cookies['unplatform_session_id'])
+        raw = Request.blank('/oea', headers={
+            'Accept-Encoding': 'gzip', 'Cookie': cookie}).get_response(self.app.app)
+        self.assertEqual(raw.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Clix assessment activity',
+                      zlib.decompress(raw.body, 16 + zlib.MAX_WBITS))
+        raw = Request.blank('/oea', headers={
+            'Accept-Encoding': 'gzip;q=0', 'Cookie': cookie}).get_response(self.app.app)
+        self.assertNotIn('Content-Encoding', raw.headers)
+        self.assertIn('Clix assessment activity', raw.body)
+        req = self.app.get('/oea', headers={'Accept-Encoding': 'gzip'})
+        self.ok(req)
+        self.assertIn('Clix assessment activity', req.body)
+        self.assertEqual(req.headers['Vary'], 'Accept-Encoding')
+        req = self.app.get('/oea',
+                           headers={'If-None-Match': req.headers['ETag']},
+                           status=304)
+        self.code(req, 304)
+
     def test_users_can_get_oea_index_with_trailing_slash(self):
         self.login()
         url = '/oea/'
@@ -310,6 +348,19 @@ class ToolTests(BaseMainTestCase):
         self.ok(req)
         self.assertEqual(req.body, '${lang}\n')
 
+    def test_tool_etag_differs_per_language(self):
+        self.login()
+        english = self.app.get('/common/test_tool?lang=en')
+        hindi = self.app.get('/common/test_tool?lang=hi')
+        self.assertNotEqual(english.headers['ETag'], hindi.headers['ETag'])
+        req = self.app.get('/common/test_tool?lang=hi',
+                           headers={'If-None-Match': hindi.headers['ETag']},
+                           status=304)
+        self.code(req, 304)
+        req = self.app.get('/common/test_tool?lang=en',
+                           headers={'If-None-Match': hindi.headers['ETag']})
+        self.assertEqual(req.body, 'en\n')
+
     def test_tool_not_found(self):
         self.login()
         url = '/common/fake_tool/'
@@ -336,6 +387,14 @@ class ModuleDirectoryListingTests(BaseMainTestCase):
         # data = self.json(req)
         # self.assertTrue(len(data) > 0)
 
+    def test_modules_listing_supports_etag(self):
+        req = self.app.get(self.url)
+        self.assertIn('ETag', req.headers)
+        req = self.app.get(self.url,
+                           headers={'If-None-Match': req.headers['ETag']},
+                           status=304)
+        self.code(req, 304)
+
 
 class ConfigurationTests(BaseMainTestCase):
     """Test the school configuration endpoints
@@ -468,12 +527,12 @@ class LoggingTests(BaseMainTestCase):
         # if os.path.isdir(self.data_dir):
         #     shutil.rmtree(self.data_dir)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
     def test_cannot_get_log_entries_with_inactive_session(self, mock_get):
         req = self.app.get(self.url, expect_errors=True)
         self.code(req, 403)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
     def test_can_get_log_entries_if_active_session(self, mock_get):
         self.login()
         req = self.app.get(self.url)
@@ -482,8 +541,8 @@ class LoggingTests(BaseMainTestCase):
         self.assertEqual(len(data), 1)
         self.assertEqual(data, [SAMPLE_ENTRY])
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_cannot_create_log_entry_with_inactive_session(self, mock_post, mock_get):
         payload = {
             'action': 'pause audio',
@@ -499,8 +558,21 @@ class LoggingTests(BaseMainTestCase):
                             expect_errors=True)
         self.code(req, 403)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('log_pipeline.pipeline.submit', return_value=False)
+    def test_dropped_entry_is_answered_with_503(self, mock_submit):
+        self.login()
+        req = self.app.post(self.url,
+                            params=json.dumps({'action': 'click'}),
+                            headers={'content-type': 'application/json'},
+                            expect_errors=True)
+        self.code(req, 503)
+        self.assertFalse(self.json(req)['queued'])
+        self.assertEqual(req.headers['Retry-After'],
+                         str(settings.LOG_SPOOL_RETRY_SECONDS))
+        self.assertEqual(mock_submit.call_count, 1)
+
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_can_create_log_entry_with_active_session(self, mock_post, mock_get):
         self.login()
         payload = {
@@ -514,22 +586,17 @@ class LoggingTests(BaseMainTestCase):
         req = self.app.post(self.url,
                             params=json.dumps(payload),
                             headers={'content-type': 'application/json'})
-        self.ok(req)
-        entry = self.json(req)
-        self.assertTrue(
-            json.loads(entry['text']['text']) == payload)
-        self.assertEqual(
-            entry['agentId'],
-            osid_agent('none_provided')
-        )
+        self.code(req, 202)
+        self.assertTrue(self.json(req)['queued'])
+        log_pipeline.flush()
 
         call_params = mock_post.call_args_list[0][1]
         self.assertEqual(call_params['headers']['x-api-proxy'],
                          'none_provided')
         self.assertEqual(call_params['json']['data'], payload)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_session_id_does_not_pass_through_to_header_if_provided_with_inactive_session(self, mock_post, mock_get):
         payload = {
             'action': 'pause audio',
@@ -546,8 +613,8 @@ class LoggingTests(BaseMainTestCase):
                             expect_errors=True)
         self.code(req, 403)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_session_id_passes_through_to_header_if_provided_with_active_session(self, mock_post, mock_get):
         self.login()
         payload = {
@@ -562,21 +629,16 @@ class LoggingTests(BaseMainTestCase):
         req = self.app.post(self.url,
                             params=json.dumps(payload),
                             headers={'content-type': 'application/json'})
-        self.ok(req)
-        entry = self.json(req)
-        self.assertTrue(
-            json.loads(entry['text']['text']) == payload)
-        self.assertEqual(
-            entry['agentId'],
-            osid_agent('foo')
-        )
+        self.code(req, 202)
+        self.assertTrue(self.json(req)['queued'])
+        log_pipeline.flush()
 
         call_params = mock_post.call_args_list[0][1]
         self.assertEqual(call_params['headers']['x-api-proxy'], 'foo')
         self.assertEqual(call_params['json']['data'], payload)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_sessionId_does_not_pass_through_to_header_if_provided_with_inactive_session(self, mock_post, mock_get):
         payload = {
             'action': 'pause audio',
@@ -593,8 +655,8 @@ class LoggingTests(BaseMainTestCase):
                             expect_errors=True)
         self.code(req, 403)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_sessionId_passes_through_to_header_if_provided_with_active_session(self, mock_post, mock_get):
         self.login()
         payload = {
@@ -609,21 +671,16 @@ class LoggingTests(BaseMainTestCase):
         req = self.app.post(self.url,
                             params=json.dumps(payload),
                             headers={'content-type': 'application/json'})
-        self.ok(req)
-        entry = self.json(req)
-        self.assertTrue(
-            json.loads(entry['text']['text']) == payload)
-        self.assertEqual(
-            entry['agentId'],
-            osid_agent('bar')
-        )
+        self.code(req, 202)
+        self.assertTrue(self.json(req)['queued'])
+        log_pipeline.flush()
 
         call_params = mock_post.call_args_list[0][1]
         self.assertEqual(call_params['headers']['x-api-proxy'], 'bar')
         self.assertEqual(call_params['json']['data'], payload)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_user_id_does_not_pass_through_to_header_if_provided_with_inactive_session(self, mock_post, mock_get):
         payload = {
             'action': 'pause audio',
@@ -640,8 +697,8 @@ class LoggingTests(BaseMainTestCase):
                             expect_errors=True)
         self.code(req, 403)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_user_id_passes_through_to_header_if_provided_with_active_session(self, mock_post, mock_get):
         self.login()
         payload = {
@@ -656,21 +713,16 @@ class LoggingTests(BaseMainTestCase):
         req = self.app.post(self.url,
                             params=json.dumps(payload),
                             headers={'content-type': 'application/json'})
-        self.ok(req)
-        entry = self.json(req)
-        self.assertTrue(
-            json.loads(entry['text']['text']) == payload)
-        self.assertEqual(
-            entry['agentId'],
-            osid_agent('bar')
-        )
+        self.code(req, 202)
+        self.assertTrue(self.json(req)['queued'])
+        log_pipeline.flush()
 
         call_params = mock_post.call_args_list[0][1]
         self.assertEqual(call_params['headers']['x-api-proxy'], 'bar')
         self.assertEqual(call_params['json']['data'], payload)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_userId_does_not_pass_through_to_header_if_provided_with_inactive_session(self, mock_post, mock_get):
         payload = {
             'action': 'pause audio',
@@ -687,8 +739,8 @@ class LoggingTests(BaseMainTestCase):
                             expect_errors=True)
         self.code(req, 403)
 
-    @mock.patch('main.requests.get', side_effect=mocked_logging_get)
-    @mock.patch('main.requests.post', side_effect=mocked_logging_post)
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
     def test_userId_passes_through_to_header_if_provided_with_active_session(self, mock_post, mock_get):
         self.login()
         payload = {
@@ -703,65 +755,14 @@ class LoggingTests(BaseMainTestCase):
         req = self.app.post(self.url,
                             params=json.dumps(payload),
                             headers={'content-type': 'application/json'})
-        self.ok(req)
-        entry = self.json(req)
-        self.assertTrue(
-            json.loads(entry['text']['text']) == payload)
-        self.assertEqual(
-            entry['agentId'],
-            osid_agent('bar')
-        )
+        self.code(req, 202)
+        self.assertTrue(self.json(req)['queued'])
+        log_pipeline.flush()
 
         call_params = mock_post.call_args_list[0][1]
         self.assertEqual(call_params['headers']['x-api-proxy'], 'bar')
         self.assertEqual(call_params['json']['data'], payload)
 
-    @mock.patch('requests.get')
-    def test_get_log_with_default_log_present(self,
-                                              MockGet):
-        class FakeGet:
-            @staticmethod
-            def json():
-                return [{
-                    'genusTypeId': settings.DEFAULT_LOG_GENUS_TYPE,
-                    'id': 'foo'
-                }]
-
-        MockGet.return_value = FakeGet
-
-        self.login()
-        req = self.app.get(self.url)
-        self.ok(req)
-        data = self.json(req)
-        self.assertEqual(len(data), 1)
-        self.assertEqual(data[0]['id'], 'foo')
-
-    @mock.patch('requests.post')
-    @mock.patch('requests.get')
-    def test_get_log_with_no_default_log(self,
-                                         MockGet,
-                                         MockPost):
-        class FakeGet:
-            @staticmethod
-            def json():
-                return []
-
-        class FakePost:
-            @staticmethod
-            def json():
-                return {
-                    'id': 'foo2'
-                }
-
-        MockGet.return_value = FakeGet
-        MockPost.return_value = FakePost
-
-        self.login()
-        req = self.app.get(self.url)
-        self.ok(req)
-        data = self.json(req)
-        self.assertEqual(len(data), 0)  # from FakeGet
-
     @mock.patch('main.generic_logging._get_log')
     def test_get_with_connection_error(self, MockGet):
         def side_effect():
@@ -774,7 +775,15 @@ class LoggingTests(BaseMainTestCase):
         data = self.json(req)
         self.assertEqual(data, [])
 
-    @mock.patch('main.generic_logging._get_log')
+    @mock.patch('qbank.client.get')
+    def test_get_with_timeout(self, mock_get):
+        mock_get.side_effect = ReadTimeout()
+        self.login()
+        req = self.app.get(self.url)
+        self.ok(req)
+        self.assertEqual(self.json(req), [])
+
+    @mock.patch('log_pipeline.default_log')
     def test_post_with_connection_error(self, MockGet):
         def side_effect():
             raise ConnectionError()
@@ -783,9 +792,45 @@ class LoggingTests(BaseMainTestCase):
         self.login()
         req = self.app.post(self.url,
                             params={})
-        self.ok(req)
-        data = self.json(req)
-        self.assertIn('msg', data)
+        self.code(req, 202)
+        log_pipeline.flush()
+        # kept on disk until QBank is back
+        stats = self.json(self.app.get('/api/v1/logging/stats'))
+        self.assertEqual(stats['depth'], 1)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(stats['spool_segments'], 1)
+
+        MockGet.side_effect = None
+        MockGet.return_value = {'id': 'log'}
+        with mock.patch('qbank.client.post') as MockPost:
+            MockPost.return_value.status_code = 201
+            log_pipeline.flush()
+        stats = self.json(self.app.get('/api/v1/logging/stats'))
+        self.assertEqual(stats['sent'], 1)
+        self.assertEqual(stats['depth'], 0)
+
+    @mock.patch('qbank.client.get', side_effect=mocked_logging_get)
+    @mock.patch('qbank.client.post', side_effect=mocked_logging_post)
+    def test_post_does_not_wait_for_qbank(self, mock_post, mock_get):
+        self.login()
+        for _ in range(3):
+            req = self.app.post(self.url,
+                                params=json.dumps({'action': 'click'}),
+                                headers={'content-type': 'application/json'})
+            self.code(req, 202)
+        self.assertFalse(mock_get.called)
+        self.assertFalse(mock_post.called)
+        stats = self.json(self.app.get('/api/v1/logging/stats'))
+        self.assertEqual(stats['depth'], 3)
+        self.assertEqual(stats['accepted'], 3)
+
+        log_pipeline.flush()
+        # one default log lookup for the whole batch
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_post.call_count, 3)
+        stats = self.json(self.app.get('/api/v1/logging/stats'))
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['sent'], 3)
 
 
 class ContentStreamingTests(BaseMainTestCase):
@@ -799,8 +844,8 @@ class ContentStreamingTests(BaseMainTestCase):
         MockJoin.return_value = '{0}/fake-styles.css'.format(
             self.url_path)
         req = self.app.get('/content/fake-styles.css',
-                           status=206)
-        self.code(req, 206)
+                           status=200)
+        self.code(req, 200)
         text = req.body
         self.assertIn('body', text)
 
@@ -817,8 +862,130 @@ class ContentStreamingTests(BaseMainTestCase):
         MockJoin.return_value = '{0}/fake-styles.css'.format(
             self.url_path)
         req = self.app.get('/content/fake-styles.css',
-                           headers={'byte-range': 'bytes=0-'},
+                           headers={'Range': 'bytes=0-'},
                            status=206)
         self.code(req, 206)
         text = req.body
         self.assertIn('body', text)
+
+    @mock.patch('os.path.join')
+    def test_open_ended_range_streams_rest_of_file(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css',
+                           headers={'Range': 'bytes=5-'},
+                           status=206)
+        with open(MockJoin.return_value, 'rb') as css:
+            expected = css.read()[5:]
+        self.assertEqual(req.body, expected)
+        self.assertEqual(req.headers['Content-Length'], str(len(expected)))
+
+    @mock.patch('os.path.join')
+    def test_content_type_is_sent_once(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css',
+                           status=200)
+        content_types = [value for (key, value) in req.headerlist
+                         if key.lower() == 'content-type']
+        self.assertEqual(content_types, ['text/css; charset=utf-8'])
+
+    @mock.patch('os.path.join')
+    def test_suffix_range_streams_end_of_file(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        with open(MockJoin.return_value, 'rb') as css:
+            expected = css.read()
+        req = self.app.get('/content/fake-styles.css',
+                           headers={'Range': 'bytes=-4'},
+                           status=206)
+        self.assertEqual(req.body, expected[-4:])
+        self.assertEqual(req.headers['Content-Range'],
+                         'bytes {0}-{1}/{2}'.format(len(expected) - 4,
+                                                    len(expected) - 1,
+                                                    len(expected)))
+
+    @mock.patch('os.path.join')
+    def test_multiple_ranges_return_multipart_body(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        with open(MockJoin.return_value, 'rb') as css:
+            expected = css.read()
+        req = self.app.get('/content/fake-styles.css',
+                           headers={'Range': 'bytes=0-1,6-8'},
+                           status=206)
+        self.assertTrue(req.headers['Content-Type'].startswith(
+            'multipart/byteranges; boundary='))
+        self.assertEqual(req.headers['Content-Length'], str(len(req.body)))
+        self.assertIn('\r\n\r\n{0}\r\n'.format(expected[0:2]), req.body)
+        self.assertIn('\r\n\r\n{0}\r\n'.format(expected[6:9]), req.body)
+        self.assertIn('Content-Range: bytes 6-8/{0}'.format(len(expected)),
+                      req.body)
+
+    @mock.patch('os.path.join')
+    def test_unsatisfiable_range_returns_416(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css',
+                           headers={'Range': 'bytes=100000-'},
+                           status=416)
+        self.code(req, 416)
+
+    @mock.patch('os.path.join')
+    def test_content_sends_validators(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css')
+        self.assertIn('ETag', req.headers)
+        self.assertIn('Last-Modified', req.headers)
+        self.assertEqual(req.headers['Cache-Control'], 'no-cache')
+
+    @mock.patch('os.path.join')
+    def test_matching_etag_returns_304(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css')
+        req = self.app.get('/content/fake-styles.css',
+                           headers={'If-None-Match': req.headers['ETag']},
+                           status=304)
+        self.code(req, 304)
+        self.assertEqual(req.body, '')
+
+    @mock.patch('os.path.join')
+    def test_unchanged_since_returns_304(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css')
+        req = self.app.get(
+            '/content/fake-styles.css',
+            headers={'If-Modified-Since': req.headers['Last-Modified']},
+            status=304)
+        self.code(req, 304)
+
+    @mock.patch('os.path.join')
+    def test_stale_etag_returns_content(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css',
+                           headers={'If-None-Match': '"stale"'})
+        self.ok(req)
+        self.assertIn('body', req.body)
+
+    @mock.patch('os.path.join')
+    def test_stale_if_range_returns_whole_file(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css',
+                           headers={'Range': 'bytes=2-',
+                                    'If-Range': '"stale"'})
+        self.ok(req)
+        self.assertIn('body', req.body)
+
+    @mock.patch('settings.CACHE_CONTROL_POLICIES',
+                (('', 'public, max-age=60'), ('fake', 'max-age=5')))
+    @mock.patch('os.path.join')
+    def test_cache_control_uses_longest_prefix(self, MockJoin):
+        MockJoin.return_value = '{0}/fake-styles.css'.format(
+            self.url_path)
+        req = self.app.get('/content/fake-styles.css')
+        self.assertEqual(req.headers['Cache-Control'], 'max-age=5')
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from mock import patch
+
+from module_tree import ModuleTreeIndex, iter_json_listing, walk_modules
+
+EXPECTED = [
+    'modules/English',
+    'modules/English/G2',
+    'modules/English/G9',
+    'modules/English/G9/U1',
+    'modules/English/G9/U1/L1',
+    'modules/English/G10',
+    'modules/Tools',
+    'modules/Tools/Open Story',
+    'modules/Tools/Open Story/css'
+]
+
+
+class TestModuleTreeIndex(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for directory in ['modules/English/G9/U1/L1/deep',
+                          'modules/English/G10',
+                          'modules/English/G2',
+                          'modules/Tools/Open Story/css',
+                          'modules/.hidden/foo']:
+            os.makedirs(os.path.join(self.root, directory))
+        with open(os.path.join(self.root, 'modules/Tools/file.txt'), 'w') as text:
+            text.write('not a directory')
+        self.index = ModuleTreeIndex(self.root, 'modules', max_level=4,
+                                     refresh_interval=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def listing(self):
+        return json.loads(self.index.get()[0])
+
+    def touch_parent(self, directory):
+        # make sure the parent's mtime moves, even on coarse filesystems
+        parent = os.path.dirname(os.path.join(self.root, directory))
+        stat = os.stat(parent)
+        os.utime(parent, (stat.st_atime, stat.st_mtime + 10))
+
+    def test_matches_walker(self):
+        assert self.listing() == EXPECTED
+        assert self.listing() == walk_modules(self.root, 'modules', 4)
+
+    def test_respects_max_level(self):
+        index = ModuleTreeIndex(self.root, 'modules', max_level=2)
+        assert json.loads(index.get()[0]) == [
+            'modules/English',
+            'modules/English/G2',
+            'modules/English/G9',
+            'modules/English/G10',
+            'modules/Tools',
+            'modules/Tools/Open Story'
+        ]
+
+    def test_picks_up_new_directories(self):
+        etag = self.index.get()[1]
+        os.makedirs(os.path.join(self.root, 'modules/English/G9/U2'))
+        self.touch_parent('modules/English/G9/U2')
+        assert 'modules/English/G9/U2' in self.listing()
+        assert self.index.get()[1] != etag
+
+    def test_forgets_removed_directories(self):
+        shutil.rmtree(os.path.join(self.root, 'modules/English/G9'))
+        self.touch_parent('modules/English/G9')
+        listing = self.listing()
+        assert 'modules/English/G9' not in listing
+        assert 'modules/English/G9/U1' not in listing
+
+    def test_unchanged_tree_is_not_relisted(self):
+        self.index.get()
+        etag = self.index.get()[1]
+        os.makedirs(os.path.join(self.root, 'modules/English/G11'))
+        self.touch_parent('modules/English/G11')
+        self.index.refresh_interval = 3600
+        assert self.index.get()[1] == etag
+        assert 'modules/English/G11' not in self.listing()
+
+    def test_missing_root_lists_nothing_until_created(self):
+        shutil.rmtree(os.path.join(self.root, 'modules'))
+        assert self.listing() == []
+        os.makedirs(os.path.join(self.root, 'modules/Maths'))
+        assert self.listing() == ['modules/Maths']
+
+
+class TestWalkModules(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for directory in ['modules/English/G9/U1/L1/deep',
+                          'modules/English/G10',
+                          'modules/English/G2',
+                          'modules/Tools/Open Story/css',
+                          'modules/.hidden/foo']:
+            os.makedirs(os.path.join(self.root, directory))
+        with open(os.path.join(self.root, 'modules/Tools/file.txt'), 'w') as text:
+            text.write('not a directory')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_lists_visible_directories_in_natural_order(self):
+        assert walk_modules(self.root, 'modules', 4) == EXPECTED
+
+    def test_respects_max_level(self):
+        assert walk_modules(self.root, 'modules', 1) == ['modules/English',
+                                                         'modules/Tools']
+        assert walk_modules(self.root, 'modules', 0) == []
+
+    def test_missing_directory_lists_nothing(self):
+        assert walk_modules(self.root, 'missing', 4) == []
+
+    def test_works_without_scandir(self):
+        with patch('module_tree.scandir', None):
+            assert walk_modules(self.root, 'modules', 4) == EXPECTED
+
+    def test_json_listing_is_valid_json(self):
+        assert json.loads(''.join(iter_json_listing(self.root, 'modules', 4))) == EXPECTED
+        assert json.loads(''.join(iter_json_listing(self.root, 'missing', 4))) == []
@@ -0,0 +1,293 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from datetime import datetime
+from unittest import TestCase
+
+import pytest
+
+from mock import patch
+from requests.exceptions import ConnectionError
+
+import qbank
+import settings
+
+from project_store import ProjectStore, SyncWorker, apply_edits
+from star_logo_nova import ProjectLocked
+
+
+def make_taken(taken_id='foo%3A1%40ODL', genus_type_id='read-write'):
+    return {
+        'id': taken_id,
+        'takingAgentId': 'agent',
+        'genusTypeId': genus_type_id,
+        'displayName': {'text': 'project'},
+        'description': {'text': 'a cool simulation'},
+        'actualStartTime': {'year': 2000, 'month': 1, 'day': 1},
+        'sections': [{
+            'questions': [{
+                'responded': False
+            }]
+        }]
+    }
+
+
+class FakeReq:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+# pylint: disable=too-many-public-methods
+class TestProjectStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ProjectStore(os.path.join(self.directory, 'projects.sqlite3'))
+        self.store.remember('bank', 'foo:1@ODL', make_taken())
+        # QBank's copy, for load()
+        patcher = patch('star_logo_nova.sln_shared.get_assessment_taken',
+                        return_value=make_taken())
+        self.qbank_taken = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.store.reset()
+        shutil.rmtree(self.directory)
+
+    def test_apply_edits_updates_title_and_response(self):
+        taken = apply_edits(make_taken(),
+                            {'title': 'new', 'project_str': 'abc'},
+                            datetime(2018, 6, 1, 12, 30))
+        assert taken['displayName']['text'] == 'new'
+        question = taken['sections'][0]['questions'][0]
+        assert question['responded']
+        assert question['response']['text']['text'] == 'abc'
+        assert question['response']['submissionTime']['year'] == 2018
+
+    def test_ids_are_stored_escaped(self):
+        assert self.store.get('foo:1@ODL')['id'] == 'foo%3A1%40ODL'
+        assert self.store.get('foo%3A1%40ODL')['id'] == 'foo%3A1%40ODL'
+
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_save_is_local_until_synced(self, MockUpdate):
+        taken = self.store.save('bank', 'foo:1@ODL', {'project_str': 'abc'})
+        assert taken['sections'][0]['questions'][0]['response']['text']['text'] == 'abc'
+        assert self.store.get('foo:1@ODL') == taken
+        assert not MockUpdate.called
+        assert self.store.pending() == ['foo%3A1%40ODL']
+
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_saves_are_coalesced(self, MockUpdate):
+        for index in range(10):
+            self.store.save('bank', 'foo:1@ODL', {'project_str': str(index)})
+        self.store.save('bank', 'foo:1@ODL', {'title': 'new',
+                                              'project_str': 'last'})
+        self.store.flush()
+        MockUpdate.assert_called_once_with('bank', 'foo%3A1%40ODL', {
+            'title': 'new',
+            'project_str': 'last'
+        })
+        assert self.store.pending() == []
+
+    @patch('project_store.time.time')
+    def test_due_waits_for_quiet_period_or_max_delay(self, MockTime):
+        MockTime.return_value = 1000.0
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        assert self.store.due(1000.0 + settings.SLN_SYNC_DELAY - 1) == []
+        assert self.store.due(1000.0 + settings.SLN_SYNC_DELAY) == ['foo%3A1%40ODL']
+        # keep saving: still pushed once the max delay is reached
+        MockTime.return_value = 1000.0 + settings.SLN_SYNC_MAX_DELAY - 1
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'b'})
+        assert self.store.due(1000.0 + settings.SLN_SYNC_MAX_DELAY) == ['foo%3A1%40ODL']
+
+    def test_save_during_sync_stays_pending(self):
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+
+        def side_effect(*_args):
+            self.store.save('bank', 'foo:1@ODL', {'project_str': 'b'})
+
+        with patch('star_logo_nova.sln_shared.update_assessment_taken') as MockUpdate:
+            MockUpdate.side_effect = side_effect
+            self.store.flush()
+        assert self.store.pending() == ['foo%3A1%40ODL']
+
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_failed_sync_is_retried(self, MockUpdate):
+        MockUpdate.side_effect = IOError('QBank is down')
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        assert not self.store.sync('foo%3A1%40ODL')
+        assert self.store.pending() == ['foo%3A1%40ODL']
+        MockUpdate.side_effect = None
+        assert self.store.sync('foo%3A1%40ODL')
+        assert self.store.pending() == []
+
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_refused_submit_stays_pending(self, MockUpdate):
+        MockUpdate.side_effect = qbank.QBankError(FakeReq(500))
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        assert not self.store.sync('foo%3A1%40ODL')
+        assert self.store.pending() == ['foo%3A1%40ODL']
+
+    @patch('project_store.time.time')
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_failed_sync_backs_off(self, MockUpdate, MockTime):
+        MockUpdate.side_effect = IOError('QBank is down')
+        MockTime.return_value = 1000.0
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        later = 1000.0 + settings.SLN_SYNC_MAX_DELAY
+        MockTime.return_value = later
+        self.store.sync('foo%3A1%40ODL')
+        assert self.store.due(later + settings.SLN_SYNC_RETRY_DELAY - 1) == []
+        assert self.store.due(later + settings.SLN_SYNC_RETRY_DELAY) == ['foo%3A1%40ODL']
+        self.store.sync('foo%3A1%40ODL')
+        # twice as long after the second failure
+        assert self.store.due(later + 2 * settings.SLN_SYNC_RETRY_DELAY - 1) == []
+        assert self.store.due(later + 2 * settings.SLN_SYNC_RETRY_DELAY) == ['foo%3A1%40ODL']
+
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_edit_refused_too_often_is_parked(self, MockUpdate):
+        MockUpdate.side_effect = qbank.QBankError(FakeReq(400))
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        for _ in range(settings.SLN_SYNC_MAX_ATTEMPTS):
+            self.store.sync('foo%3A1%40ODL')
+        assert self.store.pending() == []
+        assert self.store.due(float('inf')) == []
+        parked = self.store.parked()['foo%3A1%40ODL']
+        assert parked['reason'] == 'refused by QBank'
+        assert parked['edit'] == {'project_str': 'a'}
+        assert parked['attempts'] == settings.SLN_SYNC_MAX_ATTEMPTS
+        # a new edit (to QBank's copy, fetched again) is pushed again
+        self.store.remember('bank', 'foo:1@ODL', make_taken())
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'b'})
+        assert self.store.pending() == ['foo%3A1%40ODL']
+
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_project_locked_in_qbank_is_parked(self, MockUpdate):
+        MockUpdate.side_effect = ProjectLocked('Cannot edit this project')
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        assert self.store.sync('foo%3A1%40ODL')
+        assert self.store.pending() == []
+        assert self.store.parked()['foo%3A1%40ODL']['edit'] == {'project_str': 'a'}
+        assert self.store.unsynced() == {}
+        # QBank's copy is fetched again on next use
+        assert self.store.fresh('foo:1@ODL') is None
+
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_lock_set_in_qbank_is_found_by_the_sync(self, MockUpdate):
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        # saves do not ask QBank
+        assert self.qbank_taken.call_count == 0
+        MockUpdate.side_effect = ProjectLocked('Cannot edit this project')
+        self.store.sync('foo%3A1%40ODL')
+        with pytest.raises(ProjectLocked):
+            self.store.save('bank', 'foo:1@ODL', {'project_str': 'b'})
+        # until QBank's copy, fetched again, says otherwise
+        self.store.remember('bank', 'foo:1@ODL', make_taken())
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'c'})
+        assert self.store.pending() == ['foo%3A1%40ODL']
+
+    @patch('qbank.client.get', side_effect=ConnectionError())
+    @patch('project_store.time.time')
+    def test_saves_are_local_while_qbank_is_down(self, MockTime, _):
+        self.qbank_taken.side_effect = ConnectionError()
+        MockTime.return_value = 1000.0
+        self.store.remember('bank', 'foo:1@ODL', make_taken())
+        # the synced local copy is stale by now
+        MockTime.return_value = 1000.0 + 2 * settings.SLN_PROJECT_MAX_AGE
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        assert self.store.pending() == ['foo%3A1%40ODL']
+        self.store.flush()
+        assert self.store.pending() == ['foo%3A1%40ODL']
+        # and is served while QBank cannot be asked for a newer one
+        self.store.remember('bank', 'foo:2@ODL', make_taken('foo%3A2%40ODL'))
+        MockTime.return_value = 1000.0 + 4 * settings.SLN_PROJECT_MAX_AGE
+        assert self.store.load('bank', 'foo:2@ODL')['id'] == 'foo%3A2%40ODL'
+
+    @patch('project_store.time.time')
+    def test_local_copy_is_refetched_when_stale(self, MockTime):
+        MockTime.return_value = 1000.0
+        self.store.remember('bank', 'foo:1@ODL', make_taken())
+        MockTime.return_value = 1000.0 + settings.SLN_PROJECT_MAX_AGE
+        assert self.store.fresh('foo:1@ODL') is not None
+        MockTime.return_value = 1000.0 + settings.SLN_PROJECT_MAX_AGE + 1
+        assert self.store.fresh('foo:1@ODL') is None
+        # but not while it has edits QBank does not have yet
+        self.store.remember('bank', 'foo:1@ODL', make_taken())
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        MockTime.return_value = 1000.0 + 10 * settings.SLN_PROJECT_MAX_AGE
+        assert self.store.fresh('foo:1@ODL') is not None
+
+    def test_fresh_copies_are_found_in_one_query(self):
+        self.store.remember('bank', 'foo:2@ODL', make_taken('foo%3A2%40ODL'))
+        found = self.store.fresh_many(['foo%3A1%40ODL', 'foo%3A2%40ODL', 'foo%3A3%40ODL'])
+        assert sorted(found) == ['foo%3A1%40ODL', 'foo%3A2%40ODL']
+        assert self.store.fresh_many([]) == {}
+
+    def test_connection_is_reused_by_its_thread(self):
+        connection = self.store.connect()
+        assert self.store.connect() is connection
+        other = []
+        worker = threading.Thread(target=lambda: other.append(self.store.connect()))
+        worker.start()
+        worker.join()
+        assert other[0] is not connection
+        self.store.reset()
+        assert self.store.connect() is not connection
+
+    def test_cannot_save_locked_project(self):
+        self.store.remember('bank', 'foo:2@ODL', make_taken(
+            'foo%3A2%40ODL', settings.READ_ONLY_TAKEN_GENUS_TYPE))
+        with pytest.raises(AttributeError):
+            self.store.save('bank', 'foo:2@ODL', {'project_str': 'a'})
+
+    def test_project_str_is_required(self):
+        with pytest.raises(KeyError):
+            self.store.save('bank', 'foo:1@ODL', {'title': 'a'})
+
+    def test_remember_does_not_overwrite_unsynced_edits(self):
+        self.store.save('bank', 'foo:1@ODL', {'title': 'mine',
+                                              'project_str': 'a'})
+        self.store.remember('bank', 'foo:1@ODL', make_taken())
+        assert self.store.get('foo:1@ODL')['displayName']['text'] == 'mine'
+
+    def test_overlay_swaps_in_unsynced_projects(self):
+        self.store.save('bank', 'foo:1@ODL', {'title': 'mine',
+                                              'project_str': 'a'})
+        other = make_taken('foo%3A3%40ODL')
+        takens = self.store.overlay([make_taken(), other])
+        assert takens[0]['displayName']['text'] == 'mine'
+        assert takens[1] is other
+
+    @patch('qbank.client.get')
+    @patch('star_logo_nova.sln_shared.get_assessment_taken')
+    def test_load_fetches_from_qbank_once(self, MockTaken, MockGet):
+        taken = dict(make_taken('foo%3A4%40ODL'),
+                     takingAgentId='agent%3A4%40ODL',
+                     assignedBankIds=['bank'],
+                     assessmentOfferedId='offered')
+        MockTaken.return_value = dict(taken, sections=None)
+        MockGet.return_value.json.return_value = [taken]
+        assert self.store.load('bank', 'foo:4@ODL')['sections'] == taken['sections']
+        assert self.store.load('bank', 'foo:4@ODL')['id'] == 'foo%3A4%40ODL'
+        assert MockTaken.call_count == 1
+        # only this project's result is downloaded
+        MockGet.assert_called_once_with(
+            '{0}/bank/assessmentsoffered/offered/results?agentId=4'.format(
+                settings.QBANK_ASSESSMENT_ENDPOINT))
+
+    def test_edits_survive_restart(self):
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        restarted = ProjectStore(self.store.path)
+        assert restarted.pending() == ['foo%3A1%40ODL']
+        restarted.reset()
+
+    @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    def test_worker_flushes_on_stop(self, MockUpdate):
+        worker = SyncWorker(self.store, interval=60)
+        worker.start()
+        self.store.save('bank', 'foo:1@ODL', {'project_str': 'a'})
+        worker.stop()
+        assert not worker.is_alive()
+        assert MockUpdate.called
+        assert self.store.pending() == []
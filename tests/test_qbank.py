@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from mock import patch
+
+from qbank import QBankClient
+
+
+class TestQBankClient(TestCase):
+    def setUp(self):
+        self.client = QBankClient(pool_size=4, timeout=(1, 2), retries=3)
+
+    def test_endpoint_collapses_ids_and_query(self):
+        url = ('https://localhost:8080/api/v1/assessment/banks/'
+               'assessment.Bank%3A5a9f%40ODL.MIT.EDU/assessmentstaken/'
+               'assessment.AssessmentTaken%3A1%40ODL.MIT.EDU?agentId=1')
+        assert self.client.endpoint(url) == \
+            'https://localhost:8080/api/v1/assessment/banks/{id}/assessmentstaken/{id}'
+
+    def test_connection_pool_is_shared_and_sized(self):
+        adapter = self.client.session.get_adapter('https://localhost:8080/')
+        assert adapter is self.client.session.get_adapter('https://example.com/')
+        assert adapter._pool_maxsize == 4  # pylint: disable=protected-access
+        assert adapter.max_retries.total == 3
+        assert 'POST' not in adapter.max_retries.method_whitelist
+        assert self.client.session.verify is False
+
+    def test_applies_default_timeout(self):
+        with patch.object(self.client.session, 'request') as MockRequest:
+            self.client.get('https://localhost:8080/foo')
+            assert MockRequest.call_args[1]['timeout'] == (1, 2)
+            self.client.post('https://localhost:8080/foo', timeout=9, json={})
+            assert MockRequest.call_args[0] == ('POST', 'https://localhost:8080/foo')
+            assert MockRequest.call_args[1]['timeout'] == 9
+
+    def test_records_latency_even_on_errors(self):
+        with patch.object(self.client.session, 'request') as MockRequest:
+            self.client.get('https://localhost:8080/foo')
+            self.client.get('https://localhost:8080/foo?bar=1')
+            MockRequest.side_effect = IOError()
+            try:
+                self.client.put('https://localhost:8080/foo')
+            except IOError:
+                pass
+        stats = self.client.stats()
+        assert [(s['method'], s['calls']) for s in stats] == [('GET', 2), ('PUT', 1)]
+        assert stats[0]['endpoint'] == 'https://localhost:8080/foo'
+        assert stats[0]['max_ms'] >= stats[0]['mean_ms']
@@ -0,0 +1,154 @@
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from unittest import TestCase
+
+from mock import patch
+
+import settings
+
+from session_store import SessionStore
+
+SCHEMA = """create table sessions (
+    session_id char(128) UNIQUE NOT NULL,
+    atime timestamp NOT NULL default current_timestamp,
+    data text
+)"""
+
+
+class TestSessionStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sessions.sqlite3')
+        connection = sqlite3.connect(self.path)
+        connection.execute(SCHEMA)
+        connection.commit()
+        connection.close()
+        self.store = SessionStore(self.path)
+
+    def tearDown(self):
+        self.store.reset()
+        shutil.rmtree(self.directory)
+
+    def query(self, sql, *parameters):
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def atime(self, key):
+        return self.query('select atime from sessions where session_id = ?', key)[0][0]
+
+    def test_save_load_delete(self):
+        self.assertNotIn('a', self.store)
+        self.store['a'] = {'login': 1}
+        self.assertIn('a', self.store)
+        self.assertEqual(self.store['a'], {'login': 1})
+        del self.store['a']
+        self.assertNotIn('a', self.store)
+        with self.assertRaises(KeyError):
+            self.store['a']  # pylint: disable=pointless-statement
+
+    def test_reads_sessions_written_by_db_store(self):
+        # same encoding as web.session.DBStore, so existing sessions survive
+        self.query('insert into sessions (session_id, data) values (?, ?)',
+                   'a', self.store.encode({'login': 1}))
+        self.assertEqual(self.store['a'], {'login': 1})
+
+    def test_connections_are_tuned(self):
+        connection = self.store.connect()
+        self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        # NORMAL
+        self.assertEqual(connection.execute('PRAGMA synchronous').fetchone()[0], 1)
+        self.assertEqual(connection.execute('PRAGMA busy_timeout').fetchone()[0],
+                         settings.SESSION_BUSY_TIMEOUT * 1000)
+
+    def test_one_connection_per_thread(self):
+        connections = []
+
+        def connect():
+            connections.append(self.store.connect())
+            connections.append(self.store.connect())
+
+        threads = [threading.Thread(target=connect) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(connection) for connection in connections)), 3)
+        self.assertIs(connections[0], connections[1])
+
+    def test_unchanged_session_is_only_touched_in_batches(self):
+        self.store['a'] = {'login': 1}
+        saved = self.atime('a')
+        self.store['a'] = self.store['a']
+        self.assertEqual(self.atime('a'), saved)
+        self.store.flush_touches()
+        self.assertGreater(self.atime('a'), saved)
+
+    def test_changed_session_is_written_at_once(self):
+        self.store['a'] = {'login': 1}
+        self.store['a'] = dict(self.store['a'], login=2)
+        self.assertEqual(SessionStore(self.path)['a'], {'login': 2})
+
+    def test_touches_flush_when_batch_is_full(self):
+        for key in 'ab':
+            self.store[key] = {}
+        saved = self.atime('b')
+        with patch.object(settings, 'SESSION_TOUCH_BATCH', 2):
+            self.store['a'] = self.store['a']
+            self.store['b'] = self.store['b']
+        self.assertGreater(self.atime('b'), saved)
+        self.assertEqual(self.store.touches, {})
+
+    def test_cleanup_keeps_touched_sessions(self):
+        old = (datetime.datetime.now() - datetime.timedelta(hours=1)).isoformat()
+        for key in 'ab':
+            self.query('insert into sessions (session_id, atime, data) values (?, ?, ?)',
+                       key, old, self.store.encode({}))
+        self.store['a'] = self.store['a']
+        self.store.cleanup(20 * 60)
+        self.assertIn('a', self.store)
+        self.assertNotIn('b', self.store)
+
+    def test_hot_sessions_are_loaded_from_memory(self):
+        self.store['a'] = {'login': 1}
+        with patch.object(self.store, 'connect', side_effect=AssertionError):
+            self.assertIn('a', self.store)
+            self.assertEqual(self.store['a'], {'login': 1})
+            self.store['a'] = {'login': 1}
+
+    def test_loaded_sessions_are_copies(self):
+        self.store['a'] = {'survey': {}}
+        self.store['a']['survey']['q1'] = 'yes'
+        self.assertEqual(self.store['a'], {'survey': {}})
+
+    def test_least_recently_used_sessions_leave_memory(self):
+        store = SessionStore(self.path, max_entries=2)
+        try:
+            for key in 'abc':
+                store[key] = {}
+            self.assertEqual(list(store.hot), ['b', 'c'])
+            self.assertEqual(store['a'], {})
+            self.assertEqual(list(store.hot), ['c', 'a'])
+        finally:
+            store.reset()
+
+    def test_cleanup_expires_idle_sessions_in_memory(self):
+        self.store['a'] = {}
+        with patch('session_store.time.time', return_value=time.time() - 3600):
+            self.store['b'] = {}
+        self.query('update sessions set atime = ?', (
+            datetime.datetime.now() - datetime.timedelta(hours=1)).isoformat())
+        self.store['a'] = self.store['a']
+        self.store.cleanup(20 * 60)
+        self.assertIn('a', self.store)
+        self.assertNotIn('b', self.store)
+        self.assertEqual(list(self.store.hot), ['a'])
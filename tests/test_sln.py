@@ -3,9 +3,10 @@ import shutil
 
 import pytest
 
-from mock import patch
+from mock import patch, PropertyMock
 
-from star_logo_nova import SLNProject, SLNProjects, settings
+from star_logo_nova import SLNProject, SLNProjects, SLNResults, settings,\
+    iter_projects_json
 from .test_main import BaseMainTestCase, ABS_PATH
 
 
@@ -48,7 +49,7 @@ class StarLogoNovaTests(BaseMainTestCase):
 class TestSLNProject(BaseMainTestCase):
     """ Make sure our project wrapper works as expected """
     # pylint: disable=arguments-differ
-    @patch('requests.get')
+    @patch('qbank.client.get')
     def setUp(self, MockGet):
         class FakeGet:
             @staticmethod
@@ -98,7 +99,7 @@ class TestSLNProject(BaseMainTestCase):
                     'id': 'foo1'
                 }]
 
-        with patch('requests.get') as MockGet:
+        with patch('qbank.client.get') as MockGet:
             MockGet.return_value = FakeResults
             results = self.project.get_all_results()
             assert len(results) == 1
@@ -109,14 +110,20 @@ class TestSLNProject(BaseMainTestCase):
             @staticmethod
             def json():
                 return [{
-                    'id': 'foo2'
+                    'id': 'foo2',
+                    'takingAgentId': 'agent%3A1%40ODL',
+                    'sections': [{
+                        'id': 'section2'
+                    }]
                 }]
 
-        with patch('requests.get') as MockGet:
+        with patch('qbank.client.get') as MockGet:
             MockGet.return_value = FakeResults
             self.project.my_map['takingAgentId'] = 'agent%3A1%40ODL'
-            results = self.project.get_section()
-            assert results['id'] == 'foo2'
+            section = self.project.get_section()
+            assert section['id'] == 'section2'
+            assert self.project.section['id'] == 'section2'
+            assert MockGet.call_args[0][0].endswith('/results?agentId=1')
 
     def test_results_url_populates_correctly(self):
         url = self.project.results_url
@@ -804,3 +811,155 @@ class TestSLNProjects(BaseMainTestCase):
         assert first_project.section['id'] == 'foo1'
         assert second_project.section['id'] == 'foo2'
         assert third_project.section['id'] == 'foo3'
+
+    @patch('star_logo_nova.SLNProject.get_all_results')
+    def test_can_reuse_results_passed_in(self, MockResults):
+        takens = [{
+            'id': 'foo1',
+            'takingAgentId': '%3Auser%40',
+            'sections': [{
+                'id': 'foo1'
+            }]
+        }, {
+            'id': 'foo2',
+            'takingAgentId': '%3Auser2%40',
+            'sections': [{
+                'id': 'foo2'
+            }]
+        }]
+        projects = SLNProjects(takens, results=takens)
+        assert not MockResults.called
+        first_project = next(projects)
+        second_project = next(projects)
+        assert first_project.section['id'] == 'foo1'
+        assert second_project.section['id'] == 'foo2'
+        assert first_project.all_results is second_project.all_results
+
+
+class TestSLNResults(BaseMainTestCase):
+    """ The indexed ``/results`` list shared by projects """
+    def setUp(self):
+        super(TestSLNResults, self).setUp()
+        self.takens = [{
+            'id': 'foo1',
+            'takingAgentId': 'user1',
+            'sections': [{'id': 'first'}]
+        }, {
+            'id': 'foo2',
+            'takingAgentId': 'user2',
+            'provenanceId': 'foo1',
+            'sections': [{'id': 'second'}]
+        }, {
+            'id': 'foo3',
+            'takingAgentId': 'user1',
+            'provenanceId': 'foo1',
+            'sections': [{'id': 'third'}]
+        }]
+        self.results = SLNResults(self.takens)
+
+    def test_indexes_by_taking_agent_keeping_first_match(self):
+        assert self.results.by_agent['user1']['id'] == 'foo1'
+        assert self.results.by_agent['user2']['id'] == 'foo2'
+
+    def test_indexes_by_id(self):
+        assert self.results.by_id['foo3']['sections'][0]['id'] == 'third'
+
+    def test_indexes_remixes_by_provenance_in_order(self):
+        remixes = self.results.by_provenance['foo1']
+        assert [r['id'] for r in remixes] == ['foo2', 'foo3']
+        assert 'foo2' not in self.results.by_provenance
+
+    def test_behaves_like_a_list(self):
+        assert len(self.results) == 3
+        assert self.results[0]['id'] == 'foo1'
+        assert [r['id'] for r in self.results] == ['foo1', 'foo2', 'foo3']
+
+    def test_of_does_not_reindex(self):
+        assert SLNResults.of(self.results) is self.results
+        assert isinstance(SLNResults.of(self.takens), SLNResults)
+
+    def lineage_results(self):
+        # foo1 -> foo2 -> foo4 -> foo5, and foo1 -> foo3
+        return SLNResults(self.takens + [{
+            'id': 'foo4',
+            'takingAgentId': 'user4',
+            'provenanceId': 'foo2'
+        }, {
+            'id': 'foo5',
+            'takingAgentId': 'user5',
+            'provenanceId': 'foo4'
+        }])
+
+    def test_ancestors_nearest_first(self):
+        results = self.lineage_results()
+        assert [t['id'] for t in results.ancestors('foo5', 10)] == ['foo4', 'foo2', 'foo1']
+        assert [t['id'] for t in results.ancestors('foo5', 2)] == ['foo4', 'foo2']
+        assert results.ancestors('foo1', 10) == []
+
+    def test_descendants_tree(self):
+        def ids(tree):
+            return [(taken['id'], ids(children)) for taken, children in tree]
+
+        results = self.lineage_results()
+        assert ids(results.descendants('foo1', 10)) == [
+            ('foo2', [('foo4', [('foo5', [])])]),
+            ('foo3', [])
+        ]
+        assert ids(results.descendants('foo1', 2)) == [
+            ('foo2', [('foo4', [])]),
+            ('foo3', [])
+        ]
+
+    def test_lineage_survives_cycles(self):
+        results = SLNResults([
+            {'id': 'a', 'takingAgentId': 'a', 'provenanceId': 'b'},
+            {'id': 'b', 'takingAgentId': 'b', 'provenanceId': 'a'}
+        ])
+        assert [t['id'] for t in results.ancestors('a', 10)] == ['b']
+        assert len(results.descendants('a', 10)) == 1
+
+
+class TestSLNProjectsPaging(BaseMainTestCase):
+    """ Sorting once and paging through the gallery """
+    def setUp(self):
+        super(TestSLNProjectsPaging, self).setUp()
+        self.takens = [{
+            'id': 'taken{0}'.format(index),
+            'takingAgentId': 'user{0}'.format(index),
+            'sections': [{'id': index}]
+        } for index in range(4)]
+        self.projects = SLNProjects(self.takens, results=self.takens)
+
+    @patch('star_logo_nova.SLNProject.saved_at', new_callable=PropertyMock)
+    def test_sort_key_computed_once_per_project(self, MockSavedAt):
+        MockSavedAt.side_effect = ['b', 'd', 'a', 'c']
+        keyed = self.projects.sorted_by(['saved_at'])
+        assert MockSavedAt.call_count == 4
+        assert [project.id for _, project in keyed] == [
+            'taken1', 'taken3', 'taken0', 'taken2']
+
+    @patch('star_logo_nova.SLNProject.saved_at', new_callable=PropertyMock)
+    def test_ties_are_broken_by_id(self, MockSavedAt):
+        MockSavedAt.return_value = 'same'
+        keyed = self.projects.sorted_by(['saved_at'])
+        assert [project.id for _, project in keyed] == [
+            'taken3', 'taken2', 'taken1', 'taken0']
+
+    @patch('star_logo_nova.SLNProject.saved_at', new_callable=PropertyMock)
+    def test_page_returns_cursor_until_last_page(self, MockSavedAt):
+        MockSavedAt.return_value = 'same'
+        projects, cursor = self.projects.page(['saved_at'], limit=3)
+        assert [p.id for p in projects] == ['taken3', 'taken2', 'taken1']
+        projects, cursor = self.projects.page(['saved_at'], limit=3,
+                                              cursor=cursor)
+        assert [p.id for p in projects] == ['taken0']
+        assert cursor is None
+
+    def test_rejects_foreign_cursors(self):
+        for cursor in ['bad', u'caf\xe9', 'eyJhIjogMX0=']:
+            with pytest.raises(ValueError):
+                SLNProjects.decode_cursor(cursor)
+
+    def test_streams_json_list(self):
+        chunks = list(iter_projects_json([]))
+        assert ''.join(chunks) == '[]'
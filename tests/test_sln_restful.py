@@ -3,6 +3,8 @@ import json
 from mock import patch, PropertyMock
 
 import settings
+
+from project_store import store as project_store
 from .test_main import BaseMainTestCase
 
 
@@ -11,9 +13,9 @@ class SLNRestfulTests(BaseMainTestCase):
 
     # pylint: disable=too-many-arguments
     @patch('star_logo_nova.SLNProject.get_all_results')
-    @patch('star_logo_nova.SLNProjects.serialize',
-           autospec=True)
-    @patch('requests.get')
+    @patch('star_logo_nova.SLNProject.serialize',
+           new_callable=PropertyMock)
+    @patch('qbank.client.get')
     @patch('star_logo_nova.sln_shared.get_or_create_assessment_offered')
     @patch('star_logo_nova.sln_shared.get_or_create_bank')
     def test_can_get_projects(self,
@@ -27,16 +29,20 @@ class SLNRestfulTests(BaseMainTestCase):
             def json():
                 return [{
                     'id': 'taken1',
-                    'takingAgentId': '%3Auserfoo%40'
+                    'takingAgentId': '%3Auserfoo%40',
+                    'actualStartTime': {
+                        'year': 2000,
+                        'month': 1,
+                        'day': 1
+                    },
+                    'sections': [{
+                        'id': 'foofoo',
+                        'questions': [{
+                            'responded': False
+                        }]
+                    }]
                 }]
 
-        def side_effect(projects_self, order_by=None):
-            assert len(projects_self) == 1
-            assert order_by is not None
-            return [{
-                'id': 'taken1'
-            }]
-
         MockBank.return_value = {
             'id': 'bank'
         }
@@ -44,25 +50,23 @@ class SLNRestfulTests(BaseMainTestCase):
             'id': 'offered'
         }
         MockGet.return_value = FakeTakens
-        MockSerialize.side_effect = side_effect
-        MockResults.return_value = [{
-            'takingAgentId': '%3Auserfoo%40',
-            'sections': [{
-                'id': 'foofoo'
-            }]
-        }]
+        MockSerialize.return_value = {
+            'id': 'taken1'
+        }
 
         url = '/api/projects'
         req = self.app.get(url)
         data = self.json(req)
         assert len(data) == 1
         assert data[0]['id'] == 'taken1'
+        assert 'X-Next-Cursor' not in req.headers
         assert MockBank.called
         assert MockOffered.called
         assert MockGet.called
         assert MockSerialize.called
+        assert not MockResults.called
 
-    @patch('star_logo_nova.SLNProject.get_all_results')
+    @patch('qbank.client.get')
     @patch('star_logo_nova.SLNProject.serialize',
            new_callable=PropertyMock)
     @patch('star_logo_nova.sln_shared.get_assessment_taken')
@@ -71,16 +75,18 @@ class SLNRestfulTests(BaseMainTestCase):
                                       MockBank,
                                       MockTaken,
                                       MockSerialize,
-                                      MockResults):
+                                      MockGet):
         MockBank.return_value = {
             'id': 'bank'
         }
         MockTaken.return_value = {
             'id': 'taken',
-            'takingAgentId': 'foo'
+            'takingAgentId': 'agent%3Afoo%40ODL',
+            'assignedBankIds': ['bank'],
+            'assessmentOfferedId': 'offered'
         }
-        MockResults.return_value = [{
-            'takingAgentId': 'foo',
+        MockGet.return_value.json.return_value = [{
+            'takingAgentId': 'agent%3Afoo%40ODL',
             'sections': [{
                 'id': 'footwo'
             }]
@@ -95,28 +101,43 @@ class SLNRestfulTests(BaseMainTestCase):
         assert MockBank.called
         assert MockTaken.called
         assert MockSerialize.called
+        # only this project's result, not the whole /results list
+        assert MockGet.call_count == 1
+        assert MockGet.call_args[0][0].endswith('/results?agentId=foo')
 
-    @patch('star_logo_nova.SLNProject.get_all_results')
+    # pylint: disable=too-many-arguments
+    @patch('qbank.client.get')
     @patch('star_logo_nova.SLNProject.serialize',
            new_callable=PropertyMock)
     @patch('star_logo_nova.sln_shared.update_assessment_taken')
+    @patch('star_logo_nova.sln_shared.get_assessment_taken')
     @patch('star_logo_nova.sln_shared.get_or_create_bank')
     def test_can_update_project(self,
                                 MockBank,
+                                MockGetTaken,
                                 MockTaken,
                                 MockSerialize,
-                                MockResults):
+                                MockGet):
         MockBank.return_value = {
             'id': 'bank'
         }
+        MockGetTaken.return_value = {
+            'id': 'foo%3A2%40ODL',
+            'takingAgentId': 'agent%3Abar%40ODL',
+            'assignedBankIds': ['bank'],
+            'assessmentOfferedId': 'offered'
+        }
         MockTaken.return_value = {
             'id': 'taken4',
             'takingAgentId': 'bar'
         }
-        MockResults.return_value = [{
-            'takingAgentId': 'bar',
+        MockGet.return_value.json.return_value = [{
+            'takingAgentId': 'agent%3Abar%40ODL',
             'sections': [{
-                'id': 'bim'
+                'id': 'bim',
+                'questions': [{
+                    'responded': False
+                }]
             }]
         }]
         MockSerialize.return_value = {
@@ -136,8 +157,11 @@ class SLNRestfulTests(BaseMainTestCase):
         data = self.json(req)
         assert data['id'] == 'taken6'
         assert MockBank.called
-        assert MockTaken.called
         assert MockSerialize.called
+        # QBank is only updated in the background
+        assert not MockTaken.called
+        project_store.flush()
+        MockTaken.assert_called_once_with('bank', 'foo%3A2%40ODL', payload)
 
     # pylint: disable=too-many-arguments
     @patch('star_logo_nova.SLNProject.get_all_results')
@@ -454,3 +478,192 @@ class SLNRestfulTests(BaseMainTestCase):
             expect_errors=True)
         self.code(req, 500)
         assert MockBank.called
+
+
+class SLNGalleryTests(BaseMainTestCase):
+    """ Paging and metadata-only listing on /api/projects """
+    def setUp(self):
+        super(SLNGalleryTests, self).setUp()
+        takens = []
+        for index in range(5):
+            takens.append({
+                'id': 'taken{0}'.format(index),
+                'takingAgentId': '%3Auser{0}%40'.format(index),
+                'displayName': {'text': 'project {0}'.format(index)},
+                'description': {'text': 'a cool simulation'},
+                'actualStartTime': {'year': 2000, 'month': 1, 'day': 1},
+                'sections': [{
+                    'questions': [{
+                        'responded': True,
+                        'response': {
+                            'text': {'text': 'x' * 1000},
+                            'submissionTime': {'year': 2000 + index,
+                                               'month': 1,
+                                               'day': 1}
+                        }
+                    }]
+                }]
+            })
+
+        class FakeTakens:
+            @staticmethod
+            def json():
+                return takens
+
+        patches = [
+            patch('star_logo_nova.sln_shared.get_or_create_bank',
+                  return_value={'id': 'bank'}),
+            patch('star_logo_nova.sln_shared.get_or_create_assessment_offered',
+                  return_value={'id': 'offered'}),
+            patch('qbank.client.get', return_value=FakeTakens)
+        ]
+        self.mocks = [patcher.start() for patcher in patches]
+        for patcher in patches:
+            self.addCleanup(patcher.stop)
+
+    def ids(self, req):
+        return [project['id'] for project in self.json(req)]
+
+    def test_lists_newest_first(self):
+        req = self.app.get('/api/projects')
+        assert self.ids(req) == ['taken4', 'taken3', 'taken2',
+                                 'taken1', 'taken0']
+        assert self.json(req)[0]['project_str'] == 'x' * 1000
+
+    def test_limit_and_offset(self):
+        req = self.app.get('/api/projects?limit=2&offset=1')
+        assert self.ids(req) == ['taken3', 'taken2']
+        assert req.headers['X-Next-Cursor']
+
+    def test_cursor_continues_where_last_page_ended(self):
+        seen = []
+        req = self.app.get('/api/projects?limit=2')
+        seen.extend(self.ids(req))
+        while 'X-Next-Cursor' in req.headers:
+            req = self.app.get('/api/projects?limit=2&cursor={0}'.format(
+                req.headers['X-Next-Cursor']))
+            seen.extend(self.ids(req))
+        assert seen == ['taken4', 'taken3', 'taken2', 'taken1', 'taken0']
+
+    def test_metadata_only_leaves_out_project_str(self):
+        req = self.app.get('/api/projects?metadata=true')
+        data = self.json(req)
+        assert len(data) == 5
+        assert 'project_str' not in data[0]
+        assert data[0]['saved_at'] == '2004-01-01T00:00:00.000000Z'
+
+    def test_bad_paging_parameters_are_rejected(self):
+        for query in ['limit=0', 'limit=foo', 'offset=-1', 'cursor=bad']:
+            req = self.app.get('/api/projects?{0}'.format(query),
+                               expect_errors=True)
+            self.code(req, 400)
+
+    def test_batch_returns_projects_in_requested_order(self):
+        req = self.app.get('/api/projects?ids=taken3,taken0,missing')
+        assert self.ids(req) == ['taken3', 'taken0']
+        assert self.json(req)[0]['saved_at'] == '2003-01-01T00:00:00.000000Z'
+
+    def test_batch_reuses_local_copies(self):
+        mock_get = self.mocks[2]
+        self.app.get('/api/projects?ids=taken1,taken2')
+        assert mock_get.call_count == 1
+        req = self.app.get('/api/projects?ids=taken2,taken1&metadata=true')
+        assert mock_get.call_count == 1
+        assert self.ids(req) == ['taken2', 'taken1']
+        assert 'project_str' not in self.json(req)[0]
+
+    def test_batch_size_is_limited(self):
+        ids = ','.join('taken{0}'.format(index)
+                       for index in range(settings.SLN_MAX_BATCH_IDS + 1))
+        req = self.app.get('/api/projects?ids={0}'.format(ids),
+                           expect_errors=True)
+        self.code(req, 400)
+        req = self.app.get('/api/projects?ids=', expect_errors=True)
+        self.code(req, 400)
+
+
+class SLNLineageTests(BaseMainTestCase):
+    """ /api/project/<id>/lineage """
+    def setUp(self):
+        super(SLNLineageTests, self).setUp()
+        # root -> child1 -> grandchild, root -> child2
+        provenance = {
+            'child1': 'root',
+            'child2': 'root',
+            'grandchild': 'child1'
+        }
+        takens = []
+        for taken_id in ['root', 'child1', 'child2', 'grandchild']:
+            taken = {
+                'id': 'taken%3A{0}%40ODL'.format(taken_id),
+                'takingAgentId': taken_id,
+                'displayName': {'text': taken_id},
+                'description': {'text': ''},
+                'actualStartTime': {'year': 2000, 'month': 1, 'day': 1},
+                'sections': [{
+                    'questions': [{
+                        'responded': True,
+                        'response': {
+                            'text': {'text': 'x' * 100},
+                            'submissionTime': {'year': 2001, 'month': 1, 'day': 1}
+                        }
+                    }]
+                }]
+            }
+            if taken_id in provenance:
+                taken['provenanceId'] = 'taken%3A{0}%40ODL'.format(
+                    provenance[taken_id])
+            takens.append(taken)
+
+        patches = [
+            patch('star_logo_nova.sln_shared.get_or_create_bank',
+                  return_value={'id': 'bank'}),
+            patch('star_logo_nova.sln_shared.get_or_create_assessment_offered',
+                  return_value={'id': 'offered'}),
+            patch('qbank.client.get')
+        ]
+        self.mocks = [patcher.start() for patcher in patches]
+        for patcher in patches:
+            self.addCleanup(patcher.stop)
+        self.mock_get = self.mocks[2]
+        self.mock_get.return_value.json.return_value = takens
+
+    @staticmethod
+    def titles(projects):
+        return [(project['title'], SLNLineageTests.titles(project['remixes']))
+                for project in projects]
+
+    def test_returns_ancestors_and_remix_tree(self):
+        req = self.app.get('/api/project/taken%3Achild1%40ODL/lineage')
+        data = self.json(req)
+        assert data['project']['title'] == 'child1'
+        assert 'project_str' not in data['project']
+        assert [p['title'] for p in data['ancestors']] == ['root']
+        assert self.titles(data['remixes']) == [('grandchild', [])]
+
+        data = self.json(self.app.get('/api/project/taken%3Aroot%40ODL/lineage'))
+        assert self.titles(data['remixes']) == [
+            ('child1', [('grandchild', [])]),
+            ('child2', [])
+        ]
+
+    def test_depth_limits_both_directions(self):
+        data = self.json(self.app.get('/api/project/taken%3Aroot%40ODL/lineage?depth=1'))
+        assert self.titles(data['remixes']) == [('child1', []), ('child2', [])]
+        data = self.json(self.app.get('/api/project/taken%3Agrandchild%40ODL/lineage?depth=1'))
+        assert [p['title'] for p in data['ancestors']] == ['child1']
+
+    def test_results_are_downloaded_once(self):
+        self.app.get('/api/project/taken%3Aroot%40ODL/lineage')
+        self.app.get('/api/project/taken%3Achild2%40ODL/lineage')
+        assert self.mock_get.call_count == 1
+
+    def test_unknown_project_and_bad_depth(self):
+        req = self.app.get('/api/project/taken%3Anope%40ODL/lineage',
+                           expect_errors=True)
+        self.code(req, 404)
+        for depth in ['0', 'x', str(settings.SLN_LINEAGE_MAX_DEPTH + 1)]:
+            req = self.app.get(
+                '/api/project/taken%3Aroot%40ODL/lineage?depth={0}'.format(depth),
+                expect_errors=True)
+            self.code(req, 400)
@@ -1,8 +1,18 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
 import pytest
 
 from mock import patch
 
-from star_logo_nova import sln_shared, settings
+import qbank
+
+from star_logo_nova import BootstrapError, LRUCache, SLNBootstrap, SLNProject, question_ids, sln_shared,\
+    settings
 from .test_main import BaseMainTestCase
 
 
@@ -23,7 +33,7 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo'
                 }]
 
-        with patch('requests.get') as MockGet:
+        with patch('qbank.client.get') as MockGet:
             MockGet.return_value = FakeReq
             bank = self.shared.get_or_create_bank()
             assert bank['id'] == 'foo'
@@ -41,8 +51,8 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo2'
                 }
 
-        with patch('requests.get') as MockGet:
-            with patch('requests.post') as MockPost:
+        with patch('qbank.client.get') as MockGet:
+            with patch('qbank.client.post') as MockPost:
                 MockGet.return_value = FakeGetReq
                 MockPost.return_value = FakePostReq
 
@@ -57,7 +67,7 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo3'
                 }]
 
-        with patch('requests.get') as MockGet:
+        with patch('qbank.client.get') as MockGet:
             MockGet.return_value = FakeReq
             item = self.shared.get_or_create_item('fake-bank')
             assert item['id'] == 'foo3'
@@ -75,8 +85,8 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo4'
                 }
 
-        with patch('requests.get') as MockGet:
-            with patch('requests.post') as MockPost:
+        with patch('qbank.client.get') as MockGet:
+            with patch('qbank.client.post') as MockPost:
                 MockGet.return_value = FakeGetReq
                 MockPost.return_value = FakePostReq
 
@@ -99,8 +109,8 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo5'
                 }
 
-        with patch('requests.get') as MockGet:
-            with patch('requests.post') as MockPost:
+        with patch('qbank.client.get') as MockGet:
+            with patch('qbank.client.post') as MockPost:
                 MockGet.return_value = FakeGetReq
                 MockPost.return_value = FakePostReq
                 assessment = self.shared.get_or_create_assessment('fake-bank',
@@ -124,8 +134,8 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo5'
                 }
 
-        with patch('requests.get') as MockGet:
-            with patch('requests.post') as MockPost:
+        with patch('qbank.client.get') as MockGet:
+            with patch('qbank.client.post') as MockPost:
                 MockGet.return_value = FakeGetReq
                 MockPost.return_value = FakePostReq
                 assessment = self.shared.get_or_create_assessment('fake-bank',
@@ -145,8 +155,8 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo6'
                 }
 
-        with patch('requests.get') as MockGet:
-            with patch('requests.post') as MockPost:
+        with patch('qbank.client.get') as MockGet:
+            with patch('qbank.client.post') as MockPost:
                 MockGet.return_value = FakeGetReq
                 MockPost.return_value = FakePostReq
 
@@ -162,7 +172,7 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo7'
                 }]
 
-        with patch('requests.get') as MockGet:
+        with patch('qbank.client.get') as MockGet:
             MockGet.return_value = FakeReq
             offered = self.shared.get_or_create_assessment_offered(
                 'fake-bank')
@@ -182,8 +192,8 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo8'
                 }
 
-        with patch('requests.get') as MockGet:
-            with patch('requests.post') as MockPost:
+        with patch('qbank.client.get') as MockGet:
+            with patch('qbank.client.post') as MockPost:
                 with patch('star_logo_nova.sln_shared.get_or_create_item') as MockItem:
                     with patch('star_logo_nova.sln_shared.get_or_create_assessment') as MockAssessment:
                         MockGet.return_value = FakeGetReq
@@ -216,17 +226,17 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo9'
                 }
 
-        with patch('requests.get') as MockGet:
+        with patch('qbank.client.get') as MockGet:
             MockGet.return_value = FakeReq
             taken = self.shared.get_assessment_taken(
                 'fake-bank',
                 'foo9')
             assert taken['id'] == 'foo9'
 
-    @patch('star_logo_nova.sln_shared.get_assessment_taken')
+    @patch('star_logo_nova.sln_shared.fetch_assessment_taken')
     @patch('star_logo_nova.sln_shared.save_project')
-    @patch('requests.post')
-    @patch('requests.get')
+    @patch('qbank.client.post')
+    @patch('qbank.client.get')
     def test_can_create_taken(self, MockGet, MockPost, MockSave, MockTaken):
         class FakeGetReq:
             @staticmethod
@@ -257,12 +267,12 @@ class SLNSharedTests(BaseMainTestCase):
             })
         assert taken['id'] == 'foo8'
         assert MockSave.called
-        assert MockTaken.called
+        MockTaken.assert_called_once_with('fake-bank', 'foo8')
 
-    @patch('star_logo_nova.sln_shared.get_assessment_taken')
+    @patch('star_logo_nova.sln_shared.fetch_assessment_taken')
     @patch('star_logo_nova.sln_shared.save_project')
-    @patch('requests.post')
-    @patch('requests.get')
+    @patch('qbank.client.post')
+    @patch('qbank.client.get')
     def test_can_create_taken_with_provenance(self,
                                               MockGet,
                                               MockPost,
@@ -301,12 +311,12 @@ class SLNSharedTests(BaseMainTestCase):
         assert taken['id'] == 'foo8'
         assert taken['provenanceId'] == 'fake-parent'
         assert MockSave.called
-        assert MockTaken.called
+        MockTaken.assert_called_once_with('fake-bank', 'foo8')
 
-    @patch('star_logo_nova.sln_shared.get_assessment_taken')
+    @patch('star_logo_nova.sln_shared.fetch_assessment_taken')
     @patch('star_logo_nova.sln_shared.save_project')
-    @patch('requests.post')
-    @patch('requests.get')
+    @patch('qbank.client.post')
+    @patch('qbank.client.get')
     def test_create_taken_with_only_user_id(self,
                                             MockGet,
                                             MockPost,
@@ -338,7 +348,7 @@ class SLNSharedTests(BaseMainTestCase):
             })
         assert taken['id'] == 'foo11'
         assert MockSave.called
-        assert MockTaken.called
+        MockTaken.assert_called_once_with('fake-bank', 'foo11')
 
     def test_create_taken_throws_exception_if_missing_parameters(self):
         with pytest.raises(KeyError):
@@ -355,9 +365,9 @@ class SLNSharedTests(BaseMainTestCase):
                 })
 
     @patch('star_logo_nova.SLNProject.get_all_results')
-    @patch('star_logo_nova.sln_shared.get_assessment_taken')
+    @patch('star_logo_nova.sln_shared.fetch_assessment_taken')
     @patch('star_logo_nova.sln_shared.save_project')
-    @patch('requests.put')
+    @patch('qbank.client.put')
     def test_can_update_taken_with_title_description(self,
                                                      MockPut,
                                                      MockSave,
@@ -393,12 +403,13 @@ class SLNSharedTests(BaseMainTestCase):
         assert taken['id'] == 'foo11'
         assert MockPut.called
         assert MockSave.called
-        assert MockTaken.called
+        # the lock check, then the read after the submit
+        assert MockTaken.call_count == 2
 
     @patch('star_logo_nova.SLNProject.get_all_results')
-    @patch('star_logo_nova.sln_shared.get_assessment_taken')
+    @patch('star_logo_nova.sln_shared.fetch_assessment_taken')
     @patch('star_logo_nova.sln_shared.save_project')
-    @patch('requests.put')
+    @patch('qbank.client.put')
     def test_can_update_taken_without_title_description(self,
                                                         MockPut,
                                                         MockSave,
@@ -432,7 +443,8 @@ class SLNSharedTests(BaseMainTestCase):
         assert taken['id'] == 'foo12'
         assert not MockPut.called
         assert MockSave.called
-        assert MockTaken.called
+        # the lock check, then the read after the submit
+        assert MockTaken.call_count == 2
 
     def test_update_taken_throws_exception_if_no_user_id_or_project_str(self):
         with pytest.raises(KeyError):
@@ -467,8 +479,8 @@ class SLNSharedTests(BaseMainTestCase):
                     'id': 'foo8'
                 }
 
-        with patch('requests.get') as MockGet:
-            with patch('requests.post') as MockPost:
+        with patch('qbank.client.get') as MockGet:
+            with patch('qbank.client.post') as MockPost:
                 MockGet.return_value = FakeGetReq
                 MockPost.return_value = FakePostReq
 
@@ -495,10 +507,10 @@ class SLNSharedTests(BaseMainTestCase):
                                          'user_id': 'foo'
                                      })
 
-    @patch('star_logo_nova.sln_shared.get_assessment_taken')
+    @patch('star_logo_nova.sln_shared.fetch_assessment_taken')
     @patch('star_logo_nova.sln_shared.save_project')
-    @patch('requests.post', autospec=True)
-    @patch('requests.get')
+    @patch('qbank.client.post', autospec=True)
+    @patch('qbank.client.get')
     def test_can_set_genus_type_id_on_taken_create(self,
                                                    MockGet,
                                                    MockPost,
@@ -538,9 +550,9 @@ class SLNSharedTests(BaseMainTestCase):
             })
         assert taken['id'] == 'foo11'
         assert MockSave.called
-        assert MockTaken.called
+        MockTaken.assert_called_once_with('fake-bank', 'foo11')
 
-    @patch('requests.get')
+    @patch('qbank.client.get')
     def test_cannot_update_taken_genus_type_id(self, MockGet):
         MockGet.return_value = {
             'genusTypeId': settings.READ_ONLY_TAKEN_GENUS_TYPE
@@ -553,3 +565,272 @@ class SLNSharedTests(BaseMainTestCase):
                     'project_str': 'foo',
                     'genusTypeId': 'read-write'
                 })
+
+
+class SLNBootstrapTests(BaseMainTestCase):
+    """ Bank / offered lookups are cached across requests and restarts """
+    def setUp(self):
+        super(SLNBootstrapTests, self).setUp()
+        self.shared = sln_shared()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sln_bootstrap.json')
+
+    def tearDown(self):
+        super(SLNBootstrapTests, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    @patch('qbank.client.get')
+    def test_bank_is_only_resolved_once(self, MockGet):
+        MockGet.return_value.json.return_value = [{'id': 'foo'}]
+        assert self.shared.get_or_create_bank()['id'] == 'foo'
+        assert sln_shared().get_or_create_bank()['id'] == 'foo'
+        assert MockGet.call_count == 1
+
+    @patch('qbank.client.get')
+    def test_offered_is_cached_per_bank(self, MockGet):
+        MockGet.return_value.json.return_value = [{'id': 'foo7'}]
+        self.shared.get_or_create_assessment_offered('fake-bank')
+        self.shared.get_or_create_assessment_offered('fake-bank')
+        assert MockGet.call_count == 1
+        self.shared.get_or_create_assessment_offered('other-bank')
+        assert MockGet.call_count == 2
+
+    def test_cache_is_persisted(self):
+        cache = SLNBootstrap(self.path)
+        assert cache.resolve('bank', lambda: {'id': 'foo'})['id'] == 'foo'
+        restarted = SLNBootstrap(self.path)
+        assert restarted.resolve('bank', lambda: {'id': 'bar'})['id'] == 'foo'
+
+    def test_corrupt_cache_file_is_ignored(self):
+        with open(self.path, 'wb') as bootstrap_file:
+            bootstrap_file.write('{not json')
+        cache = SLNBootstrap(self.path)
+        assert cache.resolve('bank', lambda: {'id': 'foo'})['id'] == 'foo'
+
+    def test_not_found_invalidates_cache(self):
+        class FakeReq:
+            status_code = 404
+
+        cache = SLNBootstrap(self.path)
+        cache.resolve('bank', lambda: {'id': 'foo'})
+        cache.check(FakeReq)
+        assert not os.path.isfile(self.path)
+        assert cache.resolve('bank', lambda: {'id': 'bar'})['id'] == 'bar'
+
+    def test_other_statuses_keep_cache(self):
+        class FakeReq:
+            status_code = 500
+
+        cache = SLNBootstrap(self.path)
+        cache.resolve('bank', lambda: {'id': 'foo'})
+        cache.check(FakeReq)
+        assert cache.resolve('bank', lambda: {'id': 'bar'})['id'] == 'foo'
+
+    def test_error_bodies_are_not_cached(self):
+        cache = SLNBootstrap(self.path)
+        with self.assertRaises(BootstrapError):
+            cache.resolve('bank', lambda: {'detail': 'Service Unavailable'})
+        assert not os.path.isfile(self.path)
+        assert cache.resolve('bank', lambda: {'id': 'foo'})['id'] == 'foo'
+
+    def test_saved_error_bodies_are_ignored(self):
+        with open(self.path, 'wb') as bootstrap_file:
+            json.dump({'bank': {'detail': 'Service Unavailable'},
+                       'offered:foo': {'id': 'bar'}}, bootstrap_file)
+        cache = SLNBootstrap(self.path)
+        assert cache.resolve('bank', lambda: {'id': 'foo'})['id'] == 'foo'
+        assert cache.resolve('offered:foo', lambda: {'id': 'baz'})['id'] == 'bar'
+
+    def test_concurrent_resolves_create_one_bank(self):
+        cache = SLNBootstrap(self.path)
+        calls = []
+
+        def resolver():
+            calls.append(1)
+            time.sleep(0.05)
+            return {'id': 'foo'}
+
+        threads = [threading.Thread(target=cache.resolve,
+                                    args=('bank', resolver))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+
+
+class QuestionIdsTests(BaseMainTestCase):
+    """ save_project remembers each taken's question ID """
+    def setUp(self):
+        super(QuestionIdsTests, self).setUp()
+        self.shared = sln_shared()
+
+    @staticmethod
+    def fake_response(status_code=200, body=None):
+        class FakeReq:
+            @staticmethod
+            def json():
+                return body
+
+        FakeReq.status_code = status_code
+        return FakeReq
+
+    @patch('qbank.client.post')
+    @patch('qbank.client.get')
+    def test_question_id_is_only_fetched_once(self, MockGet, MockPost):
+        MockGet.return_value = self.fake_response(body={'data': [{'id': 'q1'}]})
+        MockPost.return_value = self.fake_response()
+        for _ in range(3):
+            self.shared.save_project('fake-bank', 'fake-taken',
+                                     {'project_str': '0x123'})
+        assert MockGet.call_count == 1
+        assert MockPost.call_count == 3
+        assert MockPost.call_args[0][0].endswith('/fake-taken/questions/q1/submit')
+
+    @patch('qbank.client.post')
+    @patch('qbank.client.get')
+    def test_refused_submit_refetches_question_id(self, MockGet, MockPost):
+        question_ids.set('fake-taken', 'stale')
+        MockGet.return_value = self.fake_response(body={'data': [{'id': 'q2'}]})
+        MockPost.side_effect = [self.fake_response(404), self.fake_response()]
+        self.shared.save_project('fake-bank', 'fake-taken',
+                                 {'project_str': '0x123'})
+        assert MockGet.call_count == 1
+        assert MockPost.call_args[0][0].endswith('/questions/q2/submit')
+        assert question_ids.get('fake-taken') == 'q2'
+
+    @patch('star_logo_nova.sln_shared.get_assessment_taken')
+    @patch('qbank.client.post')
+    @patch('qbank.client.get')
+    def test_creating_taken_warms_question_id(self, MockGet, MockPost, MockTaken):
+        MockGet.return_value = self.fake_response(body={'data': [{'id': 'q3'}]})
+        MockPost.return_value = self.fake_response(body={'id': 'new-taken'})
+        MockTaken.return_value = {'id': 'new-taken'}
+        self.shared.create_assessment_taken('fake-bank', 'fake-offered',
+                                            {'user_id': 'me'})
+        assert question_ids.get('new-taken') == 'q3'
+
+    def test_memo_is_bounded(self):
+        memo = LRUCache(max_entries=2)
+        memo.set('a', '1')
+        memo.set('b', '2')
+        assert memo.get('a') == '1'  # a is now the most recently used
+        memo.set('c', '3')
+        assert memo.get('b') is None
+        assert memo.get('a') == '1'
+        assert memo.get('c') == '3'
+
+
+class TakenCacheTests(BaseMainTestCase):
+    """ Takens returned by QBank are reused instead of read back """
+    def setUp(self):
+        super(TakenCacheTests, self).setUp()
+        self.shared = sln_shared()
+
+    @staticmethod
+    def fake_response(body, status_code=200):
+        class FakeReq:
+            @staticmethod
+            def json():
+                return body
+
+        FakeReq.status_code = status_code
+        return FakeReq
+
+    @patch('qbank.client.get')
+    def test_taken_is_only_fetched_once(self, MockGet):
+        MockGet.return_value = self.fake_response({'id': 'foo9'})
+        first = self.shared.get_assessment_taken('fake-bank', 'foo9')
+        first['displayName'] = 'changed by the caller'
+        second = self.shared.get_assessment_taken('fake-bank', 'foo9')
+        assert MockGet.call_count == 1
+        assert 'displayName' not in second
+
+    @patch('qbank.client.get')
+    def test_escaped_and_unescaped_ids_share_a_cached_taken(self, MockGet):
+        MockGet.return_value = self.fake_response({'id': 'foo%3A9%40ODL'})
+        self.shared.get_assessment_taken('fake-bank', 'foo:9@ODL')
+        self.shared.get_assessment_taken('fake-bank', 'foo%3A9%40ODL')
+        assert MockGet.call_count == 1
+        # and a refused update forgets it, whichever form it was given
+        self.shared.remember_taken('foo%3A9%40ODL', self.fake_response({}, 500), {})
+        self.shared.get_assessment_taken('fake-bank', 'foo:9@ODL')
+        assert MockGet.call_count == 2
+
+    @patch('qbank.client.get')
+    def test_cached_taken_expires(self, MockGet):
+        MockGet.return_value = self.fake_response({'id': 'foo9'})
+        self.shared.get_assessment_taken('fake-bank', 'foo9')
+        later = time.time() + settings.SLN_TAKEN_CACHE_MAX_AGE + 1
+        with patch('star_logo_nova.time.time') as MockTime:
+            MockTime.return_value = later
+            self.shared.get_assessment_taken('fake-bank', 'foo9')
+        assert MockGet.call_count == 2
+
+    @patch('qbank.client.get')
+    def test_errors_are_not_cached(self, MockGet):
+        MockGet.return_value = self.fake_response({'detail': 'not found'}, 404)
+        self.shared.get_assessment_taken('fake-bank', 'foo9')
+        self.shared.get_assessment_taken('fake-bank', 'foo9')
+        assert MockGet.call_count == 2
+
+    @patch('star_logo_nova.sln_shared.save_project')
+    @patch('qbank.client.put')
+    @patch('qbank.client.get')
+    def test_update_returns_taken_read_after_submit(self, MockGet, MockPut, MockSave):
+        MockGet.return_value = self.fake_response({'id': 'foo9',
+                                                   'displayName': 'new',
+                                                   'updated': 'after submit'})
+        MockPut.return_value = self.fake_response({'id': 'foo9',
+                                                   'displayName': 'new'})
+        for _ in range(3):
+            taken = self.shared.update_assessment_taken(
+                'fake-bank', 'foo9', {'title': 'new', 'project_str': '1'})
+        assert taken['updated'] == 'after submit'
+        # the lock check reads the taken once; each update reads it back
+        assert MockGet.call_count == 4
+        assert MockSave.call_count == 3
+        assert self.shared.get_assessment_taken('fake-bank', 'foo9')['updated'] == 'after submit'
+
+    @patch('star_logo_nova.sln_shared.save_project')
+    @patch('qbank.client.put')
+    @patch('qbank.client.get')
+    def test_refused_put_is_not_cached(self, MockGet, MockPut, MockSave):
+        MockGet.return_value = self.fake_response({'id': 'foo9'})
+        MockPut.return_value = self.fake_response({'detail': 'oops'}, 500)
+        with pytest.raises(qbank.QBankError):
+            self.shared.update_assessment_taken(
+                'fake-bank', 'foo9', {'title': 'new', 'project_str': '1'})
+        assert not MockSave.called
+        self.shared.get_assessment_taken('fake-bank', 'foo9')
+        assert MockGet.call_count == 2
+
+    @patch('star_logo_nova.sln_shared.save_project')
+    @patch('qbank.client.post')
+    @patch('qbank.client.get')
+    def test_create_returns_taken_read_after_submit(self, MockGet, MockPost, MockSave):
+        start_time = {'year': 2018, 'month': 6, 'day': 1, 'hour': 12}
+        # QBank only sets actualStartTime once the response is submitted
+        MockPost.return_value = self.fake_response({'id': 'foo10'})
+        MockGet.return_value = self.fake_response({'id': 'foo10',
+                                                   'actualStartTime': start_time})
+        taken = self.shared.create_assessment_taken(
+            'fake-bank', 'fake-offered', {'user_id': 'me'})
+        assert MockSave.called
+        assert taken['actualStartTime'] == start_time
+        assert SLNProject(taken).created_at == '2018-06-01T12:00:00.000000Z'
+        assert self.shared.get_assessment_taken('fake-bank', 'foo10') == taken
+        assert MockGet.call_count == 1
+
+    @patch('qbank.client.get')
+    def test_locked_status_comes_from_cached_taken(self, MockGet):
+        MockGet.return_value = self.fake_response({
+            'id': 'foo9',
+            'genusTypeId': settings.READ_ONLY_TAKEN_GENUS_TYPE
+        })
+        for _ in range(2):
+            with pytest.raises(AttributeError):
+                self.shared.update_assessment_taken(
+                    'fake-bank', 'foo9', {'project_str': '1'})
+        assert MockGet.call_count == 1
@@ -0,0 +1,55 @@
+from mock import patch
+
+from star_logo_nova import SLNProject
+from .test_main import BaseMainTestCase
+
+
+def unsaved():
+    """ A section with nothing submitted yet """
+    return {'questions': [{'responded': False, 'response': None}]}
+
+
+def saved_on(**submission_time):
+    """ A section whose response was submitted at ``submission_time`` """
+    return {'questions': [{
+        'responded': True,
+        'response': {'submissionTime': submission_time}
+    }]}
+
+
+class TestSLNProjectTimestamps(BaseMainTestCase):
+    """ Project timestamps are parsed once, into integers that sort """
+    def setUp(self):
+        super(TestSLNProjectTimestamps, self).setUp()
+        self.project = SLNProject({
+            'id': 'foo',
+            'takingAgentId': 'user',
+            'actualStartTime': {'year': 2000, 'month': 1, 'day': 1}
+        })
+
+    def test_timestamps_are_sortable_integers(self):
+        self.project.section = saved_on(year=1850, month=5, day=5,
+                                        microsecond=7)
+        assert self.project.created_time == 946684800 * 1000000
+        assert self.project.saved_time < self.project.created_time
+        assert self.project.saved_at == '1850-05-05T00:00:00.000007Z'
+
+    def test_timestamps_are_parsed_once(self):
+        self.project.section = unsaved()
+        with patch('star_logo_nova.qbank_time') as MockTime:
+            MockTime.return_value = 0
+            for _ in range(3):
+                assert self.project.saved_at == '1970-01-01T00:00:00.000000Z'
+                assert self.project.created_at == '1970-01-01T00:00:00.000000Z'
+            assert MockTime.call_count == 1
+        # the taken is left as it was
+        assert 'tzinfo' not in self.project.my_map['actualStartTime']
+
+    def test_new_section_resets_saved_time(self):
+        self.project.section = unsaved()
+        assert self.project.saved_at == '2000-01-01T00:00:00.000000Z'
+        self.project.section = saved_on(year=2001, month=2, day=3)
+        assert self.project.saved_at == '2001-02-03T00:00:00.000000Z'
+
+    def test_projects_have_no_instance_dict(self):
+        assert not hasattr(self.project, '__dict__')
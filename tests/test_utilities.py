@@ -2,7 +2,6 @@ from mock import patch
 
 from utilities import escape,\
     allow_cors,\
-    get_byte_ranges,\
     format_xml_response,\
     format_response,\
     BaseClass,\
@@ -119,19 +118,3 @@ class TestUtilityMethods:
 
     def test_escape_does_not_double_escape(self):
         assert escape('foo%3A2%40odl') == 'foo%3A2%40odl'
-
-    @patch('web.ctx')
-    def test_get_byte_ranges_returns_none_if_header_not_present(self,
-                                                                MockCtx):
-        MockCtx.env = {
-            'foo': 'bar'
-        }
-        assert get_byte_ranges() is None
-
-    @patch('web.ctx')
-    def test_get_byte_range_returns_header_values(self,
-                                                  MockCtx):
-        MockCtx.env = {
-            'HTTP_RANGE': 'bytes=0-100'
-        }
-        assert get_byte_ranges() == ['0', '100']
@@ -1,6 +1,9 @@
+import base64
+import calendar
 import functools
 import json
 
+from datetime import datetime, timedelta
 from urllib import quote
 
 import web
@@ -37,7 +40,8 @@ def format_html_response(func):
     @functools.wraps(func)
     def wrapper(self, *args):
         results = func(self, *args)
-        web.header('Content-type', 'text/html')
+        if not str(web.ctx.get('status', '')).startswith('304'):
+            web.header('Content-type', 'text/html')
         return results
     return wrapper
 
@@ -98,7 +102,60 @@ def escape(string_):
     return string_
 
 
-def get_byte_ranges():
-    if 'HTTP_RANGE' in web.ctx.env:
-        return web.ctx.env['HTTP_RANGE'].split('=')[-1].split('-')
-    return None
+EPOCH = datetime(1970, 1, 1)
+
+
+def qbank_time(time_map):
+    """ A QBank time dict (UTC) as integer microseconds since the epoch,
+        which sorts the same way as the ISO string but is far cheaper
+        to compare and keep around """
+    seconds = calendar.timegm((time_map['year'],
+                               time_map['month'],
+                               time_map['day'],
+                               time_map.get('hour', 0),
+                               time_map.get('minute', 0),
+                               time_map.get('second', 0)))
+    return seconds * 1000000 + time_map.get('microsecond', 0)
+
+
+def iso_format(microseconds):
+    """ ``qbank_time()`` back to an ISO String, like
+        2018-03-22T15:40:14.533736Z """
+    moment = EPOCH + timedelta(microseconds=microseconds)
+    # not strftime(), which refuses years before 1900 in Python 2
+    return '{0:04d}-{1:02d}-{2:02d}T{3:02d}:{4:02d}:{5:02d}.{6:06d}Z'.format(
+        moment.year, moment.month, moment.day, moment.hour,
+        moment.minute, moment.second, moment.microsecond)
+
+
+ISO_FORMATS = ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ',
+               '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d')
+
+
+def parse_iso_time(string_):
+    """ An ISO String (UTC), as ``qbank_time()``. Raises ValueError. """
+    for time_format in ISO_FORMATS:
+        try:
+            moment = datetime.strptime(string_, time_format)
+        except ValueError:
+            continue
+        delta = moment - EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    raise ValueError('invalid time: {0}'.format(string_))
+
+
+def encode_cursor(key):
+    """ An opaque paging cursor for a sort key (a list or tuple) """
+    return base64.urlsafe_b64encode(json.dumps(key))
+
+
+def decode_cursor(cursor):
+    """ The key from ``encode_cursor()``; raises ValueError for
+        anything it did not make """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(str(cursor)))
+    except (TypeError, UnicodeEncodeError):
+        raise ValueError('invalid cursor')
+    if not isinstance(key, list):
+        raise ValueError('invalid cursor')
+    return key